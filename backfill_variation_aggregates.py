@@ -0,0 +1,120 @@
+"""
+Rebuild Product Variation Aggregates
+
+Recounts variation_count, variation_quantity, min/max_price, min_sale_price,
+has_variation_sale (and quantity for variable products) from variation_options.
+The app keeps these in sync on every variation write; run this after raw SQL
+imports or to repair drift.
+
+Usage:
+    python backfill_variation_aggregates.py                    # Dry run (report drift only)
+    python backfill_variation_aggregates.py --execute          # Rebuild every product with variations
+    python backfill_variation_aggregates.py --product-id 12    # Only one product
+"""
+
+import sys
+import argparse
+from datetime import datetime
+from sqlmodel import Session, select, func
+from src.lib.db_con import engine
+from src.api import models  # noqa: F401  (configure all mappers)
+from src.api.models.product_model.productsModel import Product, ProductType
+from src.api.models.product_model.variationOptionModel import VariationOption
+from src.api.core.variation_aggregates import refresh_variation_aggregates
+
+BATCH_SIZE = 500
+
+
+def get_product_ids(session, product_id: int = None):
+    """Variable products and any product that has variations"""
+    if product_id:
+        return [product_id]
+    with_variations = select(VariationOption.product_id).distinct()
+    query = select(Product.id).where(
+        (Product.product_type == ProductType.VARIABLE) | Product.id.in_(with_variations)
+    )
+    return session.exec(query.order_by(Product.id)).all()
+
+
+def get_drift(session, product_ids):
+    """Products whose stored variation_quantity differs from the live sum"""
+    live = (
+        select(
+            VariationOption.product_id,
+            func.coalesce(func.sum(VariationOption.quantity), 0).label("total"),
+        )
+        .where(VariationOption.product_id.in_(product_ids))
+        .group_by(VariationOption.product_id)
+        .subquery()
+    )
+    rows = session.exec(
+        select(Product.id, Product.name, Product.variation_quantity, func.coalesce(live.c.total, 0))
+        .outerjoin(live, live.c.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+    ).all()
+    return [row for row in rows if row[2] != row[3]]
+
+
+def backfill_variation_aggregates(dry_run: bool = True, product_id: int = None):
+    print("=" * 80)
+    print("REBUILD PRODUCT VARIATION AGGREGATES")
+    print(f"Mode: {'DRY RUN' if dry_run else 'EXECUTE'}")
+    print(f"Started at: {datetime.now()}")
+    print("=" * 80)
+
+    with Session(engine) as session:
+        product_ids = get_product_ids(session, product_id)
+        print(f"\nProducts to check: {len(product_ids)}")
+
+        drifted = 0
+        rebuilt = 0
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            for pid, name, stored, live in get_drift(session, batch):
+                drifted += 1
+                print(f"  Product {pid} ({name}): stored {stored}, variations {live}")
+
+            if not dry_run:
+                rebuilt += len(refresh_variation_aggregates(session, batch))
+                session.commit()
+
+        print("\n" + "=" * 80)
+        print("SUMMARY")
+        print("=" * 80)
+        print(f"Products with quantity drift: {drifted}")
+        if dry_run:
+            print("\nTHIS WAS A DRY RUN - NO CHANGES WERE MADE")
+            print("Run with --execute to rebuild the aggregates")
+        else:
+            print(f"Products rebuilt: {rebuilt}")
+
+        print(f"\nCompleted at: {datetime.now()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the variation aggregate columns on products"
+    )
+    parser.add_argument(
+        "--execute",
+        action="store_true",
+        help="Actually rebuild the aggregates (default is dry run)"
+    )
+    parser.add_argument(
+        "--product-id",
+        type=int,
+        help="Only rebuild a specific product"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        backfill_variation_aggregates(
+            dry_run=not args.execute,
+            product_id=args.product_id
+        )
+    except Exception as e:
+        print(f"\nError: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -24,6 +24,27 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = SQLModel.metadata
 
+# Search/facet objects managed by raw SQL in add_product_search_indexes and
+# add_product_facet_indexes; they are not declared on the models, so keep
+# autogenerate from proposing to drop them.
+SEARCH_OBJECTS = {
+    "search_vector",
+    "ix_products_search_vector",
+    "ix_products_name_trgm",
+    "ix_products_sku_trgm",
+    "ix_products_description_trgm",
+    "ix_categories_name_trgm",
+    "ix_products_attributes_gin",
+    "ix_variation_options_options_gin",
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if reflected and compare_to is None and name in SEARCH_OBJECTS:
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +67,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -68,7 +90,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,57 @@
+"""unique cart row per user and product without variation
+
+uix_user_product_variation never matches rows whose variation_option_id is
+NULL, so simple products could be added twice. Existing duplicates are
+merged into the oldest row before the partial unique index is created.
+
+Revision ID: l2m3n4o5p6q7
+Revises: k1l2m3n4o5p6
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'l2m3n4o5p6q7'
+down_revision: Union[str, Sequence[str], None] = 'k1l2m3n4o5p6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE carts c
+        SET quantity = d.quantity
+        FROM (
+            SELECT min(id) AS id, sum(quantity) AS quantity
+            FROM carts
+            WHERE variation_option_id IS NULL
+            GROUP BY user_id, product_id
+            HAVING count(*) > 1
+        ) d
+        WHERE c.id = d.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM carts c
+        USING carts k
+        WHERE c.variation_option_id IS NULL
+          AND k.variation_option_id IS NULL
+          AND c.user_id = k.user_id
+          AND c.product_id = k.product_id
+          AND c.id > k.id
+        """
+    )
+    op.create_index(
+        'uix_user_product_no_variation', 'carts', ['user_id', 'product_id'],
+        unique=True, postgresql_where=sa.text('variation_option_id IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uix_user_product_no_variation', table_name='carts')
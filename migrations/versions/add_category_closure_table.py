@@ -0,0 +1,50 @@
+"""add category_closure table for arbitrary-depth category lookups
+
+Revision ID: f6g7h8i9j0k1
+Revises: e5f6g7h8i9j0
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6g7h8i9j0k1'
+down_revision: Union[str, Sequence[str], None] = 'e5f6g7h8i9j0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('category_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id'),
+    )
+    op.create_index('ix_category_closure_descendant', 'category_closure', ['descendant_id', 'depth'])
+
+    # Backfill from parent_id (cycle-safe: a path never revisits a category)
+    op.execute("""
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth, path) AS (
+            SELECT id, id, 0, ARRAY[id] FROM categories
+            UNION ALL
+            SELECT t.ancestor_id, c.id, t.depth + 1, t.path || c.id
+            FROM tree t
+            JOIN categories c ON c.parent_id = t.descendant_id
+            WHERE c.id <> ALL(t.path)
+        )
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, MIN(depth)
+        FROM tree
+        GROUP BY ancestor_id, descendant_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_category_closure_descendant', table_name='category_closure')
+    op.drop_table('category_closure')
@@ -0,0 +1,35 @@
+"""add GIN indexes on product attributes and variation options for facets
+
+Revision ID: g7h8i9j0k1l2
+Revises: f6g7h8i9j0k1
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'g7h8i9j0k1l2'
+down_revision: Union[str, Sequence[str], None] = 'f6g7h8i9j0k1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The columns are JSON; index the jsonb cast so `col::jsonb @> ...`
+    # (objectArrayFilters and the facet queries) can use them.
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_attributes_gin "
+        "ON products USING gin ((attributes::jsonb) jsonb_path_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_variation_options_options_gin "
+        "ON variation_options USING gin ((options::jsonb) jsonb_path_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_variation_options_options_gin")
+    op.execute("DROP INDEX IF EXISTS ix_products_attributes_gin")
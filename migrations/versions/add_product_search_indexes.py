@@ -0,0 +1,74 @@
+"""add full-text search vector and trigram indexes for product search
+
+Revision ID: e5f6g7h8i9j0
+Revises: d4e5f6g7h8i9
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6g7h8i9j0'
+down_revision: Union[str, Sequence[str], None] = 'd4e5f6g7h8i9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_INDEXES = [
+    ('ix_products_name_trgm', 'products', 'name'),
+    ('ix_products_sku_trgm', 'products', 'sku'),
+    ('ix_products_description_trgm', 'products', 'description'),
+    ('ix_categories_name_trgm', 'categories', 'name'),
+]
+
+
+def upgrade() -> None:
+    # pg_trgm needs CREATE privilege on the database; skip it (and its indexes)
+    # instead of failing, search then falls back to ILIKE for these columns.
+    op.execute("""
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN insufficient_privilege THEN
+            RAISE NOTICE 'pg_trgm not installed: insufficient privilege';
+        END
+        $$;
+    """)
+
+    # Maintained by Postgres on every insert/update of the source columns
+    op.execute("""
+        ALTER TABLE products
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(sku, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+        ) STORED
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_search_vector
+        ON products USING GIN (search_vector)
+    """)
+
+    for index_name, table, column in TRIGRAM_INDEXES:
+        op.execute(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON {table} USING GIN ({column} gin_trgm_ops);
+                END IF;
+            END
+            $$;
+        """)
+
+
+def downgrade() -> None:
+    for index_name, _table, _column in TRIGRAM_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+    # pg_trgm is left installed; other objects may depend on it
@@ -0,0 +1,65 @@
+"""add variation aggregate columns to products and backfill them
+
+Revision ID: h8i9j0k1l2m3
+Revises: g7h8i9j0k1l2
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'h8i9j0k1l2m3'
+down_revision: Union[str, Sequence[str], None] = 'g7h8i9j0k1l2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('variation_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('products', sa.Column('variation_quantity', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('products', sa.Column('min_sale_price', sa.Float(), nullable=True))
+    op.add_column('products', sa.Column('has_variation_sale', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.create_index(op.f('ix_products_has_variation_sale'), 'products', ['has_variation_sale'], unique=False)
+
+    # Backfill from the existing variations (same rules as
+    # src/api/core/variation_aggregates.py)
+    op.execute(
+        """
+        UPDATE products p
+        SET variation_count = g.variation_count,
+            variation_quantity = g.variation_quantity,
+            min_sale_price = g.min_sale_price,
+            has_variation_sale = g.has_variation_sale,
+            quantity = CASE WHEN p.product_type = 'VARIABLE' THEN g.variation_quantity ELSE p.quantity END,
+            min_price = CASE WHEN p.product_type = 'VARIABLE' THEN g.min_price ELSE p.min_price END,
+            max_price = CASE WHEN p.product_type = 'VARIABLE' THEN g.max_price ELSE p.max_price END
+        FROM (
+            SELECT product_id,
+                   count(*) AS variation_count,
+                   coalesce(sum(quantity), 0) AS variation_quantity,
+                   min(nullif(price, '')::float) AS min_price,
+                   max(nullif(price, '')::float) AS max_price,
+                   min(CASE WHEN nullif(sale_price, '')::float > 0
+                             AND nullif(sale_price, '')::float < nullif(price, '')::float
+                            THEN nullif(sale_price, '')::float END) AS min_sale_price,
+                   coalesce(bool_or(nullif(sale_price, '')::float > 0
+                             AND nullif(sale_price, '')::float < nullif(price, '')::float), false)
+                       AS has_variation_sale
+            FROM variation_options
+            WHERE product_id IS NOT NULL
+            GROUP BY product_id
+        ) g
+        WHERE p.id = g.product_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_products_has_variation_sale'), table_name='products')
+    op.drop_column('products', 'has_variation_sale')
+    op.drop_column('products', 'min_sale_price')
+    op.drop_column('products', 'variation_quantity')
+    op.drop_column('products', 'variation_count')
@@ -0,0 +1,112 @@
+"""
+Small key/value cache with pluggable backends.
+
+MemoryCacheBackend keeps entries per process (TTL + LRU bound).
+RedisCacheBackend shares them between gunicorn workers; it needs the optional
+`redis` package and is only built when a URL is configured.
+"""
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class CacheBackend(ABC):
+    """Interface every cache backend implements. Values must be JSON-able."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process cache: entries expire after `ttl` seconds, oldest evicted past `maxsize`."""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared cache for several workers; values are stored as JSON under `prefix`."""
+
+    def __init__(self, url: str, ttl: int = 300, prefix: str = "cache:"):
+        import redis  # optional dependency
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self.client.set(
+            self.prefix + key, json.dumps(value), ex=ttl if ttl is not None else self.ttl
+        )
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def build_cache_backend(redis_url: Optional[str], maxsize: int, ttl: int, prefix: str) -> CacheBackend:
+    """Redis when a URL is configured and the package is installed, memory otherwise."""
+    if redis_url:
+        try:
+            return RedisCacheBackend(redis_url, ttl=ttl, prefix=prefix)
+        except Exception as e:
+            print(f"[!] Warning: Redis cache unavailable ({e}), using in-process cache")
+    return MemoryCacheBackend(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,412 @@
+"""
+Cart pricing: line prices, sale discounts, coupon, tax and delivery fee,
+worked out in one place for /cart/my-cart and the order-create routes.
+
+    price, sale_price = line_prices(product, variation)
+    line = price_line(price, sale_price, quantity)
+    is_valid, error_msg, totals = price_totals(
+        session, lines, tax_id, shipping_id, coupon_id, checkout=checkout
+    )
+
+price_cart() prices a user's saved cart and caches the totals under
+(user, cart revision, tax, shipping, coupon). users.cart_revision is bumped
+by a flush listener whenever a Cart row is added, changed or deleted, so a
+cached entry is never served for another version of the cart. Product price
+edits and coupon expiry are not tracked by the revision; entries live for
+CART_PRICING_TTL seconds. Bulk SQL writes to carts must call
+bump_cart_revision() themselves.
+
+Orders are always priced from the rows loaded for the checkout, with the
+same functions, never from the cache.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from src.api.core.cache import CacheBackend, build_cache_backend
+from src.api.core.checkout_context import CheckoutContext
+from src.api.core.utility import now_pk
+from src.api.models.cart_model.cartModel import Cart
+from src.api.models.couponModel import Coupon, CouponType
+from src.api.models.order_model.orderModel import FreeShippingSource
+from src.api.models.product_model.productsModel import Product
+from src.api.models.product_model.variationOptionModel import VariationOption
+from src.api.models.settingsModel import Settings
+from src.api.models.shipping_model.shippingModel import Shipping
+from src.api.models.taxModel import Tax
+from src.api.models.usersModel import User
+
+CART_PRICING_TTL = int(os.getenv("CART_PRICING_TTL", 60))
+CART_PRICING_SIZE = int(os.getenv("CART_PRICING_SIZE", 5000))
+
+_backend: CacheBackend = build_cache_backend(
+    os.getenv("CART_PRICING_REDIS_URL"),
+    maxsize=CART_PRICING_SIZE,
+    ttl=CART_PRICING_TTL,
+    prefix="cart_pricing:",
+)
+
+
+def set_cart_pricing_backend(backend: CacheBackend):
+    """Swap the backend (e.g. a shared one for multi-worker deployments)."""
+    global _backend
+    _backend = backend
+
+
+def validate_tax_shipping_coupon(
+    session,
+    tax_id: Optional[int],
+    shipping_id: Optional[int],
+    coupon_id: Optional[int],
+    order_amount: float,
+    language: str = "en",
+    checkout: Optional[CheckoutContext] = None,
+) -> tuple[bool, str, Dict[str, Any]]:
+    """
+    Validate tax, shipping, and coupon with enhanced coupon validation
+    and settings-based free shipping support.
+
+    Returns: (is_valid, error_message, calculation_data)
+
+    calculation_data includes:
+    - tax_rate, tax_amount
+    - shipping_amount (final amount after free shipping discount)
+    - original_shipping_amount (original shipping before discount)
+    - coupon_discount (discount amount from FIXED/PERCENTAGE coupons only)
+    - coupon_type
+    - free_shipping_source ('none', 'settings', 'coupon')
+    """
+    calculation_data = {
+        'tax_rate': 0.0,
+        'tax_amount': 0.0,
+        'shipping_amount': 0.0,
+        'original_shipping_amount': 0.0,
+        'coupon_discount': 0.0,
+        'coupon_type': None,
+        'free_shipping_source': FreeShippingSource.NONE.value
+    }
+
+    get = checkout.get if checkout else session.get
+
+    # Validate tax
+    if tax_id:
+        tax = get(Tax, tax_id)
+        if not tax:
+            return False, "Tax not found", calculation_data
+        if not tax.is_global and not tax.is_active:
+            return False, "Tax is not active", calculation_data
+        calculation_data['tax_rate'] = tax.rate
+
+    # Validate shipping and store original amount
+    original_shipping = 0.0
+    if shipping_id:
+        shipping = get(Shipping, shipping_id)
+        if not shipping:
+            return False, "Shipping not found", calculation_data
+        if not shipping.is_active:
+            return False, "Shipping is not active", calculation_data
+        original_shipping = shipping.amount
+        calculation_data['shipping_amount'] = original_shipping
+        calculation_data['original_shipping_amount'] = original_shipping
+
+    # Fetch settings for free shipping configuration
+    settings_statement = select(Settings).where(Settings.language == language)
+    settings_result = session.exec(settings_statement).first()
+
+    # Handle Row object vs Settings model
+    settings = None
+    if settings_result:
+        if hasattr(settings_result, 'options'):
+            settings = settings_result
+        elif hasattr(settings_result, '_mapping'):
+            # Extract Settings from Row object
+            mapping = dict(settings_result._mapping)
+            settings = mapping.get('Settings') or mapping.get(Settings)
+
+    # Fallback to English settings if language-specific not found
+    if not settings and language != "en":
+        settings_statement = select(Settings).where(Settings.language == "en")
+        settings_result = session.exec(settings_statement).first()
+        if settings_result:
+            if hasattr(settings_result, 'options'):
+                settings = settings_result
+            elif hasattr(settings_result, '_mapping'):
+                mapping = dict(settings_result._mapping)
+                settings = mapping.get('Settings') or mapping.get(Settings)
+
+    # Get free shipping settings (with defaults)
+    free_shipping_enabled = False
+    free_shipping_amount = 0       # order must reach this to qualify for free shipping
+    minimum_order_amount = 0       # minimum order amount (always enforced)
+    max_shipping_amount_off = 0    # max discount cap on shipping fee
+
+    options = None
+    if settings:
+        if hasattr(settings, 'options'):
+            options = settings.options
+        elif isinstance(settings, dict):
+            options = settings.get('options')
+
+    def _to_float(val):
+        try:
+            return float(val or 0)
+        except (ValueError, TypeError):
+            return 0.0
+
+    if options:
+        free_shipping_enabled = bool(options.get('freeShipping', False))
+        free_shipping_amount   = _to_float(options.get('freeShippingAmount', 0))
+        minimum_order_amount   = _to_float(options.get('minimumOrderAmount', 0))
+        max_shipping_amount_off = _to_float(options.get('maximumShippingAmountOff', 0))
+
+    # Always enforce minimum order amount (independent of free shipping)
+    if minimum_order_amount > 0 and order_amount < minimum_order_amount:
+        return False, f"Minimum order amount is {minimum_order_amount} without shipping fee", calculation_data
+
+    # Apply settings-based free shipping when enabled and order qualifies
+    settings_free_shipping_applied = False
+    if (
+        free_shipping_enabled
+        and original_shipping > 0
+        and free_shipping_amount > 0
+        and order_amount >= free_shipping_amount
+    ):
+        # Discount is capped by maximumShippingAmountOff (0 = no cap = full discount)
+        shipping_discount = min(original_shipping, max_shipping_amount_off) if max_shipping_amount_off > 0 else original_shipping
+        calculation_data['shipping_amount'] = original_shipping - shipping_discount
+        calculation_data['free_shipping_source'] = FreeShippingSource.SETTINGS.value
+        settings_free_shipping_applied = True
+
+    # Validate coupon with enhanced checks
+    if coupon_id:
+        coupon = get(Coupon, coupon_id)
+        if not coupon:
+            return False, "Coupon not found", calculation_data
+
+        # Check if coupon is active
+        now = now_pk()
+        if now < coupon.active_from or now > coupon.expire_at:
+            return False, "Coupon is not active", calculation_data
+
+        # Check minimum cart amount
+        if order_amount < coupon.minimum_cart_amount:
+            return False, f"Order amount must be at least {coupon.minimum_cart_amount} to use this coupon", calculation_data
+
+        calculation_data['coupon_type'] = coupon.type
+
+        # Calculate coupon discount based on type
+        if coupon.type == CouponType.FIXED:
+            calculation_data['coupon_discount'] = min(coupon.amount, order_amount)
+        elif coupon.type == CouponType.PERCENTAGE:
+            calculation_data['coupon_discount'] = order_amount * (coupon.amount / 100)
+        elif coupon.type == CouponType.FREE_SHIPPING:
+            # Only apply coupon free shipping if settings-based free shipping wasn't already applied
+            if not settings_free_shipping_applied and original_shipping > 0:
+                # Discount capped by maximumShippingAmountOff (0 = no cap = full discount)
+                shipping_discount = min(original_shipping, max_shipping_amount_off) if max_shipping_amount_off > 0 else original_shipping
+                calculation_data['shipping_amount'] = original_shipping - shipping_discount
+                calculation_data['free_shipping_source'] = FreeShippingSource.COUPON.value
+            # Note: coupon_discount stays 0.0 for FREE_SHIPPING coupons
+            # The shipping discount is tracked via free_shipping_source field
+
+    return True, "Validation successful", calculation_data
+
+
+def calculate_product_discount(price: float, sale_price: Optional[float], quantity: float) -> float:
+    """Calculate product-level discount"""
+    if sale_price and sale_price > 0 and sale_price < price:
+        return (price - sale_price) * quantity
+    return 0.0
+
+
+def calculate_item_tax(subtotal: float, tax_rate: float) -> float:
+    """Calculate tax for individual item"""
+    return subtotal * (tax_rate / 100)
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def line_prices(product: Product, variation: Optional[VariationOption] = None) -> Tuple[float, Optional[float]]:
+    """(price, sale_price) of a cart line; sale_price is None when not on sale."""
+    source = variation if variation is not None else product
+    price = _to_float(source.price)
+    sale_price = _to_float(source.sale_price)
+    return price, sale_price if sale_price > 0 else None
+
+
+def price_line(price: float, sale_price: Optional[float], quantity: float) -> Dict[str, float]:
+    """Amounts of one line: actual (at full price), subtotal (at sale price) and discount."""
+    final_price = sale_price if sale_price and sale_price > 0 else price
+    return {
+        "actual_amount": price * quantity,
+        "subtotal": final_price * quantity,
+        "discount": calculate_product_discount(price, sale_price, quantity),
+    }
+
+
+def price_totals(
+    session,
+    lines: Iterable[Dict[str, float]],
+    tax_id: Optional[int],
+    shipping_id: Optional[int],
+    coupon_id: Optional[int],
+    language: str = "en",
+    checkout: Optional[CheckoutContext] = None,
+) -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    Order totals for priced lines (see price_line), rounded to whole numbers.
+    Returns (is_valid, error_message, totals). When the tax, shipping or
+    coupon does not validate, totals hold the line amounts and no charges.
+    """
+    lines = list(lines)
+    subtotal = sum(line["subtotal"] for line in lines)
+    subtotal_amount = round(subtotal)
+    totals = {
+        "subtotal": subtotal_amount,
+        "actual_amount": round(sum(line["actual_amount"] for line in lines)),
+        "product_discount": round(sum(line["discount"] for line in lines)),
+        "tax_rate": 0.0,
+        "tax": 0,
+        "delivery_fee": 0,
+        "original_delivery_fee": 0,
+        "coupon_discount": 0,
+        "coupon_type": None,
+        "free_shipping_source": FreeShippingSource.NONE.value,
+        "total": subtotal_amount,
+    }
+
+    is_valid, error_msg, calc_data = validate_tax_shipping_coupon(
+        session, tax_id, shipping_id, coupon_id, subtotal, language, checkout=checkout
+    )
+    if not is_valid:
+        return False, error_msg, totals
+
+    tax_amount = round(subtotal * (calc_data['tax_rate'] / 100))
+    shipping_amount = round(calc_data['shipping_amount'])
+    coupon_discount = round(calc_data['coupon_discount'])
+    coupon_type = calc_data['coupon_type']
+    totals.update({
+        "tax_rate": calc_data['tax_rate'],
+        "tax": tax_amount,
+        "delivery_fee": shipping_amount,
+        "original_delivery_fee": round(calc_data['original_shipping_amount']),
+        "coupon_discount": coupon_discount,
+        "coupon_type": getattr(coupon_type, "value", coupon_type),
+        "free_shipping_source": calc_data['free_shipping_source'],
+        # Never below zero
+        "total": max(0, round(subtotal_amount + tax_amount + shipping_amount - coupon_discount)),
+    })
+    return True, error_msg, totals
+
+
+# ==========================================
+# Saved carts
+# ==========================================
+def get_cart_revision(session, user_id: int) -> int:
+    revision = session.execute(
+        select(User.cart_revision).where(User.id == user_id)
+    ).scalar_one_or_none()
+    return revision or 0
+
+
+def bump_cart_revision(session, user_ids: Iterable[int]):
+    """Move the users' carts to a new revision (for writes that bypass the ORM)."""
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    if not user_ids:
+        return
+    users = User.__table__
+    # On the connection: this also runs inside a flush (see _bump_changed_carts)
+    session.connection().execute(
+        update(users)
+        .where(users.c.id.in_(user_ids))
+        .values(cart_revision=users.c.cart_revision + 1)
+    )
+
+
+def _cache_key(user_id, revision, tax_id, shipping_id, coupon_id) -> str:
+    return f"{user_id}:{revision}:{tax_id or 0}:{shipping_id or 0}:{coupon_id or 0}"
+
+
+def price_cart(
+    session,
+    user_id: int,
+    tax_id: Optional[int] = None,
+    shipping_id: Optional[int] = None,
+    coupon_id: Optional[int] = None,
+    cart_items: Optional[List[Cart]] = None,
+    checkout: Optional[CheckoutContext] = None,
+    revision: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Totals of the user's saved cart, cached per cart revision.
+
+    Callers that already loaded the cart rows and their CheckoutContext.for_cart
+    pass them in to save the lookups on a miss, together with the revision they
+    read before loading those rows. An invalid tax, shipping or
+    coupon gives valid=False and the message, with the line amounts only.
+    """
+    # Read before the rows, so the cache key never outruns the priced data
+    if revision is None:
+        revision = get_cart_revision(session, user_id)
+    key = _cache_key(user_id, revision, tax_id, shipping_id, coupon_id)
+    try:
+        cached = _backend.get(key)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        print(f"Cart pricing cache read failed: {e}")
+
+    if cart_items is None:
+        cart_items = session.execute(select(Cart).where(Cart.user_id == user_id)).scalars().all()
+    if checkout is None:
+        checkout = CheckoutContext.for_cart(session, cart_items)
+
+    lines = []
+    item_count = 0
+    for cart in cart_items:
+        product = checkout.get(Product, cart.product_id)
+        if not product:
+            continue
+        variation = checkout.get(VariationOption, cart.variation_option_id)
+        lines.append(price_line(*line_prices(product, variation), cart.quantity))
+        item_count += cart.quantity
+
+    is_valid, error_msg, totals = price_totals(
+        session, lines, tax_id, shipping_id, coupon_id, checkout=checkout
+    )
+    pricing = {
+        "revision": revision,
+        "item_count": item_count,
+        "valid": is_valid,
+        "message": None if is_valid else error_msg,
+        **totals,
+    }
+    try:
+        _backend.set(key, pricing)
+    except Exception as e:
+        print(f"Cart pricing cache write failed: {e}")
+    return pricing
+
+
+def clear_cart_pricing_cache():
+    _backend.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_carts(session, flush_context):
+    user_ids = {obj.user_id for obj in session.new if isinstance(obj, Cart)}
+    user_ids.update(obj.user_id for obj in session.deleted if isinstance(obj, Cart))
+    user_ids.update(
+        obj.user_id for obj in session.dirty
+        if isinstance(obj, Cart) and session.is_modified(obj, include_collections=False)
+    )
+    if user_ids:
+        bump_cart_revision(session, user_ids)
@@ -0,0 +1,168 @@
+"""
+Maintenance and lookups for the category_closure table.
+
+The table holds one row per (ancestor, descendant) pair with the distance
+between them (0 for the category itself), so "all descendants at any depth"
+is a single indexed lookup and subtree updates are one statement each.
+"""
+
+from typing import List, Optional, Set
+
+from sqlalchemy import and_, delete, func, insert, literal, select, update
+
+from src.api.core.cache import MemoryCacheBackend
+from src.api.models.category_model.categoryModel import Category, CategoryClosure
+
+# Descendant sets change only on category writes; TTL covers the other workers
+_descendants_cache = MemoryCacheBackend(maxsize=1024, ttl=300)
+
+
+def descendant_ids_subquery(category_id: int, include_self: bool = True):
+    """SELECT of descendant ids, for `Product.category_id.in_(...)` joins."""
+    statement = select(CategoryClosure.descendant_id).where(
+        CategoryClosure.ancestor_id == category_id
+    )
+    if not include_self:
+        statement = statement.where(CategoryClosure.depth > 0)
+    return statement
+
+
+def get_descendant_ids(session, category_id: int, include_self: bool = True) -> Set[int]:
+    """Cached set of every category id under category_id (any depth)."""
+    ids = _descendants_cache.get(str(category_id))
+    if ids is None:
+        ids = set(session.execute(descendant_ids_subquery(category_id)).scalars().all())
+        _descendants_cache.set(str(category_id), ids)
+    if include_self:
+        return set(ids)
+    return {cid for cid in ids if cid != category_id}
+
+
+def is_descendant(session, category_id: int, ancestor_id: int) -> bool:
+    """Uncached EXISTS check, for write paths that must not trust the cache."""
+    return session.execute(
+        select(
+            select(CategoryClosure.descendant_id)
+            .where(
+                CategoryClosure.ancestor_id == ancestor_id,
+                CategoryClosure.descendant_id == category_id,
+            )
+            .exists()
+        )
+    ).scalar_one()
+
+
+def get_ancestor_ids(session, category_id: int) -> List[int]:
+    """Ancestors of category_id, nearest first (the category itself excluded)."""
+    return session.execute(
+        select(CategoryClosure.ancestor_id)
+        .where(CategoryClosure.descendant_id == category_id, CategoryClosure.depth > 0)
+        .order_by(CategoryClosure.depth)
+    ).scalars().all()
+
+
+def subtree_height(session, category_id: int) -> int:
+    """Levels below category_id (0 for a leaf)."""
+    return session.execute(
+        select(func.coalesce(func.max(CategoryClosure.depth), 0)).where(
+            CategoryClosure.ancestor_id == category_id
+        )
+    ).scalar_one()
+
+
+def clear_descendants_cache():
+    _descendants_cache.clear()
+
+
+def add_category_to_closure(session, category_id: int, parent_id: Optional[int]):
+    """Insert the self row plus one row per ancestor of the new category."""
+    rows = select(
+        literal(category_id).label("ancestor_id"),
+        literal(category_id).label("descendant_id"),
+        literal(0).label("depth"),
+    )
+    if parent_id:
+        rows = rows.union_all(
+            select(
+                CategoryClosure.ancestor_id,
+                literal(category_id),
+                CategoryClosure.depth + 1,
+            ).where(CategoryClosure.descendant_id == parent_id)
+        )
+    session.execute(
+        insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"], rows
+        )
+    )
+    clear_descendants_cache()
+
+
+def move_category_subtree(session, category_id: int, new_parent_id: Optional[int]):
+    """Re-hang the subtree rooted at category_id under new_parent_id."""
+    subtree = select(CategoryClosure.descendant_id).where(
+        CategoryClosure.ancestor_id == category_id
+    )
+
+    # Drop paths from the old ancestors into the subtree
+    session.execute(
+        delete(CategoryClosure).where(
+            and_(
+                CategoryClosure.descendant_id.in_(subtree),
+                CategoryClosure.ancestor_id.not_in(subtree),
+            )
+        )
+    )
+
+    # Connect every new ancestor to every subtree node
+    if new_parent_id:
+        above = CategoryClosure.__table__.alias("above")
+        below = CategoryClosure.__table__.alias("below")
+        session.execute(
+            insert(CategoryClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    above.c.ancestor_id,
+                    below.c.descendant_id,
+                    above.c.depth + below.c.depth + 1,
+                )
+                .select_from(above.join(below, literal(True)))
+                .where(
+                    above.c.descendant_id == new_parent_id,
+                    below.c.ancestor_id == category_id,
+                ),
+            )
+        )
+    clear_descendants_cache()
+
+
+def update_subtree(session, category_id: int, include_self: bool = False, **values):
+    """One UPDATE for every descendant of category_id (e.g. admin_commission_rate)."""
+    session.execute(
+        update(Category)
+        .where(Category.id.in_(descendant_ids_subquery(category_id, include_self)))
+        .values(**values)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def relevel_subtree(session, category_id: int, root_id: int, level: int):
+    """Set root_id and level of the subtree after a move (level grows with depth)."""
+    session.execute(
+        update(Category)
+        .where(
+            Category.id == CategoryClosure.descendant_id,
+            CategoryClosure.ancestor_id == category_id,
+        )
+        .values(root_id=root_id, level=level + CategoryClosure.depth)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_category_subtree(session, category_id: int):
+    """Delete category_id and all its descendants in one statement."""
+    session.execute(
+        delete(Category)
+        .where(Category.id.in_(descendant_ids_subquery(category_id)))
+        .execution_options(synchronize_session=False)
+    )
+    clear_descendants_cache()
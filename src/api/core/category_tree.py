@@ -0,0 +1,152 @@
+"""
+In-memory category tree for /category/list.
+
+The nested tree is built from one flat SELECT and kept per process together
+with an ETag. categoryRoute calls mark_category_tree_stale() after every
+category write; that stores a fresh random version token in the cache backend
+(shared between workers when CATEGORY_CACHE_REDIS_URL is set) so every worker
+rebuilds on its next hit. CATEGORY_TREE_TTL bounds the drift when no shared backend is set.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import select
+
+from src.api.core.cache import build_cache_backend
+from src.api.models.category_model.categoryModel import Category, CategoryReadNested
+
+CATEGORY_TREE_TTL = int(os.getenv("CATEGORY_TREE_TTL", 300))
+# The version must outlive every snapshot built under it
+CATEGORY_VERSION_TTL = 30 * 24 * 3600
+
+_versions = build_cache_backend(
+    os.getenv("CATEGORY_CACHE_REDIS_URL"),
+    maxsize=8,
+    ttl=CATEGORY_VERSION_TTL,
+    prefix="category_tree:",
+)
+
+_lock = threading.Lock()
+_snapshot: Optional[dict] = None  # {"version", "built_at", "rows", "views"}
+
+
+def _category_node(category) -> dict:
+    node = jsonable_encoder(
+        CategoryReadNested(
+            id=category.id,
+            name=category.name,
+            image=category.image,
+            root_id=category.root_id,
+            slug=category.slug,
+            details=category.details,
+            is_active=category.is_active,
+            parent_id=category.parent_id,
+            created_at=category.created_at,
+            updated_at=category.updated_at,
+            admin_commission_rate=category.admin_commission_rate,
+            children=[],
+        )
+    )
+    node["children"] = []
+    return node
+
+
+def build_category_tree(rows: List[dict]) -> List[dict]:
+    """
+    Nest flat category nodes under their parents (one pass, order kept).
+    Categories whose parent is not in `rows` are returned as roots.
+    """
+    nodes = {row["id"]: {**row, "children": []} for row in rows}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"]) if node["parent_id"] != node["id"] else None
+        if parent is not None:
+            parent["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def category_nodes(categories) -> List[dict]:
+    return [_category_node(category) for category in categories]
+
+
+def _etag(roots: List[dict]) -> str:
+    body = json.dumps(roots, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+
+def _shared_version() -> Optional[str]:
+    """Current version token ("" before the first write); None when unreadable."""
+    try:
+        return _versions.get("version") or ""
+    except Exception as e:
+        print(f"Category tree version unavailable: {e}")
+        return None
+
+
+def _load(session, version: Optional[str]) -> dict:
+    categories = session.exec(
+        select(Category).order_by(Category.created_at.desc(), Category.id.desc())
+    ).all()
+    return {
+        "version": version,
+        "built_at": time.monotonic(),
+        "rows": category_nodes(categories),
+        "views": {},
+    }
+
+
+def get_category_tree(session, is_active: Optional[bool] = None) -> Tuple[List[dict], str]:
+    """(nested roots, ETag) of the category tree, optionally filtered by is_active."""
+    global _snapshot
+    version = _shared_version()
+    snapshot = _snapshot
+    if (
+        snapshot is None
+        or version is None
+        or snapshot["version"] != version
+        or time.monotonic() - snapshot["built_at"] > CATEGORY_TREE_TTL
+    ):
+        snapshot = _load(session, version)
+        with _lock:
+            _snapshot = snapshot
+
+    views: Dict = snapshot["views"]
+    view = views.get(is_active)
+    if view is None:
+        rows = snapshot["rows"]
+        if is_active is not None:
+            rows = [row for row in rows if row["is_active"] == is_active]
+        roots = build_category_tree(rows)
+        view = (roots, _etag(roots))
+        views[is_active] = view
+    return view
+
+
+def mark_category_tree_stale():
+    """Rebuild the tree in every worker on its next request."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    # A new token, not a read-modify-write counter: concurrent writers in
+    # different workers can never publish the same version
+    try:
+        _versions.set("version", uuid.uuid4().hex)
+    except Exception as e:
+        print(f"Could not bump category tree version: {e}")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header covers `etag` (weak tags compare equal)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
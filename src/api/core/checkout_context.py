@@ -0,0 +1,104 @@
+"""
+Rows referenced by one checkout, loaded up front.
+
+The order routes used to reach every product, variation, shop and category
+through a session.get / SELECT per line (snapshots, commission, availability).
+CheckoutContext.load() fetches them with one IN query per table, plus the
+tax, shipping and coupon rows, and the order helpers read from it:
+
+    checkout = CheckoutContext.load(
+        session, product_ids, variation_ids, tax_id, shipping_id, coupon_id
+    )
+    product = checkout.get(Product, product_id)
+
+CheckoutContext.for_cart() loads the same rows for a user's cart lines, plus
+their shops and manufacturers, for /cart/my-cart.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+
+from src.api.models.category_model.categoryModel import Category
+from src.api.models.couponModel import Coupon
+from src.api.models.manufacturer_model.manufacturerModel import Manufacturer
+from src.api.models.product_model.productsModel import Product
+from src.api.models.product_model.variationOptionModel import VariationOption
+from src.api.models.shipping_model.shippingModel import Shipping
+from src.api.models.shop_model.shopsModel import Shop
+from src.api.models.taxModel import Tax
+
+
+def _ids(values: Iterable[Optional[int]]) -> set:
+    return {value for value in values if value}
+
+
+class CheckoutContext:
+    """Prefetched rows by model and id; get() falls back to session.get."""
+
+    def __init__(self, session):
+        self.session = session
+        self.rows: Dict[type, Dict[int, object]] = {}
+
+    @classmethod
+    def load(
+        cls,
+        session,
+        product_ids: Iterable[int],
+        variation_ids: Iterable[Optional[int]] = (),
+        tax_id: Optional[int] = None,
+        shipping_id: Optional[int] = None,
+        coupon_id: Optional[int] = None,
+    ) -> "CheckoutContext":
+        checkout = cls(session)
+        variations = checkout._fetch(VariationOption, _ids(variation_ids))
+        # A variation's product is needed for its snapshot even if not listed
+        products = checkout._fetch(
+            Product, _ids(product_ids) | _ids(v.product_id for v in variations)
+        )
+        checkout._fetch(Shop, _ids(p.shop_id for p in products))
+        checkout._fetch(Category, _ids(p.category_id for p in products))
+        checkout._fetch(Tax, _ids([tax_id]))
+        checkout._fetch(Shipping, _ids([shipping_id]))
+        checkout._fetch(Coupon, _ids([coupon_id]))
+        return checkout
+
+    @classmethod
+    def for_cart(cls, session, cart_items: Iterable) -> "CheckoutContext":
+        """Rows for building CartItemResponses of `cart_items` (Cart rows)."""
+        cart_items = list(cart_items)
+        checkout = cls.load(
+            session,
+            [cart.product_id for cart in cart_items],
+            [cart.variation_option_id for cart in cart_items],
+        )
+        checkout._fetch(Shop, _ids(cart.shop_id for cart in cart_items))
+        checkout._fetch(Manufacturer, _ids(p.manufacturer_id for p in checkout.products.values()))
+        return checkout
+
+    def _fetch(self, Model, ids: set) -> list:
+        rows = self.rows.setdefault(Model, {})
+        missing = [id for id in ids if id not in rows]
+        if missing:
+            for obj in self.session.execute(select(Model).where(Model.id.in_(missing))).scalars():
+                rows[obj.id] = obj
+            # Remember ids that do not exist, so get() does not look again
+            for id in missing:
+                rows.setdefault(id, None)
+        return [rows[id] for id in ids if rows.get(id) is not None]
+
+    def get(self, Model, id):
+        """Like session.get, answered from the prefetched rows when possible."""
+        if not id:
+            return None
+        rows = self.rows.setdefault(Model, {})
+        if id not in rows:
+            obj = self.session.get(Model, id)
+            if obj is None:
+                return None
+            rows[id] = obj
+        return rows[id]
+
+    @property
+    def products(self) -> Dict[int, Product]:
+        return {id: obj for id, obj in self.rows.get(Product, {}).items() if obj is not None}
@@ -5,6 +5,7 @@ Initializes all cron jobs when the application starts
 """
 import os
 from src.api.services.order_email_cron import order_email_cron
+from src.api.services.outbox_dispatcher import outbox_dispatcher
 
 
 def start_all_cron_jobs():
@@ -13,6 +14,13 @@ def start_all_cron_jobs():
 
     This function should be called during application startup
     """
+    # Order side effects (emails, notifications, logs) wait in the outbox
+    # until a dispatcher runs, so it has its own switch
+    if os.getenv('ENABLE_OUTBOX_DISPATCHER', 'true').lower() == 'true':
+        outbox_dispatcher.start()
+    else:
+        print("⚠️  Outbox dispatcher is disabled via ENABLE_OUTBOX_DISPATCHER environment variable")
+
     # Check if cron jobs should be enabled (useful for development)
     enable_cron = os.getenv('ENABLE_CRON_JOBS', 'true').lower() == 'true'
 
@@ -51,6 +59,8 @@ def stop_all_cron_jobs():
     print("🛑 Stopping Cron Jobs")
     print("="*60)
 
+    outbox_dispatcher.stop()
+
     try:
         # Stop order email cron job
         order_email_cron.stop_cron_job()
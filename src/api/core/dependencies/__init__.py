@@ -1,6 +1,6 @@
 from typing import Annotated, Any, Dict, Optional
 
-from fastapi import Depends, Query
+from fastapi import Depends, Header, Query
 from sqlmodel import Session
 
 from src.api.core.dependencies.query_params import list_query_params
@@ -19,6 +19,9 @@ requireSignin = Annotated[dict, Depends(require_signin)]
 requireAdmin = Annotated[dict, Depends(require_admin)]
 isAuthenticated = Annotated[dict | None, Depends(is_authenticated)]
 ListQueryParams = Annotated[dict, Depends(list_query_params)]
+IdempotencyKeyHeader = Annotated[
+    Optional[str], Header(alias="Idempotency-Key", max_length=255)
+]
 
 
 def requirePermission(*permissions: str):
@@ -28,6 +28,23 @@ class list_query_params:
         sort: Optional[str] = Query(
             None, description="Example : ['created_at|price','asc|desc']"
         ),
+        cursor: Optional[str] = Query(
+            None,
+            description="Keyset pagination: send empty for the first page, then the returned next_cursor",
+        ),
+        format: Optional[str] = Query(
+            None,
+            pattern="^(json|ndjson|csv)$",
+            description="ndjson|csv streams every filtered row instead of one page",
+        ),
+        count: Optional[str] = Query(
+            None,
+            pattern="^(exact|estimate|capped)$",
+            description="totalCount mode: exact (default), estimate, or capped (\">1000\")",
+        ),
+        fields: Optional[str] = Query(
+            None, description="Example : id,name,price,image (only these are returned)"
+        ),
     ):
         self.dateRange = dateRange
         self.skip = skip
@@ -39,3 +56,7 @@ class list_query_params:
         self.page = page
         self.numberRange = numberRange
         self.sort = sort
+        self.cursor = cursor
+        self.format = format
+        self.fields = fields
+        self.count = count
@@ -187,6 +187,92 @@ class EmailHelper:
             print(f"[SMTP ERROR] Full traceback:\n{traceback.format_exc()}")
             return False
     
+    def send_template_email(self,
+                            to_email: Union[str, List[str], List[Dict[str, str]]],
+                            email_template_id: int,
+                            replacements: Optional[Dict[str, Any]] = None,
+                            cc: Optional[Union[str, List[str], List[Dict[str, str]]]] = None,
+                            bcc: Optional[Union[str, List[str], List[Dict[str, str]]]] = None,
+                            session: Optional[Session] = None) -> bool:
+        """
+        Send email using template and wait for the SMTP server
+
+        Same arguments as send_email(). Returns False when the template is
+        missing or inactive or the send failed (the outbox dispatcher retries).
+        """
+        print(f"[EMAIL DEBUG] Sending email to: {to_email}")
+        print(f"[EMAIL DEBUG] Template ID: {email_template_id}")
+        print(f"[EMAIL DEBUG] Replacements: {replacements}")
+
+        # Create session if not provided
+        close_session = False
+        if not session:
+            print("[EMAIL DEBUG] Creating new database session...")
+            from src.lib.db_con import engine  # Import database engine
+            local_session = Session(engine)
+            close_session = True
+            print("[EMAIL DEBUG] Database session created successfully")
+        else:
+            local_session = session
+            print("[EMAIL DEBUG] Using provided session")
+
+        try:
+            # Get template from database
+            print(f"[EMAIL DEBUG] Fetching template ID {email_template_id} from database...")
+            template = self._get_template_from_db(local_session, email_template_id)
+
+            if not template:
+                print(f"[EMAIL ERROR] Email template with ID {email_template_id} not found in database!")
+                return False
+
+            print(f"[EMAIL DEBUG] Template found: {template.name}, is_active: {template.is_active}")
+
+            if not template.is_active:
+                print(f"[EMAIL ERROR] Email template with ID {email_template_id} is not active!")
+                return False
+
+            # Apply replacements to subject and content
+            subject = self._apply_replacements(template.subject, replacements or {})
+            print(f"[EMAIL DEBUG] Subject after replacements: {subject}")
+
+            # Handle HTML content
+            html_content = ""
+            if template.html_content:
+                html_content = self._apply_replacements(template.html_content, replacements or {})
+                print(f"[EMAIL DEBUG] Using html_content (length: {len(html_content)})")
+            elif template.content:
+                # If no HTML content, try to create from JSON content
+                content_data = template.content or {}
+                html_content = self._apply_replacements(str(content_data), replacements or {})
+                print(f"[EMAIL DEBUG] Using content field (length: {len(html_content)})")
+            else:
+                print("[EMAIL ERROR] No html_content or content found in template!")
+        finally:
+            # Close session if we created it
+            if close_session:
+                local_session.close()
+                print("[EMAIL DEBUG] Database session closed")
+
+        # Debug SMTP config
+        print(f"[EMAIL DEBUG] SMTP Host: {self.smtp_host}")
+        print(f"[EMAIL DEBUG] SMTP Port: {self.smtp_port}")
+        print(f"[EMAIL DEBUG] SMTP Username: {self.smtp_username}")
+        print(f"[EMAIL DEBUG] SMTP Password: {'***' if self.smtp_password else 'NOT SET!'}")
+        print(f"[EMAIL DEBUG] From Email: {self.from_email}")
+        print(f"[EMAIL DEBUG] From Name: {self.from_name}")
+
+        # Send email
+        print(f"[EMAIL DEBUG] Calling _send_email_sync...")
+        result = self._send_email_sync(
+            to_email=to_email,
+            subject=subject,
+            html_content=html_content,
+            cc=cc,
+            bcc=bcc
+        )
+        print(f"[EMAIL DEBUG] _send_email_sync returned: {result}")
+        return result
+
     def send_email(self,
                    to_email: Union[str, List[str], List[Dict[str, str]]],
                    email_template_id: int,
@@ -211,81 +297,16 @@ class EmailHelper:
             """Send email in background thread"""
             import traceback
             print(f"[EMAIL DEBUG] Background thread started for email to: {to_email}")
-            print(f"[EMAIL DEBUG] Template ID: {email_template_id}")
-            print(f"[EMAIL DEBUG] Replacements: {replacements}")
 
             try:
-                # Create session if not provided
-                close_session = False
-                if not session:
-                    print("[EMAIL DEBUG] Creating new database session...")
-                    from src.lib.db_con import engine  # Import database engine
-                    local_session = Session(engine)
-                    close_session = True
-                    print("[EMAIL DEBUG] Database session created successfully")
-                else:
-                    local_session = session
-                    print("[EMAIL DEBUG] Using provided session")
-
-                # Get template from database
-                print(f"[EMAIL DEBUG] Fetching template ID {email_template_id} from database...")
-                template = self._get_template_from_db(local_session, email_template_id)
-
-                if not template:
-                    print(f"[EMAIL ERROR] Email template with ID {email_template_id} not found in database!")
-                    if close_session:
-                        local_session.close()
-                    return
-
-                print(f"[EMAIL DEBUG] Template found: {template.name}, is_active: {template.is_active}")
-
-                if not template.is_active:
-                    print(f"[EMAIL ERROR] Email template with ID {email_template_id} is not active!")
-                    if close_session:
-                        local_session.close()
-                    return
-
-                # Apply replacements to subject and content
-                subject = self._apply_replacements(template.subject, replacements or {})
-                print(f"[EMAIL DEBUG] Subject after replacements: {subject}")
-
-                # Handle HTML content
-                html_content = ""
-                if template.html_content:
-                    html_content = self._apply_replacements(template.html_content, replacements or {})
-                    print(f"[EMAIL DEBUG] Using html_content (length: {len(html_content)})")
-                elif template.content:
-                    # If no HTML content, try to create from JSON content
-                    content_data = template.content or {}
-                    html_content = self._apply_replacements(str(content_data), replacements or {})
-                    print(f"[EMAIL DEBUG] Using content field (length: {len(html_content)})")
-                else:
-                    print("[EMAIL ERROR] No html_content or content found in template!")
-
-                # Debug SMTP config
-                print(f"[EMAIL DEBUG] SMTP Host: {self.smtp_host}")
-                print(f"[EMAIL DEBUG] SMTP Port: {self.smtp_port}")
-                print(f"[EMAIL DEBUG] SMTP Username: {self.smtp_username}")
-                print(f"[EMAIL DEBUG] SMTP Password: {'***' if self.smtp_password else 'NOT SET!'}")
-                print(f"[EMAIL DEBUG] From Email: {self.from_email}")
-                print(f"[EMAIL DEBUG] From Name: {self.from_name}")
-
-                # Send email
-                print(f"[EMAIL DEBUG] Calling _send_email_sync...")
-                result = self._send_email_sync(
+                self.send_template_email(
                     to_email=to_email,
-                    subject=subject,
-                    html_content=html_content,
+                    email_template_id=email_template_id,
+                    replacements=replacements,
                     cc=cc,
-                    bcc=bcc
+                    bcc=bcc,
+                    session=session
                 )
-                print(f"[EMAIL DEBUG] _send_email_sync returned: {result}")
-
-                # Close session if we created it
-                if close_session:
-                    local_session.close()
-                    print("[EMAIL DEBUG] Database session closed")
-
             except Exception as e:
                 print(f"[EMAIL ERROR] Exception in background email sending: {e}")
                 print(f"[EMAIL ERROR] Full traceback:\n{traceback.format_exc()}")
@@ -0,0 +1,204 @@
+"""
+Idempotency-Key support for endpoints that must not run twice (order
+creation, payment initiation).
+
+    return run_idempotent(
+        idempotency_key,
+        scope=f"order:create-from-cart:{user_id}",
+        fingerprint=request_fingerprint(request),
+        handler=lambda: _create_order_from_cart(request, session, user),
+    )
+
+The first request with a key claims an `idempotency_keys` row (INSERT ...
+ON CONFLICT DO NOTHING) and stores its response there when it finishes.
+A retry with the same key gets the stored response back. A concurrent
+duplicate waits until the stored response is there, up to
+IDEMPOTENCY_WAIT_SECONDS.
+
+- Reusing a key for a different request body gets 422.
+- 5xx responses and exceptions release the key so the client can retry.
+- Keys expire after IDEMPOTENCY_TTL.
+- A claim left behind by a crashed worker can be taken over after
+  IDEMPOTENCY_LOCK_TIMEOUT.
+
+The rows are written through their own session, so the route's
+transaction (and its rollback) does not affect them.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+
+from src.api.core.response import api_response
+from src.api.core.utility import now_pk
+from src.api.models.idempotencyModel import IdempotencyKey
+from src.lib.db_con import engine
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 300))
+# Share of new claims that also delete expired rows
+IDEMPOTENCY_PURGE_RATE = float(os.getenv("IDEMPOTENCY_PURGE_RATE", 0.01))
+
+_OWNER, _REPLAY, _MISMATCH, _BUSY = "owner", "replay", "mismatch", "busy"
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """sha256 of the JSON form of the request parts (body model, path params)."""
+    body = json.dumps(jsonable_encoder(parts), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def purge_expired_keys(db: Session) -> int:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now_pk()))
+    return result.rowcount or 0
+
+
+def _take_over(db: Session, row: IdempotencyKey, fingerprint: str, condition) -> bool:
+    now = now_pk()
+    taken = db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.id == row.id, condition)
+        .values(
+            request_hash=fingerprint,
+            status_code=None,
+            response_body=None,
+            locked_at=now,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL),
+            updated_at=now,
+        )
+        .returning(IdempotencyKey.id)
+    ).scalar_one_or_none()
+    db.commit()
+    return taken is not None
+
+
+def _claim(scope: str, key: str, fingerprint: str) -> Tuple[str, Any]:
+    """
+    (state, value): the claimed row id for the owner, (status_code, body)
+    for a stored response, None for a mismatch or a busy key.
+    """
+    with Session(engine) as db:
+        now = now_pk()
+        row_id = db.execute(
+            insert(IdempotencyKey)
+            .values(
+                scope=scope,
+                key=key,
+                request_hash=fingerprint,
+                locked_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL),
+                created_at=now,
+            )
+            .on_conflict_do_nothing(constraint="uix_idempotency_scope_key")
+            .returning(IdempotencyKey.id)
+        ).scalar_one_or_none()
+        if row_id is not None:
+            if random.random() < IDEMPOTENCY_PURGE_RATE:
+                purge_expired_keys(db)
+            db.commit()
+            return _OWNER, row_id
+
+        row = db.execute(
+            select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        ).scalar_one_or_none()
+        if row is None:
+            # Released between the INSERT and the SELECT
+            return _BUSY, None
+
+        row_id = row.id
+        if row.expires_at < now:
+            if _take_over(db, row, fingerprint, IdempotencyKey.expires_at == row.expires_at):
+                return _OWNER, row_id
+            return _BUSY, None
+
+        if row.request_hash != fingerprint:
+            return _MISMATCH, None
+
+        if row.status_code is not None:
+            return _REPLAY, (row.status_code, row.response_body)
+
+        stale = now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT)
+        if row.locked_at and row.locked_at < stale:
+            if _take_over(db, row, fingerprint, IdempotencyKey.locked_at == row.locked_at):
+                return _OWNER, row_id
+        return _BUSY, None
+
+
+def _store(row_id: int, response) -> None:
+    if isinstance(response, Response):
+        status_code = response.status_code
+        body = json.loads(response.body) if getattr(response, "body", None) else None
+    else:
+        status_code, body = 200, jsonable_encoder(response)
+
+    with Session(engine) as db:
+        if status_code >= 500:
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.id == row_id))
+        else:
+            db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.id == row_id)
+                .values(status_code=status_code, response_body=body, locked_at=None, updated_at=now_pk())
+            )
+        db.commit()
+
+
+def _release(row_id: int) -> None:
+    with Session(engine) as db:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.id == row_id))
+        db.commit()
+
+
+def _replay(status_code: int, body) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content=body,
+        headers={"X-Content-Type-Options": "nosniff", "Idempotent-Replayed": "true"},
+    )
+
+
+def run_idempotent(
+    idempotency_key: Optional[str],
+    scope: str,
+    fingerprint: str,
+    handler: Callable[[], Any],
+):
+    """Run `handler` once per (scope, key); without a key it just runs."""
+    if not idempotency_key:
+        return handler()
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        state, value = _claim(scope, idempotency_key, fingerprint)
+        if state != _BUSY:
+            break
+        if time.monotonic() >= deadline:
+            return api_response(409, "A request with this Idempotency-Key is still in progress")
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+    if state == _REPLAY:
+        return _replay(*value)
+    if state == _MISMATCH:
+        return api_response(422, "Idempotency-Key was already used for a different request")
+
+    row_id = value
+    try:
+        response = handler()
+    except BaseException:
+        _release(row_id)
+        raise
+    _store(row_id, response)
+    return response
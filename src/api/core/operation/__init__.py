@@ -1,16 +1,34 @@
 from sqlalchemy.exc import DataError
 from src.api.core.utility import now_pk
 from fastapi import Query
-from sqlalchemy import ScalarResult
+import json
+import logging
+from sqlalchemy import ScalarResult, distinct, func, text
 from sqlmodel import Session, SQLModel, select
 from typing import List, Optional
 from src.lib.db_con import get_session
 
 from src.api.core.response import api_response
+from src.api.core.operation.export import (
+    EXPORT_FORMATS,
+    serialize_row,
+    stream_response,
+)
+from src.api.core.operation.fieldsets import (
+    load_only_options,
+    parse_fields,
+    partial_schema,
+)
 from src.api.core.operation.list_operation_helper import (
+    _parse_sort,
     applyFilters,
+    apply_cursor,
+    encode_cursor,
+    has_fanout_join,
 )
 
+logger = logging.getLogger(__name__)
+
 
 # Update only the fields that are provided in the request
 # customFields = ["phone", "firstname", "lastname", "email"]
@@ -51,6 +69,130 @@ def _exec(session, statement, Model):
             return result.all()
 
 
+def _count(session, statement, Model) -> int:
+    """Count distinct rows of the filtered statement without loading them."""
+    if hasattr(Model, "id"):
+        id_subquery = statement.with_only_columns(Model.id).order_by(None).subquery()
+        count_stmt = select(func.count(distinct(id_subquery.c.id)))
+    else:
+        count_stmt = select(func.count()).select_from(
+            statement.order_by(None).subquery()
+        )
+    return session.scalar(count_stmt) or 0
+
+
+COUNT_MODES = ("exact", "estimate", "capped")
+COUNT_CAP = 1000
+
+
+def _count_capped(session, statement, Model, cap: int = COUNT_CAP):
+    """Count at most cap + 1 matching rows; more than cap is reported as ">cap"."""
+    if hasattr(Model, "id"):
+        rows = statement.with_only_columns(Model.id).order_by(None).distinct()
+    else:
+        rows = statement.order_by(None)
+    capped = session.scalar(
+        select(func.count()).select_from(rows.limit(cap + 1).subquery())
+    ) or 0
+    return f">{cap}" if capped > cap else capped
+
+
+def _count_estimate(session, statement, Model, filtered: bool):
+    """
+    Planner estimate of the row count: pg_class.reltuples for an unfiltered
+    list, the EXPLAIN row estimate otherwise. None when no estimate is available.
+    """
+    try:
+        # Savepoint: a failed EXPLAIN must not abort the outer transaction,
+        # otherwise the exact-count fallback fails as well
+        with session.begin_nested():
+            if not filtered and hasattr(Model, "__tablename__"):
+                reltuples = session.scalar(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                    {"table": Model.__tablename__},
+                )
+                # -1 (or 0) means the table has not been analyzed yet
+                if reltuples and reltuples > 0:
+                    return int(reltuples)
+
+            if hasattr(Model, "id"):
+                statement = statement.with_only_columns(Model.id).order_by(None)
+            # render_postcompile expands IN (...) bind lists so the SQL runs as-is
+            compiled = statement.compile(
+                dialect=session.get_bind().dialect,
+                compile_kwargs={"render_postcompile": True},
+            )
+            plan = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+            ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning("Count estimate failed, falling back to exact count: %s", e)
+        return None
+
+
+def count_rows(session, statement, Model, mode: Optional[str] = None, filtered: bool = True):
+    """Total count for a list statement; returns (totalCount, mode actually used)."""
+    mode = mode if mode in COUNT_MODES else "exact"
+    if mode == "estimate":
+        estimate = _count_estimate(session, statement, Model, filtered)
+        if estimate is not None:
+            return estimate, mode
+        mode = "exact"
+    if mode == "capped":
+        return _count_capped(session, statement, Model), mode
+    return _count(session, statement, Model), mode
+
+
+def build_list_statement(
+    Model: type[SQLModel],
+    filters: dict[str, any],
+    searchFields: List[str],
+    Statement=None,
+    otherFilters=None,
+    sort=None,
+    rank_search: bool = False,
+):
+    """Apply the list filters and sort; returns (statement, joined relationships)."""
+    # ✅ Fix: avoid boolean check on SQLAlchemy statements
+    statement = Statement if Statement is not None else select(Model)
+
+    # Apply Filters (joined collects relationships joined by resolve_column)
+    joined = {}
+    statement = applyFilters(
+        statement,
+        Model=Model,
+        searchTerm=filters.get("searchTerm"),
+        searchFields=searchFields,
+        columnFilters=filters.get("columnFilters"),
+        dateRange=filters.get("dateRange"),
+        numberRange=filters.get("numberRange"),
+        customFilters=filters.get("customFilters"),
+        otherFilters=otherFilters,
+        sort=sort,
+        stringArrayFilters=filters.get("stringArrayFilters"),
+        objectArrayFilters=filters.get("objectArrayFilters"),
+        joined=joined,
+        rank_search=rank_search,
+    )
+    return statement, joined
+
+
+def _distinct_statement(statement, Model, sort):
+    """Select Model rows by the distinct filtered ids and re-apply the sort."""
+    id_subquery = statement.with_only_columns(Model.id).order_by(None)
+    joined = {}
+    statement = applyFilters(
+        select(Model).where(Model.id.in_(id_subquery)),
+        Model=Model,
+        sort=sort,
+        joined=joined,
+    )
+    return statement, joined
+
+
 def listop(
     session: Session,
     Model: type[SQLModel],
@@ -63,71 +205,157 @@ def listop(
     Statement=None,
     otherFilters=None,
     sort=None,
+    cursor: Optional[str] = None,
+    fields: Optional[tuple] = None,
+    count: Optional[str] = None,
 ):
+    """
+    Filter, sort and paginate Model rows in the database.
+
+    Pass `cursor` (an empty string for the first page) to switch from
+    OFFSET paging to keyset paging; the response then carries `next_cursor`
+    and skips the total count. `fields` restricts the loaded columns.
+    `count` picks how totalCount is computed: exact (default), estimate
+    (planner statistics) or capped (">1000" past COUNT_CAP rows).
+    """
 
     # Compute skip based on page
     if page is not None and page > 0:
         skip = (page - 1) * limit
 
-    # ✅ Fix: avoid boolean check on SQLAlchemy statements
-    statement = Statement if Statement is not None else select(Model)
+    searchTerm = filters.get("searchTerm")
+
+    # Rank search hits by relevance unless the caller asked for a sort order.
+    # Keyset pages need a stable sort key, so they keep the default order.
+    rank_search = bool(searchTerm) and not sort and cursor is None
+    sort = sort if sort else '["created_at", "desc"]'
+
+    statement, joined = build_list_statement(
+        Model,
+        filters,
+        searchFields,
+        Statement=Statement,
+        otherFilters=otherFilters,
+        sort=sort,
+        rank_search=rank_search,
+    )
+
+    has_id = hasattr(Model, "id")
+    keyset = cursor is not None and has_id
 
-    # Apply JOINs (like selectinload)
+    # Count in the database: COUNT(DISTINCT id) over the filtered ids.
+    # Keyset pages skip it so deep pages stay constant-time.
+    total_count, count_mode = None, None
+    if not keyset:
+        filtered = Statement is not None or otherFilters is not None or any(filters.values())
+        total_count, count_mode = count_rows(
+            session, statement, Model, mode=count, filtered=filtered
+        )
+
+    # A one-to-many join can repeat the same row, so page over the distinct ids
+    # with a semi-join and re-apply the sort on the outer statement.
+    if has_id and has_fanout_join(joined):
+        statement, joined = _distinct_statement(statement, Model, sort)
+
+    if keyset:
+        statement = apply_cursor(statement, Model, sort, cursor, joined)
+
+    # Apply JOINs (like selectinload) only to the page query
     if join_options:
         for option in join_options:
             statement = statement.options(option)
 
-    searchTerm = filters.get("searchTerm")
-    columnFilters = filters.get("columnFilters")
-    dateRange = filters.get("dateRange")
-    numberRange = filters.get("numberRange")
-    customFilters = filters.get("customFilters")
-    stringArrayFilters = filters.get("stringArrayFilters")
-    objectArrayFilters = filters.get("objectArrayFilters")
-
-    # Apply Filters
-    statement = applyFilters(
-        statement,
-        Model=Model,
-        searchTerm=searchTerm,
-        searchFields=searchFields,
-        columnFilters=columnFilters,
-        dateRange=dateRange,
-        numberRange=numberRange,
-        customFilters=customFilters,
-        otherFilters=otherFilters,
-        sort=sort if sort else '["created_at", "desc"]',
-        stringArrayFilters=stringArrayFilters,
-        objectArrayFilters=objectArrayFilters,
-    )
+    # Sparse fieldset: SELECT only the requested columns
+    if fields:
+        statement = statement.options(
+            *load_only_options(Model, fields, _parse_sort(sort)[0])
+        )
 
-    # Fetch all filtered results
-    total = _exec(session, statement, Model)
+    # Let the database paginate (one extra row tells whether a next page exists)
+    if keyset:
+        results = _exec(session, statement.limit(limit + 1), Model)
+    else:
+        results = _exec(session, statement.offset(skip).limit(limit), Model)
 
-    # Deduplicate by id (joins from resolve_column can cause duplicate rows)
-    if hasattr(Model, 'id'):
+    # Safety net: a sort on a to-many path can still repeat a row within the page
+    if has_id:
         seen = set()
         unique = []
-        for item in total:
+        for item in results:
             if item.id not in seen:
                 seen.add(item.id)
                 unique.append(item)
-        total = unique
+        results = unique
+
+    next_cursor = None
+    if keyset and len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(results[-1], sort)
+
+    return {
+        "data": results,
+        "total": len(results),
+        "totalCount": total_count,
+        "next_cursor": next_cursor,
+        "countMode": count_mode,
+    }
+
 
-    total_count = len(total)
+STREAM_BATCH_SIZE = 500
 
-    # Apply pagination on deduplicated results
-    results = total[skip:skip + limit]
 
-    # Debug output to see result types
-    if results and len(results) > 0:
-        first_item = results[0]
-        print(f"DEBUG listop results: type={type(first_item)}, Model={Model.__name__}")
-        if hasattr(first_item, '__class__'):
-            print(f"DEBUG result class name: {first_item.__class__.__name__}")
+def streamRecords(
+    Model,
+    filters: dict,
+    searchFields: list[str],
+    Schema: type[SQLModel],
+    export_format: str,
+    join_options: list = [],
+    otherFilters=None,
+    Statement=None,
+    sort=None,
+    fields: Optional[tuple] = None,
+):
+    """
+    Stream every filtered row as NDJSON or CSV.
+
+    Rows come from a server-side cursor (yield_per) and are validated through
+    Schema one at a time, so memory stays bounded whatever the result size.
+    """
+    sort = sort if sort else '["created_at", "desc"]'
+
+    # Build (and validate the filters of) the statement before the response starts
+    statement, joined = build_list_statement(
+        Model,
+        filters,
+        searchFields,
+        Statement=Statement,
+        otherFilters=otherFilters,
+        sort=sort,
+    )
+    if hasattr(Model, "id") and has_fanout_join(joined):
+        statement, joined = _distinct_statement(statement, Model, sort)
 
-    print(results)
-    return {"data": results, "total": len(results), "totalCount": total_count}
+    for option in join_options:
+        statement = statement.options(option)
+    if fields:
+        statement = statement.options(*load_only_options(Model, fields))
+        Schema = partial_schema(Schema, fields)
+
+    def rows():
+        session = next(get_session())
+        try:
+            result = session.execute(
+                statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+            ).scalars()
+            for row in result:
+                yield serialize_row(row, Schema)
+                # Drop serialized rows from the identity map as we go
+                session.expunge(row)
+        finally:
+            session.close()
+
+    return stream_response(rows(), export_format, filename=Model.__tablename__)
 
 
 def listRecords(
@@ -140,6 +368,34 @@ def listRecords(
     otherFilters=None,
     Statement=None,
 ):
+    fields = parse_fields(query_params.get("fields"))
+
+    # format=ndjson|csv streams the whole filtered set instead of one page
+    export_format = query_params.get("format")
+    if Schema and export_format in EXPORT_FORMATS:
+        return streamRecords(
+            Model,
+            filters={
+                "searchTerm": query_params.get("searchTerm"),
+                "columnFilters": query_params.get("columnFilters"),
+                "dateRange": query_params.get("dateRange"),
+                "numberRange": query_params.get("numberRange"),
+                "customFilters": customFilters
+                if customFilters is not None
+                else query_params.get("customFilters"),
+                "stringArrayFilters": query_params.get("stringArrayFilters"),
+                "objectArrayFilters": query_params.get("objectArrayFilters"),
+            },
+            searchFields=searchFields,
+            Schema=Schema,
+            export_format=export_format,
+            join_options=join_options,
+            otherFilters=otherFilters,
+            Statement=Statement,
+            sort=query_params.get("sort"),
+            fields=fields,
+        )
+
     session = next(get_session())  # get actual Session object
     try:
         # Extract params from query dict
@@ -153,6 +409,8 @@ def listRecords(
         skip = int(query_params.get("skip", 0))
         limit = int(query_params.get("limit", 10))
         sort = query_params.get("sort")
+        cursor = query_params.get("cursor")
+        count = query_params.get("count")
 
         # Get customFilters from query_params if not provided as function parameter
         if customFilters is None:
@@ -180,12 +438,19 @@ def listRecords(
             otherFilters=otherFilters,
             Statement=Statement,
             sort=sort,
+            cursor=cursor,
+            fields=fields if Schema else None,
+            count=count,
         )
 
         # Convert each SQLModel Model instance into a ModelRead Pydantic model
         if not Schema:
             return result
 
+        # Only the requested fields are read and validated (and emitted)
+        if fields:
+            Schema = partial_schema(Schema, fields)
+
         # Validate and deduplicate by id
         seen_ids = set()
         list_data = []
@@ -203,6 +468,8 @@ def listRecords(
             list_data,
             result["total"],
             result.get("totalCount"),
+            next_cursor=result.get("next_cursor"),
+            count_mode=result.get("countMode"),
         )
     except DataError as e:
         # This will catch OFFSET/limit errors and send proper API response
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+from src.api.core.response import format_monetary_values
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def serialize_row(row, Schema=None) -> dict:
+    """Serialize one ORM row the same way api_response would (Read schema + money format)."""
+    item = Schema.model_validate(row) if Schema else row
+    return format_monetary_values(item.model_dump(mode="json"))
+
+
+def _csv_value(value):
+    # Nested objects/lists go into one cell as JSON
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def iter_ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_csv(rows: Iterable[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            # Header comes from the first row (all rows share the Read schema)
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow({k: _csv_value(v) for k, v in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def stream_response(rows: Iterable[dict], export_format: str, filename: Optional[str] = None) -> StreamingResponse:
+    body = iter_csv(rows) if export_format == "csv" else iter_ndjson(rows)
+    headers = {"X-Content-Type-Options": "nosniff"}
+    if filename:
+        extension = "csv" if export_format == "csv" else "ndjson"
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
@@ -0,0 +1,90 @@
+"""
+Sparse fieldsets: `fields=id,name,price` (or a JSON list) limits both the
+SELECTed columns and the serialized payload to the requested fields.
+"""
+
+import json
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, Field, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+def parse_fields(raw) -> Optional[Tuple[str, ...]]:
+    """'id,name' or '["id","name"]' -> ('id', 'name'); None when not given."""
+    if not raw:
+        return None
+    if isinstance(raw, (list, tuple)):
+        names = raw
+    else:
+        raw = raw.strip()
+        try:
+            names = json.loads(raw) if raw.startswith("[") else raw.split(",")
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail=f"Invalid fields: {raw}")
+    fields = []
+    for name in names:
+        name = str(name).strip()
+        if name and name not in fields:
+            fields.append(name)
+    return tuple(fields) or None
+
+
+@lru_cache(maxsize=256)
+def partial_schema(Schema, fields: Tuple[str, ...]):
+    """A Read schema reduced to `fields`; absent fields are neither read nor validated."""
+    unknown = [f for f in fields if f not in Schema.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}. Available: {list(Schema.model_fields)}",
+        )
+
+    definitions = {}
+    for name in fields:
+        info = Schema.model_fields[name]
+        if info.is_required():
+            default = ...
+        elif info.default_factory is not None:
+            default = Field(default_factory=info.default_factory)
+        else:
+            default = info.default
+        definitions[name] = (info.annotation, default)
+
+    return create_model(
+        f"{Schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+def load_only_options(Model, fields: Tuple[str, ...], sort_column: Optional[str] = None) -> list:
+    """load_only() for the requested fields that are plain columns of Model."""
+    columns = inspect(Model).column_attrs
+    names = [f for f in fields if f in columns]
+    if sort_column and sort_column in columns and sort_column not in names:
+        # the keyset cursor reads the sort value off the last row
+        names.append(sort_column)
+    if not names:
+        # only relationships/computed fields requested: still skip the big columns
+        names = [column.key for column in inspect(Model).primary_key]
+    return [load_only(*[getattr(Model, name) for name in names])]
+
+
+def pick_fields(data, fields: Optional[Tuple[str, ...]]):
+    """Trim an already built read payload (model or dict) to `fields`; 400 on unknown names."""
+    if not fields or data is None:
+        return data
+    if isinstance(data, BaseModel):
+        data = data.model_dump()
+    # Same contract as partial_schema: unknown names are an error, not dropped
+    unknown = [f for f in fields if f not in data]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}. Available: {list(data)}",
+        )
+    return {key: value for key, value in data.items() if key in fields}
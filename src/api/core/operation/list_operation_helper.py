@@ -1,23 +1,28 @@
 import ast
+import base64
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
 from src.api.core.utility import now_pk, parse_date
 import json
-from typing import List, Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
 from fastapi import HTTPException
 from sqlmodel import SQLModel, and_, asc, desc, func, or_
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
+from sqlalchemy import cast as sa_cast
 from sqlalchemy.dialects.postgresql import JSONB
+from src.api.core.operation.search import search_condition
 from sqlalchemy.sql import sqltypes as SATypes
 
 
 def _get_column_type(attr):
     # attr is InstrumentedAttribute of a column
     try:
-        col_type = attr.property.columns[0].type
-        print(f"🔧 _get_column_type: {attr.key} -> {col_type} (type: {type(col_type)})")
-        return col_type
-    except Exception as e:
-        print(f"🔧 _get_column_type error: {e}")
+        return attr.property.columns[0].type
+    except Exception:
         return None  # relationship or something unexpected
 
 
@@ -59,65 +64,104 @@ def _coerce_enum_value(col_type, value, col_name: str):
     return value
 
 
-def _coerce_value_for_column(col_type, value, col_name: str):
-    """Coerce incoming value (possibly a string) to a Python value compatible with the column type."""
+def _coerce_passthrough(value, col_name: str):
+    return value
+
+
+def _coerce_number(value, col_name: str, cast):
     if value in ("NULL", "NOT_NULL"):
         return value
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        v = value.strip()
+        try:
+            return cast(v)
+        except ValueError:
+            raise HTTPException(
+                400,
+                f"Column '{col_name}' expects a number; got '{value}'.",
+            )
+    raise HTTPException(400, f"Column '{col_name}' expects a number.")
 
-    if col_type is None:
-        # Fallback – treat as string
+
+def _coerce_integer(value, col_name: str):
+    return _coerce_number(value, col_name, int)
+
+
+def _coerce_float(value, col_name: str):
+    return _coerce_number(value, col_name, float)
+
+
+def _coerce_bool(value, col_name: str):
+    if value in ("NULL", "NOT_NULL"):
+        return value
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        v = value.strip().lower()
+        if v in ("true", "1", "yes"):
+            return True
+        if v in ("false", "0", "no"):
+            return False
+    raise HTTPException(400, f"Column '{col_name}' expects a boolean.")
+
+
+def _coerce_datetime(value, col_name: str):
+    if value in ("NULL", "NOT_NULL"):
         return value
+    if isinstance(value, str):
+        # reuse your existing parse_date
+        return parse_date(value)
+    raise HTTPException(400, f"Column '{col_name}' expects a datetime string.")
+
+
+def _coerce_string(value, col_name: str):
+    # string-like or other -> ensure string
+    return str(value) if not isinstance(value, str) else value
 
+
+def _coercer_for(col_type):
+    """Pick the coercion function for a column type once, instead of per value."""
+    if col_type is None:
+        # Fallback – treat as string
+        return _coerce_passthrough
     if _is_numeric_type(col_type):
-        if isinstance(value, (int, float)):
-            return value
-        if isinstance(value, str):
-            v = value.strip()
-            try:
-                if _is_integer_type(col_type):
-                    return int(v)
-                else:
-                    return float(v)
-            except ValueError:
-                raise HTTPException(
-                    400,
-                    f"Column '{col_name}' expects a number; got '{value}'.",
-                )
-        raise HTTPException(400, f"Column '{col_name}' expects a number.")
-    elif _is_bool_type(col_type):
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            v = value.strip().lower()
-            if v in ("true", "1", "yes"):
-                return True
-            if v in ("false", "0", "no"):
-                return False
-        raise HTTPException(400, f"Column '{col_name}' expects a boolean.")
-    elif _is_datetime_type(col_type):
-        if isinstance(value, str):
-            # reuse your existing parse_date
-            return parse_date(value)
-        raise HTTPException(400, f"Column '{col_name}' expects a datetime string.")
-    else:
-        # string-like or other -> ensure string
-        return str(value) if not isinstance(value, str) else value
+        return _coerce_integer if _is_integer_type(col_type) else _coerce_float
+    if _is_bool_type(col_type):
+        return _coerce_bool
+    if _is_datetime_type(col_type):
+        return _coerce_datetime
+    return _coerce_string
 
 
-def resolve_column(Model, col: str, statement, joined=None):  # nested object filter
-    """
-    Given 'product.owner.role.title', return (attr, updated_statement).
-    Uses `joined` set to track already-joined relationships and avoid duplicate joins
-    which cause duplicate rows in results.
-    """
-    if joined is None:
-        joined = set()
+def _coerce_value_for_column(col_type, value, col_name: str):
+    """Coerce incoming value (possibly a string) to a Python value compatible with the column type."""
+    return _coercer_for(col_type)(value, col_name)
+
 
-    parts = col.split(".")
+# ===================
+# FILTER PLAN CACHE ====================================
+# ===================
+# The admin panel sends the same filter shapes over and over. Everything that
+# depends only on (Model, column path) or on the raw filter string is compiled
+# once and reused, so a repeat request goes straight to binding values.
+@dataclass(frozen=True)
+class ColumnPlan:
+    attr: Any  # InstrumentedAttribute of the final column (None for a relationship path)
+    joins: tuple  # ((join_key, relationship attribute), ...) in join order
+    col_type: Any
+    coerce: Callable
+
+
+@lru_cache(maxsize=2048)
+def compile_column(Model, col: str) -> ColumnPlan:
+    """Resolve 'category.name' style paths on Model into a cached ColumnPlan."""
     current_model = Model
     attr = None
+    joins = []
 
-    for i, part in enumerate(parts):  # enumerate = index + value in one go
+    for part in col.split("."):
         try:
             mapper_attr = getattr(current_model, part)
         except AttributeError:
@@ -128,18 +172,190 @@ def resolve_column(Model, col: str, statement, joined=None):  # nested object fi
             )
 
         if hasattr(mapper_attr, "property") and hasattr(mapper_attr.property, "mapper"):
-            # It's a relationship -> join it only if not already joined
-            related_model = mapper_attr.property.mapper.class_
-            join_key = f"{current_model.__name__}.{part}"
-            if join_key not in joined:
-                statement = statement.join(mapper_attr, isouter=True)
-                joined.add(join_key)
-            current_model = related_model
+            # It's a relationship
+            joins.append((f"{current_model.__name__}.{part}", mapper_attr))
+            current_model = mapper_attr.property.mapper.class_
         else:
             # It's a column
             attr = mapper_attr
 
-    return attr, statement
+    col_type = _get_column_type(attr) if attr is not None else None
+    return ColumnPlan(
+        attr=attr,
+        joins=tuple(joins),
+        col_type=col_type,
+        coerce=_coercer_for(col_type),
+    )
+
+
+def _freeze(value):
+    """Lists -> tuples so cached parse results can be shared safely."""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def _parse_literal_cached(raw: str):
+    # Try json.loads first, fall back to ast.literal_eval for single quotes
+    try:
+        return _freeze(json.loads(raw))
+    except json.JSONDecodeError:
+        return _freeze(ast.literal_eval(raw))
+
+
+def parse_filter_spec(raw):
+    """Parse a filter query string (columnFilters, sort, ranges, ...) once per distinct value."""
+    if isinstance(raw, str):
+        return _parse_literal_cached(raw)
+    return raw
+
+
+def clear_filter_plan_cache():
+    compile_column.cache_clear()
+    _parse_literal_cached.cache_clear()
+
+
+def resolve_column(Model, col: str, statement, joined=None):  # nested object filter
+    """
+    Given 'product.owner.role.title', return (attr, updated_statement).
+    Uses `joined` dict (join key -> relationship property) to track already-joined
+    relationships and avoid duplicate joins which cause duplicate rows in results.
+    """
+    if joined is None:
+        joined = {}
+
+    plan = compile_column(Model, col)
+    for join_key, mapper_attr in plan.joins:
+        # join it only if not already joined
+        if join_key not in joined:
+            statement = statement.join(mapper_attr, isouter=True)
+            joined[join_key] = mapper_attr.property
+
+    return plan.attr, statement
+
+
+def has_fanout_join(joined) -> bool:
+    """True if any relationship joined by resolve_column is one-to-many / many-to-many,
+    i.e. the joined statement can return the same parent row more than once."""
+    return any(getattr(prop, "uselist", False) for prop in (joined or {}).values())
+
+
+def _parse_sort(sort):
+    """'["created_at","desc"]' (or a list) -> ("created_at", "desc")."""
+    column_name, direction = parse_filter_spec(sort)
+    return column_name, direction.lower()
+
+
+def resolve_sort(Model, sort, statement, joined=None):
+    """
+    Resolve a sort spec into (order_expr, direction, updated_statement).
+    Strings are sorted case-insensitively via lower().
+    """
+    column_name, direction = _parse_sort(sort)
+    attr, statement = resolve_column(Model, column_name, statement, joined)
+    col_type = compile_column(Model, column_name).col_type
+
+    # Case-insensitive sorting for strings
+    if _is_string_type(col_type):
+        order_expr = func.lower(attr)
+    else:
+        order_expr = attr
+    return order_expr, direction, statement
+
+
+# ===================
+# KEYSET (CURSOR) PAGINATION ====================================
+# ===================
+def _encode_cursor_value(value):
+    if isinstance(value, datetime):
+        return {"t": "dt", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"t": "dec", "v": str(value)}
+    if isinstance(value, Enum):
+        return {"t": "raw", "v": value.value}
+    return {"t": "raw", "v": value}
+
+
+def _decode_cursor_value(tagged):
+    kind, value = tagged.get("t"), tagged.get("v")
+    if value is None:
+        return None
+    if kind == "dt":
+        return datetime.fromisoformat(value)
+    if kind == "dec":
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(item, sort) -> str:
+    """
+    Build an opaque cursor from the last row of a page: its sort key plus id
+    (the tiebreaker applyFilters always appends).
+    """
+    column_name, direction = _parse_sort(sort)
+
+    value = item
+    for part in column_name.split("."):
+        value = getattr(value, part, None) if value is not None else None
+    # Match the lower() applied to string sort columns
+    if isinstance(value, str):
+        value = value.lower()
+
+    payload = {
+        "s": [column_name, direction],
+        "k": _encode_cursor_value(value),
+        "id": item.id,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {
+            "sort": tuple(payload["s"]),
+            "value": _decode_cursor_value(payload["k"]),
+            "id": int(payload["id"]),
+        }
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def apply_cursor(statement, Model, sort, cursor: str, joined=None):
+    """
+    Restrict an ordered statement to the rows after `cursor`.
+    An empty cursor means the first page. Ordering is (sort key, id ASC),
+    with Postgres' default NULLS LAST for ASC and NULLS FIRST for DESC.
+    """
+    if not cursor:
+        return statement
+
+    decoded = decode_cursor(cursor)
+    if decoded["sort"] != _parse_sort(sort):
+        raise HTTPException(400, "Cursor does not match the requested sort")
+
+    order_expr, direction, statement = resolve_sort(Model, sort, statement, joined)
+    value = decoded["value"]
+    after_id = Model.id > decoded["id"]
+
+    if value is None:
+        if direction == "asc":
+            condition = and_(order_expr.is_(None), after_id)
+        else:
+            condition = or_(order_expr.isnot(None), and_(order_expr.is_(None), after_id))
+    elif direction == "asc":
+        condition = or_(
+            order_expr > value,
+            and_(order_expr == value, after_id),
+            order_expr.is_(None),
+        )
+    else:
+        condition = or_(order_expr < value, and_(order_expr == value, after_id))
+
+    return statement.where(condition)
 
 
 # ===================
@@ -161,7 +377,7 @@ def string_array_filter(statement: Select, Model, parsed_filters, joined=None):
     - values (list[str]) -> any match is accepted (OR)
     """
     if joined is None:
-        joined = set()
+        joined = {}
     filters = []
     for entry in parsed_filters:
         if not isinstance(entry, (list, tuple)) or len(entry) < 2:
@@ -173,7 +389,6 @@ def string_array_filter(statement: Select, Model, parsed_filters, joined=None):
             values = [values]
 
         attr, statement = resolve_column(Model, col_name, statement, joined)
-        col_type = _get_column_type(attr)
 
         ors = []
         # ✅ Force cast to JSONB for Postgres
@@ -226,7 +441,7 @@ def object_array_filter(statement: Select, Model, parsed_filters, joined=None):
     - Each top-level column entry becomes one AND group (you can pass multiple columns if needed)
     """
     if joined is None:
-        joined = set()
+        joined = {}
     filters = []
 
     for entry in parsed_filters:
@@ -245,7 +460,7 @@ def object_array_filter(statement: Select, Model, parsed_filters, joined=None):
         except Exception:
             continue
 
-        col_type = _get_column_type(attr)
+        col_type = compile_column(Model, col_name).col_type
         # We expect JSON column for object-array; if not JSON, try text fallback
         if not (isinstance(col_type, SATypes.JSON) or isinstance(col_type, JSONB)):
             # Non-JSON fallback: try text search (single condition)
@@ -261,6 +476,10 @@ def object_array_filter(statement: Select, Model, parsed_filters, joined=None):
             continue
 
         # Build JSON containment conditions
+        # ✅ Compare as JSONB so @> can use the GIN index on (column::jsonb)
+        if not isinstance(col_type, JSONB):
+            attr = sa_cast(attr, JSONB)
+
         # We'll collect per-kind lists: e.g. name_conditions, values_conditions, etc.
         kind_map: dict[str, list] = {}
 
@@ -335,31 +554,34 @@ def applyFilters(
     sort: Optional[str] = None,
     stringArrayFilters: Optional[List[List[str]]] = None,
     objectArrayFilters: Optional[List[List[str]]] = None,
+    joined: Optional[dict] = None,
+    rank_search: bool = False,
 ):
-    # Track joined relationships to avoid duplicate joins causing duplicate rows
-    joined = set()
+    # Track joined relationships to avoid duplicate joins causing duplicate rows.
+    # Callers may pass their own dict to inspect which relationships were joined.
+    if joined is None:
+        joined = {}
 
     if otherFilters:
         # pass the current statement through the hook
         statement = otherFilters(statement, Model)
-    # Global search
+    # Global search (full-text / trigram when available, ILIKE otherwise)
     if searchTerm and searchFields:
-        # search_filters = [
-        #     getattr(Model, field).ilike(f"%{searchTerm}%") for field in searchTerms
-        # ]
-        search_filters = []
+        search_attrs = []
         for col in searchFields:
             attr, statement = resolve_column(Model, col, statement, joined)
-            search_filters.append(attr.ilike(f"%{searchTerm}%"))
-        statement = statement.where(or_(*search_filters))
+            search_attrs.append(attr)
+        condition, rank = search_condition(Model, searchTerm, search_attrs)
+        if condition is not None:
+            statement = statement.where(condition)
+        # Best matches first; the regular sort then breaks ties
+        if rank_search and rank is not None:
+            statement = statement.order_by(desc(rank))
 
     # Column-specific search
     if columnFilters:
         try:
-            if isinstance(columnFilters, str):
-                parsed_terms = ast.literal_eval(columnFilters)
-            else:
-                parsed_terms = columnFilters
+            parsed_terms = parse_filter_spec(columnFilters)
             columnFilters = [tuple(sublist) for sublist in parsed_terms]
 
             # Group filters by column name
@@ -370,15 +592,15 @@ def applyFilters(
             filters = []
             for col, values in grouped.items():
                 attr, statement = resolve_column(Model, col, statement, joined)
-                col_type = _get_column_type(attr)
-                print(f"🔧 columnFilters: col={col}, col_type={col_type}")
+                plan = compile_column(Model, col)
+                col_type = plan.col_type
 
                 coerced_values = []
                 for v in values:
-                    if isinstance(v, list):
-                        coerced_values.append([_coerce_value_for_column(col_type, item, col) for item in v])
+                    if isinstance(v, (list, tuple)):
+                        coerced_values.append([plan.coerce(item, col) for item in v])
                     else:
-                        coerced_values.append(_coerce_value_for_column(col_type, v, col))
+                        coerced_values.append(plan.coerce(v, col))
 
                 # If multiple values → OR
                 ors = []
@@ -408,47 +630,35 @@ def applyFilters(
             raise e
 
     if customFilters:
-        print(f"🔧 applyFilters: customFilters = {customFilters}")
         filters = []
         for col, value in customFilters:
-            print(f"🔧 Processing customFilter: col={col}, value={value}, type={type(value)}")
             attr, statement = resolve_column(Model, col, statement, joined)
             # optional handling formats
-            col_type = _get_column_type(attr)
-            print(f"🔧 Column type for {col}: {col_type}")
-            
+            plan = compile_column(Model, col)
+            col_type = plan.col_type
+
             # Handle None value for IS NULL check
             if value is None:
                 filters.append(attr.is_(None))
-                print(f"🔧 Using IS NULL for {col}")
                 continue
-            
-            value = _coerce_value_for_column(col_type, value, col)
-            print(f"🔧 After coercion: value={value}, type={type(value)}")
+
+            value = plan.coerce(value, col)
 
             if _is_enum_type(col_type):
-                print(f"🔧 Using == for enum {col}")
                 coerced_value = _coerce_enum_value(col_type, value, col)
                 filters.append(attr == coerced_value)
             elif isinstance(value, str):
-                print(f"🔧 Using ILIKE for {col}")
                 filters.append(attr.ilike(f"%{value}%"))
             else:
-                print(f"🔧 Using == for {col}")
                 filters.append(attr == value)
 
-        print(f"🔧 Total filters: {len(filters)}")
         statement = statement.where(and_(*filters))
 
     # Number range
     if numberRange:
         try:
             # number_range should be like ("amount", "0", "100000")
-            # Try json.loads first, fall back to ast.literal_eval for single quotes
-            try:
-                parsed = tuple(json.loads(numberRange))
-            except json.JSONDecodeError:
-                parsed = tuple(ast.literal_eval(numberRange))
+            parsed = tuple(parse_filter_spec(numberRange))
 
             column_name, *values = parsed  # first element is column name, rest are values
 
@@ -470,13 +680,7 @@ def applyFilters(
     # Date range
     if dateRange:
         try:
-            # Try json.loads first, fall back to ast.literal_eval for single quotes
-            try:
-                dateRangeParse = json.loads(dateRange)
-            except json.JSONDecodeError:
-                dateRangeParse = ast.literal_eval(dateRange)
-
-            dateRange = tuple(dateRangeParse)
+            dateRange = tuple(parse_filter_spec(dateRange))
 
             column_name = dateRange[0]  # e.g. "created_at"
             column = getattr(Model, column_name)  # map to SQLModel column
@@ -506,29 +710,11 @@ def applyFilters(
         # Sorting
 
     if sort:
-        try:
-            # Try json.loads first, fall back to ast.literal_eval for single quotes
-            try:
-                parsed_sort = json.loads(sort)
-            except json.JSONDecodeError:
-                parsed_sort = ast.literal_eval(sort)
-
-            column_name, direction = parsed_sort
-            attr, statement = resolve_column(Model, column_name, statement, joined)
-            col_type = _get_column_type(attr)
-
-            # Case-insensitive sorting for strings
-            if _is_string_type(col_type):
-                order_expr = func.lower(attr)
-            else:
-                order_expr = attr
-
-            if direction.lower() == "asc":
-                statement = statement.order_by(asc(order_expr))
-            elif direction.lower() == "desc":
-                statement = statement.order_by(desc(order_expr))
-        except Exception as e:
-            raise e
+        order_expr, direction, statement = resolve_sort(Model, sort, statement, joined)
+        if direction == "asc":
+            statement = statement.order_by(asc(order_expr))
+        elif direction == "desc":
+            statement = statement.order_by(desc(order_expr))
 
     # Add secondary sort by id for deterministic pagination
     if hasattr(Model, 'id'):
@@ -538,11 +724,7 @@ def applyFilters(
         string_array_raw = stringArrayFilters
         if string_array_raw:
             try:
-                parsed = (
-                    ast.literal_eval(string_array_raw)
-                    if isinstance(string_array_raw, str)
-                    else string_array_raw
-                )
+                parsed = parse_filter_spec(string_array_raw)
                 statement = string_array_filter(statement, Model, parsed, joined)
             except Exception as e:
                 raise e
@@ -551,12 +733,11 @@ def applyFilters(
 
         if object_array_raw:
             try:
-                # Handle JSON with null values - replace null with None before parsing
-                if isinstance(object_array_raw, str):
-                    object_array_raw = object_array_raw.replace('null', 'None')
-                    parsed = ast.literal_eval(object_array_raw)
-                else:
-                    parsed = object_array_raw
+                try:
+                    parsed = parse_filter_spec(object_array_raw)
+                except (ValueError, SyntaxError):
+                    # Python-literal style with JSON nulls - replace null with None before parsing
+                    parsed = parse_filter_spec(object_array_raw.replace('null', 'None'))
                 statement = object_array_filter(statement, Model, parsed, joined)
             except Exception as e:
                 raise e
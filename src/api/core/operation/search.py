@@ -0,0 +1,103 @@
+"""
+Search backend for `searchTerm`.
+
+Tables listed in SEARCH_VECTOR_COLUMNS carry a generated `tsvector` column
+(see migration add_product_search_indexes). When it exists the term is matched
+with `websearch_to_tsquery` and ranked with `ts_rank_cd`; with pg_trgm
+installed the ILIKE conditions are served by the trigram GIN indexes and
+the first search field adds `similarity()` to the rank. Without either the
+search degrades to the plain ILIKE scan.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, or_, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from src.lib.db_con import engine
+
+# table name -> generated tsvector column
+SEARCH_VECTOR_COLUMNS = {"products": "search_vector"}
+SEARCH_CONFIG = "simple"
+
+
+@dataclass(frozen=True)
+class SearchCapabilities:
+    trigram: bool = False
+    vector_tables: frozenset = frozenset()
+
+
+_capabilities: Optional[SearchCapabilities] = None
+
+
+def get_search_capabilities() -> SearchCapabilities:
+    """Probe the database once for pg_trgm and the search_vector columns."""
+    global _capabilities
+    if _capabilities is not None:
+        return _capabilities
+    try:
+        with engine.connect() as conn:
+            trigram = (
+                conn.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first()
+                is not None
+            )
+            rows = conn.execute(
+                text(
+                    "SELECT table_name, column_name FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND data_type = 'tsvector'"
+                )
+            ).all()
+        vector_tables = frozenset(
+            table
+            for table, column in rows
+            if SEARCH_VECTOR_COLUMNS.get(table) == column
+        )
+        _capabilities = SearchCapabilities(trigram=trigram, vector_tables=vector_tables)
+    except Exception as e:
+        # Don't cache: the next request probes again once the database is back
+        print(f"Search capability probe failed, falling back to ILIKE: {e}")
+        return SearchCapabilities()
+    return _capabilities
+
+
+def reset_search_capabilities():
+    """Forget the probed capabilities (call after running the search migration)."""
+    global _capabilities
+    _capabilities = None
+
+
+def search_condition(Model, searchTerm: str, attrs: List) -> Tuple[Optional[object], Optional[object]]:
+    """
+    Build the WHERE condition and rank expression for `searchTerm` over `attrs`.
+
+    Returns (condition, rank); condition is None for an empty term and rank is
+    None when the table has neither a search vector nor pg_trgm.
+    """
+    term = (searchTerm or "").strip()
+    if not term:
+        return None, None
+
+    caps = get_search_capabilities()
+    conditions = [attr.ilike(f"%{term}%") for attr in attrs]
+    ranks = []
+
+    table = getattr(Model, "__tablename__", None)
+    if table in caps.vector_tables:
+        vector = literal_column(f"{table}.{SEARCH_VECTOR_COLUMNS[table]}", type_=TSVECTOR)
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, term)
+        conditions.insert(0, vector.op("@@")(query))
+        ranks.append(func.ts_rank_cd(vector, query))
+
+    if caps.trigram and attrs:
+        ranks.append(func.coalesce(func.similarity(attrs[0], term), 0))
+
+    rank = None
+    if ranks:
+        rank = ranks[0]
+        for extra in ranks[1:]:
+            rank = rank + extra
+
+    return or_(*conditions), rank
@@ -0,0 +1,231 @@
+"""
+Transactional outbox for the side effects of order changes (notifications,
+emails, transaction logs, shop earnings).
+
+A route adds the event in the same transaction as the change it describes:
+
+    enqueue(session, "order.placed", {"order_id": order.id, ...})
+    session.commit()
+
+A rollback discards the event with the change. Once committed, the event
+is run by the outbox dispatcher (src/api/services/outbox_dispatcher.py),
+even if the process dies right after the commit. Delivery is at least
+once, so handlers must tolerate running twice.
+
+dispatch_batch() claims up to OUTBOX_BATCH_SIZE due events with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers can drain the table
+side by side.
+
+- Each event runs in its own session.
+- A failure is retried with exponential backoff. After OUTBOX_MAX_ATTEMPTS
+  the event is marked failed.
+- A claim left behind by a crashed worker is picked up again after
+  OUTBOX_LOCK_TIMEOUT.
+
+Handlers are registered with @outbox_handler(event_type). Domain events
+(order.placed, order.cancelled, ...) fan out into the leaf events
+registered here: one per email, notification or transaction log. A failing
+email then retries on its own.
+"""
+
+import os
+import threading
+import traceback
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, event, or_, select, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from src.api.core.email_helper import email_helper
+from src.api.core.notification_helper import NotificationHelper
+from src.api.core.transaction_logger import TransactionLogger
+from src.api.core.utility import now_pk
+from src.api.models.outboxModel import OutboxEvent
+from src.api.models.transactionLogModel import TransactionLogCreate
+from src.lib.db_con import engine
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_RETRY_DELAY = int(os.getenv("OUTBOX_RETRY_DELAY", 30))
+OUTBOX_LOCK_TIMEOUT = int(os.getenv("OUTBOX_LOCK_TIMEOUT", 300))
+# Done events are kept this long for inspection
+OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", 7 * 24 * 3600))
+
+PENDING, PROCESSING, DONE, FAILED = "pending", "processing", "done", "failed"
+
+HANDLERS: Dict[str, Callable[[Session, Any], None]] = {}
+
+# Set when a transaction with new events commits; the dispatcher waits on it
+wakeup = threading.Event()
+_ENQUEUED_KEY = "outbox_enqueued"
+
+
+def outbox_handler(event_type: str):
+    """Register `handler(db, payload)` for `event_type`."""
+    def register(handler):
+        HANDLERS[event_type] = handler
+        return handler
+    return register
+
+
+def enqueue(session, event_type: str, payload: Optional[dict] = None) -> OutboxEvent:
+    """Add an event to `session`; it is dispatched once the session commits."""
+    outbox_event = OutboxEvent(event_type=event_type, payload=jsonable_encoder(payload or {}))
+    session.add(outbox_event)
+    session.info[_ENQUEUED_KEY] = True
+    return outbox_event
+
+
+def enqueue_email(session, to_email, email_template_id: int, replacements: Optional[dict] = None):
+    """send_email(), delivered by the dispatcher."""
+    if not to_email:
+        return None
+    return enqueue(session, "email", {
+        "to_email": to_email,
+        "email_template_id": email_template_id,
+        "replacements": replacements or {},
+    })
+
+
+def enqueue_notification(session, name: str, **kwargs):
+    """NotificationHelper.<name>(session, **kwargs), delivered by the dispatcher."""
+    return enqueue(session, "notification", {"name": name, "kwargs": kwargs})
+
+
+def enqueue_transaction_log(session, log_data: TransactionLogCreate):
+    """TransactionLogger.log_transaction(log_data), written by the dispatcher."""
+    return enqueue(session, "transaction_log", log_data.model_dump(exclude_none=True))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop(_ENQUEUED_KEY, None):
+        wakeup.set()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_enqueued(session):
+    session.info.pop(_ENQUEUED_KEY, None)
+
+
+# ==========================================
+# Leaf handlers
+# ==========================================
+@outbox_handler("email")
+def _send_email(db: Session, payload: dict):
+    if not email_helper.send_template_email(session=db, **payload):
+        raise RuntimeError(
+            f"Email template {payload.get('email_template_id')} to {payload.get('to_email')} was not sent"
+        )
+
+
+@outbox_handler("notification")
+def _send_notification(db: Session, payload: dict):
+    name = payload["name"]
+    notify = getattr(NotificationHelper, name, None)
+    if name.startswith("_") or not callable(notify):
+        raise LookupError(f"Unknown notification {name!r}")
+    notify(session=db, **payload.get("kwargs", {}))
+
+
+@outbox_handler("transaction_log")
+def _write_transaction_log(db: Session, payload: dict):
+    TransactionLogger(db).log_transaction(TransactionLogCreate(**payload))
+
+
+# ==========================================
+# Dispatch
+# ==========================================
+def _claim_batch(limit: int) -> List[Any]:
+    """Mark up to `limit` due events as processing and return them, oldest first."""
+    now = now_pk()
+    stale = now - timedelta(seconds=OUTBOX_LOCK_TIMEOUT)
+    due = (
+        select(OutboxEvent.id)
+        .where(
+            or_(
+                and_(OutboxEvent.status == PENDING, OutboxEvent.available_at <= now),
+                and_(OutboxEvent.status == PROCESSING, OutboxEvent.locked_at < stale),
+            )
+        )
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    with Session(engine) as db:
+        rows = db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(due))
+            .values(status=PROCESSING, locked_at=now, attempts=OutboxEvent.attempts + 1)
+            .returning(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.attempts)
+        ).all()
+        db.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _mark_done(db: Session, event_id: int):
+    db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id == event_id)
+        .values(status=DONE, processed_at=now_pk(), locked_at=None, last_error=None)
+    )
+
+
+def _mark_failed(event_id: int, attempts: int, error: str):
+    now = now_pk()
+    gave_up = attempts >= OUTBOX_MAX_ATTEMPTS
+    with Session(engine) as db:
+        db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id == event_id)
+            .values(
+                status=FAILED if gave_up else PENDING,
+                available_at=now + timedelta(seconds=OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)),
+                locked_at=None,
+                last_error=error,
+            )
+        )
+        db.commit()
+    return gave_up
+
+
+def run_event(event_id: int, event_type: str, payload: Any, attempts: int) -> bool:
+    """
+    Run one claimed event. The done mark commits with whatever the handler
+    left uncommitted, so a fan-out and its child events land together.
+    """
+    handler = HANDLERS.get(event_type)
+    try:
+        if handler is None:
+            raise LookupError(f"No outbox handler for {event_type!r}")
+        with Session(engine) as db:
+            handler(db, payload)
+            _mark_done(db, event_id)
+            db.commit()
+        return True
+    except Exception as e:
+        gave_up = _mark_failed(event_id, attempts, traceback.format_exc())
+        print(
+            f"[outbox] {event_type} #{event_id} failed (attempt {attempts}"
+            f"{', giving up' if gave_up else ''}): {e}"
+        )
+        return False
+
+
+def dispatch_batch(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claim and run one batch of due events; returns how many were claimed."""
+    rows = _claim_batch(limit)
+    for row in rows:
+        run_event(row.id, row.event_type, row.payload, row.attempts)
+    return len(rows)
+
+
+def purge_processed_events(db: Session) -> int:
+    cutoff = now_pk() - timedelta(seconds=OUTBOX_RETENTION)
+    result = db.execute(
+        delete(OutboxEvent).where(OutboxEvent.status == DONE, OutboxEvent.processed_at < cutoff)
+    )
+    return result.rowcount or 0
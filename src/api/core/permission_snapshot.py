@@ -0,0 +1,250 @@
+"""
+Server-side permission snapshots for compact access tokens.
+
+An access token carries only {"id", "v"}: the user id and the version of
+the user's snapshot when it was issued. The roles, permissions and shops
+live in permission_snapshots and in an in-process cache:
+
+    snapshot = get_user_snapshot(user_id, token_version)
+    snapshot.user          # {"id", "email", "is_root", "roles", "permissions", "shops"}
+    snapshot.permissions   # PermissionSet
+
+A flush listener bumps the version and clears the data of every user whose
+role assignments, roles, owned shops or account flags change. The next
+request rebuilds the snapshot from the database, so permission changes
+apply without a new login. This process drops its cached entry at commit.
+Other workers see the change within SNAPSHOT_CACHE_TTL seconds, or at once
+for a token issued after the bump.
+"""
+
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import event, inspect, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+
+from src.api.core.cache import MemoryCacheBackend
+from src.api.core.utility import now_pk
+from src.api.models.permissionSnapshotModel import PermissionSnapshot
+from src.api.models.role_model.roleModel import Role
+from src.api.models.role_model.userRoleModel import UserRole
+from src.api.models.shop_model.shopsModel import Shop
+from src.api.models.usersModel import User
+from src.lib.db_con import engine
+
+SNAPSHOT_CACHE_TTL = int(os.getenv("SNAPSHOT_CACHE_TTL", 30))
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", 10000))
+
+# In-process: entries hold compiled PermissionSets
+_cache = MemoryCacheBackend(maxsize=SNAPSHOT_CACHE_SIZE, ttl=SNAPSHOT_CACHE_TTL)
+
+_PENDING_KEY = "permission_snapshot_invalidations"
+
+# User columns the snapshot depends on
+_USER_FIELDS = ("email", "is_root", "is_active")
+
+
+class PermissionSet:
+    """
+    A token's permissions, compiled once so every check is a set lookup.
+
+    Grants: an exact permission, `resource:*` for anything on the resource,
+    `system:*` for everything. A required `resource:*` is met by any
+    permission on the resource.
+    """
+
+    __slots__ = ("exact", "wildcards", "prefixes", "all")
+
+    def __init__(self, permissions: Iterable[str]):
+        self.exact = frozenset(permissions or ())
+        self.all = "system:*" in self.exact
+        # Resources granted with `resource:*`
+        self.wildcards = frozenset(p[:-2] for p in self.exact if p.endswith(":*"))
+        # Every `a`, `a:b` in front of a `:` of a permission (for required `a:*`, `a:b:*`)
+        self.prefixes = frozenset(
+            ":".join(parts[:i])
+            for parts in (p.split(":") for p in self.exact)
+            for i in range(1, len(parts))
+        )
+
+    def allows(self, required: str) -> bool:
+        if self.all or required in self.exact:
+            return True
+        if ":" in required:
+            if required.split(":")[0] in self.wildcards:
+                return True
+            if required.endswith(":*") and required[:-2] in self.prefixes:
+                return True
+        return False
+
+    def allows_any(self, required: Iterable[str]) -> bool:
+        return any(self.allows(permission) for permission in required)
+
+
+class UserSnapshot:
+    """One version of a user's snapshot, with its permissions compiled."""
+
+    __slots__ = ("version", "user", "permissions")
+
+    def __init__(self, version: int, user: Dict[str, Any]):
+        self.version = version
+        self.user = user
+        self.permissions = PermissionSet(user.get("permissions", []))
+
+
+def build_user_data(user: User) -> Dict[str, Any]:
+    """What login used to put in the token: roles, permissions and shops."""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "is_root": user.is_root or False,
+        "roles": user.role_names,
+        "permissions": user.permissions,
+        "shops": [{"id": shop.id, "name": shop.name} for shop in user.shops],
+    }
+
+
+def _load_user(db, user_id: int) -> Optional[User]:
+    return db.execute(
+        select(User)
+        .options(
+            selectinload(User.user_roles).selectinload(UserRole.role),
+            selectinload(User.shops),
+        )
+        .where(User.id == user_id)
+    ).scalars().first()
+
+
+def issue_snapshot(session, user: User) -> int:
+    """
+    Store a fresh snapshot for `user` (roles and shops loaded) at login or
+    refresh and return its version for the token. Commits with `session`.
+    """
+    data = build_user_data(user)
+    table = PermissionSnapshot.__table__
+    stmt = insert(table).values(user_id=user.id, version=1, data=data, updated_at=now_pk())
+    version = session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={"version": table.c.version + 1, "data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        ).returning(table.c.version)
+    ).scalar_one()
+    session.info.setdefault(_PENDING_KEY, set()).add(user.id)
+    return version
+
+
+def _rebuild(user_id: int) -> Optional[UserSnapshot]:
+    table = PermissionSnapshot.__table__
+    with Session(engine) as db:
+        row = db.execute(
+            select(table.c.version, table.c.data).where(table.c.user_id == user_id)
+        ).first()
+        if row is not None and row.data is not None:
+            snapshot = UserSnapshot(row.version, row.data)
+            _cache.set(str(user_id), snapshot)
+            return snapshot
+
+        # The version is read before the roles: a bump in between makes the
+        # write below miss, so stale data is never stored under a new version
+        user = _load_user(db, user_id)
+        if user is None or not user.is_active:
+            return None
+        data = build_user_data(user)
+        if row is None:
+            version = db.execute(
+                insert(table)
+                .values(user_id=user_id, version=1, data=data, updated_at=now_pk())
+                .on_conflict_do_nothing(index_elements=[table.c.user_id])
+                .returning(table.c.version)
+            ).scalar_one_or_none()
+            stored = version is not None
+        else:
+            version = row.version
+            stored = db.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.version == version)
+                .values(data=data, updated_at=now_pk())
+            ).rowcount == 1
+        db.commit()
+    snapshot = UserSnapshot(version or 0, data)
+    # Lost a race with a bump or another rebuild: serve it, but do not cache it
+    if stored:
+        _cache.set(str(user_id), snapshot)
+    return snapshot
+
+
+def get_user_snapshot(user_id: int, min_version: int = 0) -> Optional[UserSnapshot]:
+    """The user's snapshot, at least `min_version` (the token's); None if the user is gone or inactive."""
+    snapshot = _cache.get(str(user_id))
+    if snapshot is not None and snapshot.version >= min_version:
+        return snapshot
+    return _rebuild(user_id)
+
+
+def bump_snapshots(session, user_ids: Iterable[int] = (), role_ids: Iterable[int] = ()):
+    """Move the snapshots of these users, and of every holder of these roles, to a new version."""
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    role_ids = sorted({role_id for role_id in role_ids if role_id})
+    conditions = []
+    if user_ids:
+        conditions.append(PermissionSnapshot.__table__.c.user_id.in_(user_ids))
+    if role_ids:
+        conditions.append(PermissionSnapshot.__table__.c.user_id.in_(
+            select(UserRole.__table__.c.user_id).where(UserRole.__table__.c.role_id.in_(role_ids))
+        ))
+    if not conditions:
+        return
+
+    table = PermissionSnapshot.__table__
+    # On the connection: this also runs inside a flush (see _bump_changed_users)
+    bumped = session.connection().execute(
+        update(table)
+        .where(or_(*conditions))
+        .values(version=table.c.version + 1, data=None, updated_at=now_pk())
+        .returning(table.c.user_id)
+    ).scalars().all()
+    session.info.setdefault(_PENDING_KEY, set()).update(bumped)
+
+
+def _changed(obj, *fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _old_and_new(obj, field) -> set:
+    history = inspect(obj).attrs[field].history
+    return set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_users(session, flush_context):
+    user_ids, role_ids = set(), set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, UserRole):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, Shop):
+            user_ids.add(obj.owner_id)
+    for obj in session.dirty:
+        if isinstance(obj, UserRole) and _changed(obj, "user_id", "role_id"):
+            user_ids.update(_old_and_new(obj, "user_id"))
+        elif isinstance(obj, Role) and _changed(obj, "name", "permissions", "is_active"):
+            role_ids.add(obj.id)
+        elif isinstance(obj, Shop) and _changed(obj, "name", "owner_id"):
+            user_ids.update(_old_and_new(obj, "owner_id"))
+        elif isinstance(obj, User) and _changed(obj, *_USER_FIELDS):
+            user_ids.add(obj.id)
+    if user_ids or role_ids:
+        bump_snapshots(session, user_ids, role_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_after_commit(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        _cache.delete(*[str(user_id) for user_id in user_ids])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,108 @@
+"""
+Read-through cache for the enhanced product detail payload (/product/read).
+
+Entries are keyed by product id; a slug key maps to the id. Every write path
+that changes a product calls invalidate_product(s); when given the session,
+the keys are dropped again after the transaction commits so a concurrent
+read cannot re-cache the pre-commit row.
+"""
+
+import os
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.api.core.cache import CacheBackend, build_cache_backend
+
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 300))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 2000))
+
+_backend: CacheBackend = build_cache_backend(
+    os.getenv("PRODUCT_CACHE_REDIS_URL"),
+    maxsize=PRODUCT_CACHE_SIZE,
+    ttl=PRODUCT_CACHE_TTL,
+    prefix="product:",
+)
+
+_PENDING_KEY = "product_cache_invalidations"
+
+
+def set_product_cache_backend(backend: CacheBackend):
+    """Swap the backend (e.g. a shared one for multi-worker deployments)."""
+    global _backend
+    _backend = backend
+
+
+def _id_key(product_id) -> str:
+    return f"id:{product_id}"
+
+
+def _slug_key(slug: str) -> str:
+    return f"slug:{slug.lower()}"
+
+
+def get_cached_product(id_slug: str) -> Optional[dict]:
+    """Cached payload for a product id or slug, or None on a miss."""
+    try:
+        if id_slug.isdigit():
+            return _backend.get(_id_key(int(id_slug)))
+
+        product_id = _backend.get(_slug_key(id_slug))
+        if product_id is None:
+            return None
+        payload = _backend.get(_id_key(product_id))
+        # The slug may have moved to another product since it was cached
+        if payload and (payload.get("slug") or "").lower() == id_slug.lower():
+            return payload
+    except Exception as e:
+        print(f"Product cache read failed: {e}")
+    return None
+
+
+def cache_product(payload: dict):
+    """Store the JSON-able enhanced payload under its id and slug."""
+    product_id = payload.get("id")
+    if product_id is None:
+        return
+    try:
+        _backend.set(_id_key(product_id), payload)
+        if payload.get("slug"):
+            _backend.set(_slug_key(payload["slug"]), product_id)
+    except Exception as e:
+        print(f"Product cache write failed: {e}")
+
+
+def invalidate_products(product_ids: Iterable[int], session: Optional[Session] = None):
+    keys = [_id_key(product_id) for product_id in product_ids if product_id is not None]
+    if not keys:
+        return
+    try:
+        _backend.delete(*keys)
+    except Exception as e:
+        print(f"Product cache invalidation failed: {e}")
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+def invalidate_product(product_id: int, session: Optional[Session] = None):
+    invalidate_products([product_id], session=session)
+
+
+def clear_product_cache():
+    _backend.clear()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        try:
+            _backend.delete(*keys)
+        except Exception as e:
+            print(f"Product cache invalidation failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,244 @@
+"""
+Facet counts for the storefront filter sidebar (/product/facets).
+
+The caller's list filters are applied once through build_list_statement and
+the matching product ids are used as a subquery by two grouped statements:
+
+- one GROUPING SETS query for category, manufacturer, shop, price bucket and
+  in-stock counts;
+- one query over the attribute values of `Product.attributes` and
+  `VariationOption.options`, counting distinct products per (name, value).
+"""
+
+from typing import Iterable, List, Optional, Sequence
+
+from sqlalchemy import (
+    Float,
+    and_,
+    case,
+    cast,
+    column,
+    distinct,
+    func,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.api.core.operation import build_list_statement
+from src.api.models.category_model.categoryModel import Category
+from src.api.models.manufacturer_model.manufacturerModel import Manufacturer
+from src.api.models.product_model.productsModel import Product
+from src.api.models.product_model.variationOptionModel import VariationOption
+from src.api.models.shop_model.shopsModel import Shop
+
+DEFAULT_PRICE_BUCKETS = (0, 500, 1000, 2500, 5000, 10000)
+
+_EMPTY_ARRAY = literal_column("'[]'::jsonb", JSONB)
+_EMPTY_OBJECT = literal_column("'{}'::jsonb", JSONB)
+
+
+def parse_price_buckets(raw: Optional[str]) -> Sequence[float]:
+    """"0,500,1000" -> (0.0, 500.0, 1000.0); the defaults when empty or invalid."""
+    if not raw:
+        return DEFAULT_PRICE_BUCKETS
+    try:
+        bounds = sorted({float(part) for part in raw.split(",") if part.strip()})
+    except ValueError:
+        return DEFAULT_PRICE_BUCKETS
+    return tuple(bounds) or DEFAULT_PRICE_BUCKETS
+
+
+def _effective_price():
+    """Sale price when it is a real discount, the regular price otherwise."""
+    return case(
+        (
+            and_(Product.sale_price > 0, Product.sale_price < Product.price),
+            Product.sale_price,
+        ),
+        else_=func.coalesce(Product.price, Product.min_price, 0),
+    )
+
+
+def _price_bucket(bounds: Sequence[float]):
+    """Index of the bucket the effective price falls in (-1 below the first bound)."""
+    price = cast(_effective_price(), Float)
+    whens = [(price < bounds[0], -1)]
+    whens += [(price < upper, index) for index, upper in enumerate(bounds[1:])]
+    return case(*whens, else_=len(bounds) - 1)
+
+
+def _json_array(expr):
+    return case((func.jsonb_typeof(expr) == "array", expr), else_=_EMPTY_ARRAY)
+
+
+def _bucket_label(bounds: Sequence[float], index: int) -> dict:
+    lower = bounds[index] if index >= 0 else None
+    upper = bounds[index + 1] if index + 1 < len(bounds) else None
+    return {"min": lower, "max": upper}
+
+
+def _dimension_counts(session, product_ids, bounds: Sequence[float]) -> dict:
+    bucket = _price_bucket(bounds).label("price_bucket")
+    statement = (
+        select(
+            Product.category_id,
+            Category.name.label("category_name"),
+            Product.manufacturer_id,
+            Manufacturer.name.label("manufacturer_name"),
+            Product.shop_id,
+            Shop.name.label("shop_name"),
+            bucket,
+            Product.in_stock,
+            func.grouping(Product.category_id).label("g_category"),
+            func.grouping(Product.manufacturer_id).label("g_manufacturer"),
+            func.grouping(Product.shop_id).label("g_shop"),
+            func.grouping(bucket).label("g_price"),
+            func.count().label("product_count"),
+        )
+        .select_from(Product)
+        .outerjoin(Category, Product.category_id == Category.id)
+        .outerjoin(Manufacturer, Product.manufacturer_id == Manufacturer.id)
+        .outerjoin(Shop, Product.shop_id == Shop.id)
+        .where(Product.id.in_(product_ids))
+        .group_by(
+            func.grouping_sets(
+                tuple_(Product.category_id, Category.name),
+                tuple_(Product.manufacturer_id, Manufacturer.name),
+                tuple_(Product.shop_id, Shop.name),
+                tuple_(bucket),
+                tuple_(Product.in_stock),
+            )
+        )
+    )
+
+    facets = {
+        "categories": [],
+        "manufacturers": [],
+        "shops": [],
+        "price": [],
+        "in_stock": {"true": 0, "false": 0},
+    }
+    total = 0
+    for row in session.exec(statement).all():
+        if row.g_category == 0:
+            facets["categories"].append(
+                {"id": row.category_id, "name": row.category_name, "count": row.product_count}
+            )
+        elif row.g_manufacturer == 0:
+            if row.manufacturer_id is not None:
+                facets["manufacturers"].append(
+                    {"id": row.manufacturer_id, "name": row.manufacturer_name, "count": row.product_count}
+                )
+        elif row.g_shop == 0:
+            if row.shop_id is not None:
+                facets["shops"].append({"id": row.shop_id, "name": row.shop_name, "count": row.product_count})
+        elif row.g_price == 0:
+            facets["price"].append({**_bucket_label(bounds, row.price_bucket), "count": row.product_count})
+        else:
+            # Every product has exactly one in_stock value, so this set is the total
+            facets["in_stock"]["true" if row.in_stock else "false"] += row.product_count
+            total += row.product_count
+
+    for key in ("categories", "manufacturers", "shops"):
+        facets[key].sort(key=lambda item: (-item["count"], item["id"]))
+    facets["price"].sort(key=lambda item: (item["min"] is not None, item["min"] or 0))
+    facets["total"] = total
+    return facets
+
+
+def _attribute_pairs(product_ids):
+    """(product_id, name, value) from the product attributes JSON."""
+    attributes = cast(Product.attributes, JSONB)
+    attr = (
+        func.jsonb_array_elements(_json_array(attributes))
+        .table_valued(column("value", JSONB))
+        .lateral("attr")
+    )
+    val = (
+        func.jsonb_array_elements(_json_array(attr.c.value["values"]))
+        .table_valued(column("value", JSONB))
+        .lateral("val")
+    )
+    # Only the values a product actually uses when selected_values is given
+    selected = _json_array(attr.c.value["selected_values"])
+    return (
+        select(
+            Product.id.label("product_id"),
+            attr.c.value["name"].astext.label("name"),
+            val.c.value["value"].astext.label("value"),
+        )
+        .select_from(Product)
+        .join(attr, true())
+        .join(val, true())
+        .where(
+            Product.id.in_(product_ids),
+            or_(
+                func.jsonb_array_length(selected) == 0,
+                selected.contains(func.jsonb_build_array(val.c.value["id"])),
+            ),
+        )
+    )
+
+
+def _option_pairs(product_ids):
+    """(product_id, name, value) from the options of active variations."""
+    options = cast(VariationOption.options, JSONB)
+    opt = (
+        func.jsonb_each_text(
+            case((func.jsonb_typeof(options) == "object", options), else_=_EMPTY_OBJECT)
+        )
+        .table_valued("key", "value")
+        .lateral("opt")
+    )
+    return (
+        select(
+            VariationOption.product_id.label("product_id"),
+            opt.c.key.label("name"),
+            opt.c.value.label("value"),
+        )
+        .select_from(VariationOption)
+        .join(opt, true())
+        .where(
+            VariationOption.product_id.in_(product_ids),
+            VariationOption.is_active == True,
+            VariationOption.is_disable == False,
+        )
+    )
+
+
+def _attribute_counts(session, product_ids) -> List[dict]:
+    pairs = union_all(_attribute_pairs(product_ids), _option_pairs(product_ids)).subquery("pairs")
+    statement = (
+        select(pairs.c.name, pairs.c.value, func.count(distinct(pairs.c.product_id)).label("product_count"))
+        .where(pairs.c.name.isnot(None), pairs.c.value.isnot(None), pairs.c.value != "")
+        .group_by(pairs.c.name, pairs.c.value)
+        .order_by(pairs.c.name, func.count(distinct(pairs.c.product_id)).desc(), pairs.c.value)
+    )
+
+    grouped: dict[str, list] = {}
+    for row in session.exec(statement).all():
+        grouped.setdefault(row.name, []).append({"value": row.value, "count": row.product_count})
+    return [{"name": name, "values": values} for name, values in grouped.items()]
+
+
+def product_facets(
+    session,
+    filters: dict,
+    searchFields: Iterable[str],
+    otherFilters=None,
+    price_buckets: Sequence[float] = DEFAULT_PRICE_BUCKETS,
+) -> dict:
+    """Facet counts for the products matching the list filters."""
+    statement, _ = build_list_statement(
+        Product, filters, list(searchFields), otherFilters=otherFilters
+    )
+    product_ids = statement.with_only_columns(Product.id).order_by(None)
+
+    facets = _dimension_counts(session, product_ids, price_buckets)
+    facets["attributes"] = _attribute_counts(session, product_ids)
+    return facets
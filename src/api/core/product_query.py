@@ -0,0 +1,276 @@
+"""
+Composable product query shared by the storefront / feed routes.
+
+A ProductQuery collects WHERE conditions (related-table checks are EXISTS
+semijoins, so no joins and no duplicate rows) and an ORDER BY. page() puts
+the filtered ids in one CTE and reads both the requested page and the total
+count from it in a single statement, so the count always matches the rows.
+
+    products, total = (
+        ProductQuery()
+        .storefront(is_active, shop_id)
+        .list_params(query_params_dict)
+        .sort(query_params_dict.get("sort"), "created_at", "desc")
+        .page(session, skip, limit)
+    )
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, func, or_, select
+
+from src.api.core.operation.list_operation_helper import parse_filter_spec
+from src.api.core.operation.search import search_condition
+from src.api.models.category_model.categoryModel import Category, CategoryClosure
+from src.api.models.manufacturer_model.manufacturerModel import Manufacturer
+from src.api.models.product_model.productsModel import Product, ProductType
+from src.api.models.shop_model.shopsModel import Shop
+
+
+def on_sale_condition():
+    """
+    Simple products with a sale price, variable products with a variation on
+    sale (the maintained has_variation_sale flag, no variation scan).
+    """
+    simple_sale = and_(
+        Product.product_type == ProductType.SIMPLE,
+        Product.sale_price > 0,
+        Product.sale_price < Product.price,
+    )
+    variable_sale = and_(
+        Product.product_type == ProductType.VARIABLE,
+        Product.has_variation_sale == True,
+    )
+    return or_(simple_sale, variable_sale)
+
+
+class ProductQuery:
+    """Filtered, sorted product statement built once per request."""
+
+    def __init__(self, *conditions):
+        self.conditions: List = [c for c in conditions if c is not None]
+        self.order_by_clauses: List = []
+
+    def where(self, *conditions) -> "ProductQuery":
+        self.conditions.extend(c for c in conditions if c is not None)
+        return self
+
+    # ─── Common filters ───────────────────────────────────────────────────────
+
+    def active(self, is_active: Optional[bool] = True) -> "ProductQuery":
+        if is_active is not None:
+            self.where(Product.is_active == is_active)
+        return self
+
+    def shop_active(self, is_active: bool = True) -> "ProductQuery":
+        return self.where(
+            exists().where(Shop.id == Product.shop_id, Shop.is_active == is_active)
+        )
+
+    def shops(self, shop_ids: Optional[Iterable[int]]) -> "ProductQuery":
+        if shop_ids is not None:
+            self.where(Product.shop_id.in_(list(shop_ids)))
+        return self
+
+    def storefront(self, is_active: Optional[bool] = True, shop_id: Optional[int] = None) -> "ProductQuery":
+        """Products of active shops (the base of every public feed)."""
+        self.active(is_active).shop_active()
+        if shop_id:
+            self.where(Product.shop_id == shop_id)
+        return self
+
+    def category_active(self, is_active: Optional[bool]) -> "ProductQuery":
+        if is_active is not None:
+            self.where(
+                exists().where(Category.id == Product.category_id, Category.is_active == is_active)
+            )
+        return self
+
+    def in_category_tree(self, category_id: Optional[int]) -> "ProductQuery":
+        """Category and all its descendants, via the closure table."""
+        if category_id is not None:
+            self.where(
+                exists().where(
+                    CategoryClosure.ancestor_id == category_id,
+                    CategoryClosure.descendant_id == Product.category_id,
+                )
+            )
+        return self
+
+    def _manufacturer(self, condition) -> "ProductQuery":
+        # Products without a manufacturer always pass
+        return self.where(
+            or_(
+                Product.manufacturer_id.is_(None),
+                exists().where(Manufacturer.id == Product.manufacturer_id, condition),
+            )
+        )
+
+    def manufacturer_active(self, is_active: Optional[bool]) -> "ProductQuery":
+        if is_active is not None:
+            self._manufacturer(Manufacturer.is_active == is_active)
+        return self
+
+    def manufacturer_approved(self, is_approved: Optional[bool]) -> "ProductQuery":
+        if is_approved is not None:
+            self._manufacturer(Manufacturer.is_approved == is_approved)
+        return self
+
+    def related_active(
+        self,
+        category_is_active: Optional[bool] = None,
+        manufacturer_is_active: Optional[bool] = None,
+        manufacturer_is_approved: Optional[bool] = None,
+    ) -> "ProductQuery":
+        return (
+            self.category_active(category_is_active)
+            .manufacturer_active(manufacturer_is_active)
+            .manufacturer_approved(manufacturer_is_approved)
+        )
+
+    def quantity(
+        self,
+        eq: Optional[int] = None,
+        lt: Optional[int] = None,
+        gt: Optional[int] = None,
+        min: Optional[int] = None,
+        max: Optional[int] = None,
+    ) -> "ProductQuery":
+        if eq is not None:
+            self.where(Product.quantity == eq)
+        if lt is not None:
+            self.where(Product.quantity < lt)
+        if gt is not None:
+            self.where(Product.quantity > gt)
+        if min is not None:
+            self.where(Product.quantity >= min)
+        if max is not None:
+            self.where(Product.quantity <= max)
+        return self
+
+    def product_type(self, product_type: Optional[str]) -> "ProductQuery":
+        if product_type:
+            member = ProductType.__members__.get(product_type.upper())
+            if member is not None:
+                self.where(Product.product_type == member)
+        return self
+
+    def on_sale(self) -> "ProductQuery":
+        return self.where(on_sale_condition())
+
+    # ─── ListQueryParams ──────────────────────────────────────────────────────
+
+    def search(self, searchTerm: Optional[str]) -> "ProductQuery":
+        condition, _ = search_condition(
+            Product, searchTerm, [Product.name, Product.description, Product.sku]
+        )
+        return self.where(condition)
+
+    def column_filters(self, raw) -> "ProductQuery":
+        """[["field", value], ["field", [v1, v2]]] on Product columns."""
+        if not raw:
+            return self
+        try:
+            col_filters = parse_filter_spec(raw)
+        except (ValueError, SyntaxError):
+            raise HTTPException(400, f"Invalid columnFilters: {raw}")
+        for col_filter in col_filters:
+            field_name, field_value = col_filter[0], col_filter[1]
+            if hasattr(Product, field_name):
+                field = getattr(Product, field_name)
+                if isinstance(field_value, (list, tuple)):
+                    self.where(field.in_(field_value))
+                else:
+                    self.where(field == field_value)
+        return self
+
+    def number_range(self, raw) -> "ProductQuery":
+        """["column", min, max] with either bound optional."""
+        if not raw:
+            return self
+        try:
+            parsed = parse_filter_spec(raw)
+            column_name = parsed[0]
+            min_val = float(parsed[1]) if len(parsed) > 1 and parsed[1] is not None else None
+            max_val = float(parsed[2]) if len(parsed) > 2 and parsed[2] is not None else None
+        except (ValueError, SyntaxError, TypeError, IndexError):
+            raise HTTPException(400, f"Invalid numberRange: {raw}")
+
+        if hasattr(Product, column_name):
+            column = getattr(Product, column_name)
+            if min_val is not None:
+                self.where(column >= min_val)
+            if max_val is not None:
+                self.where(column <= max_val)
+        return self
+
+    def list_params(self, query_params: dict) -> "ProductQuery":
+        """searchTerm, columnFilters and numberRange from ListQueryParams."""
+        return (
+            self.search(query_params.get("searchTerm"))
+            .column_filters(query_params.get("columnFilters"))
+            .number_range(query_params.get("numberRange"))
+        )
+
+    # ─── Ordering ─────────────────────────────────────────────────────────────
+
+    def order_by(self, *clauses) -> "ProductQuery":
+        self.order_by_clauses.extend(clauses)
+        return self
+
+    def sort(self, raw, default_field: Optional[str] = None, default_order: str = "desc") -> "ProductQuery":
+        """["column", "asc|desc"] or the default, always followed by id for stable pages."""
+        field, order = default_field, default_order
+        if raw:
+            try:
+                field, order = parse_filter_spec(raw)[:2]
+            except (ValueError, SyntaxError, TypeError):
+                raise HTTPException(400, f"Invalid sort: {raw}")
+        if field and hasattr(Product, field):
+            column = getattr(Product, field)
+            self.order_by(column.asc() if str(order).lower() == "asc" else column.desc())
+        return self.order_by(Product.id.asc())
+
+    # ─── Execution ────────────────────────────────────────────────────────────
+
+    def ids(self):
+        """SELECT of the matching product ids (for IN / CTE use)."""
+        return select(Product.id).where(*self.conditions)
+
+    def statement(self):
+        return select(Product).where(*self.conditions).order_by(*self.order_by_clauses)
+
+    def count(self, session) -> int:
+        matched = self.ids().cte("matched")
+        return session.execute(select(func.count()).select_from(matched)).scalar_one()
+
+    def page(self, session, skip: int, limit: int, columns=None, with_count: bool = True) -> Tuple[list, Optional[int]]:
+        """
+        (rows, total) for one page. Rows are Product objects, or Row objects of
+        `columns` (a select of Product columns, optionally with outer joins).
+        total is None when with_count is False.
+        """
+        matched = self.ids().cte("matched")
+        statement = columns if columns is not None else select(Product)
+        if with_count:
+            total = select(func.count()).select_from(matched).scalar_subquery()
+            statement = statement.add_columns(total.label("total_count"))
+        statement = (
+            statement.join(matched, matched.c.id == Product.id)
+            .order_by(*self.order_by_clauses)
+            .offset(skip)
+            .limit(limit)
+        )
+        rows = session.execute(statement).all()
+
+        total_count = None
+        if with_count:
+            if rows:
+                total_count = rows[-1].total_count
+            else:
+                # Past the last page the total is not carried by any row
+                total_count = self.count(session) if skip else 0
+        if columns is None:
+            return [row[0] for row in rows], total_count
+        return rows, total_count
@@ -44,7 +44,9 @@ def api_response(
     detail: str,
     data: Optional[Union[dict, list]] = None,
     total: Optional[int] = None,
-    totalCount: Optional[int] = None,
+    totalCount: Optional[Union[int, str]] = None,
+    next_cursor: Optional[str] = None,
+    count_mode: Optional[str] = None,
 ):
 
     # Convert data to JSON-able format
@@ -63,6 +65,11 @@ def api_response(
         content["total"] = total
     if totalCount is not None:
         content["totalCount"] = totalCount
+        # exact | estimate | capped (capped counts read ">1000")
+        if count_mode is not None:
+            content["countMode"] = count_mode
+    if next_cursor is not None:
+        content["next_cursor"] = next_cursor
 
     headers = {"X-Content-Type-Options": "nosniff"}
 
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
+import hashlib
+import os
+import time
 from src.api.core.utility import now_pk
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from sqlalchemy import select
@@ -18,11 +21,20 @@ from fastapi.security import (
 )
 
 from src.config import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
+from src.api.core.cache import MemoryCacheBackend
+from src.api.core.permission_snapshot import PermissionSet, UserSnapshot, get_user_snapshot
 from src.api.core.response import api_response
 from src.api.models import User
 
 ALGORITHM = "HS256"
 
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+# ✅ In-process only: entries hold compiled permission sets, and verified
+# tokens are not something to share through an external store
+_token_cache = MemoryCacheBackend(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
 pwd_context = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
@@ -72,24 +84,55 @@ def create_access_token(
 
 def verify_refresh_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return verify_token(token).payload
     except JWTError:
         return None
 
 
+class VerifiedToken:
+    """A decoded, signature-checked token and its compiled permissions."""
+
+    __slots__ = ("payload", "user", "permissions", "expires_at")
+
+    def __init__(self, payload: Dict):
+        self.payload = payload
+        self.user = payload.get("user")
+        self.permissions = PermissionSet((self.user or {}).get("permissions", []))
+        exp = payload.get("exp")
+        self.expires_at = float(exp) if exp is not None else None
+
+
+def verify_token(token: str) -> VerifiedToken:
+    """
+    jwt.decode with an LRU cache keyed by the token hash, so a token is
+    HMAC-checked once rather than on every dependency call. An entry never
+    outlives the token's `exp`. Raises JWTError like jwt.decode.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    now = time.time()
+    verified = _token_cache.get(key)
+    if verified is not None and (verified.expires_at is None or verified.expires_at > now):
+        return verified
+
+    verified = VerifiedToken(jwt.decode(
+        token,
+        SECRET_KEY,
+        algorithms=[ALGORITHM],
+        options={"verify_exp": True},  # verifies expiration
+    ))
+    ttl = TOKEN_CACHE_TTL
+    if verified.expires_at is not None:
+        ttl = min(ttl, int(verified.expires_at - now))
+    if ttl > 0:
+        _token_cache.set(key, verified, ttl=ttl)
+    return verified
+
+
 def decode_token(
     token: str,
 ) -> Optional[Dict]:
     try:
-        decode = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
-            options={"verify_exp": True},  # Ensure expiration is verified
-        )
-
-        return decode
+        return verify_token(token).payload
 
     except JWTError as e:
         print(f"Token decoding failed: {e}")
@@ -111,48 +154,62 @@ def is_authenticated(authorization: Optional[str] = Header(None)):
 
     token = parts[1]
     try:
-        payload = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
-            options={"verify_exp": True},  # verifies expiration
-        )
-        user = payload.get("user")
-        return user
+        verified = verify_token(token)
     except JWTError:
         return None
+    if verified.user is None:
+        return None
+    identity = resolve_identity(verified)
+    return dict(identity.user) if identity is not None else None
 
 
-def require_signin(
+def resolve_identity(verified: VerifiedToken) -> Optional[Union[VerifiedToken, UserSnapshot]]:
+    """
+    The user and permissions behind a token. A compact token ({"id", "v"})
+    is resolved through its permission snapshot; None when the user is gone
+    or inactive. Tokens issued before snapshots still carry everything.
+    """
+    if "v" not in verified.user:
+        return verified
+    return get_user_snapshot(verified.user["id"], verified.user["v"])
+
+
+def signed_in_token(
     credentials: HTTPAuthorizationCredentials = Security(HTTPBearer()),
-) -> Dict:
+) -> Union[VerifiedToken, UserSnapshot]:
     token = credentials.credentials  # Extract token from Authorization header
 
     try:
-        payload = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
+        verified = verify_token(token)
+    except JWTError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {str(e)}")
+
+    if verified.user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token: no user data",
         )
-        user = payload.get("user")
 
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token: no user data",
-            )
+    if verified.payload.get("refresh") is True:
+        raise HTTPException(
+            status_code=401,
+            detail="Refresh token is not allowed for this route",
+        )
 
-        if payload.get("refresh") is True:
-            raise HTTPException(
-                status_code=401,
-                detail="Refresh token is not allowed for this route",
-            )
+    identity = resolve_identity(verified)
+    if identity is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token: user not found or inactive",
+        )
+    return identity
 
-        return user  # contains {"email": ..., "id": ...}
 
-    except JWTError as e:
-        print(e)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {str(e)}")
+def require_signin(
+    identity: Union[VerifiedToken, UserSnapshot] = Depends(signed_in_token),
+) -> Dict:
+    # A copy: the cached token or snapshot is shared by every request
+    return dict(identity.user)  # contains {"email": ..., "id": ...}
 
 
 def require_admin(user: dict = Depends(require_signin)):
@@ -171,36 +228,13 @@ def require_permission(*permissions):
         else:
             flat_permissions.append(p)
 
-    def permission_checker(user: dict = Depends(require_signin)):
-        user_permissions: List[str] = user.get("permissions", [])
-
-        # ✅ system:* always passes
-        if "system:*" in user_permissions:
-            return user
-
-        # ✅ Check for wildcard permissions (e.g., shop:* matches shop:view, shop:create, etc.)
-        for required_perm in flat_permissions:
-            # Exact match
-            if required_perm in user_permissions:
-                return user
-
-            # Check if user has wildcard for this resource (e.g., user has shop:* and route needs shop:view)
-            if ":" in required_perm:
-                resource = required_perm.split(":")[0]
-                if f"{resource}:*" in user_permissions:
-                    return user
-
-            # Check if route requires wildcard and user has any permission for that resource
-            # (e.g., route needs shop:* and user has shop:view)
-            if required_perm.endswith(":*"):
-                resource = required_perm.replace(":*", "")
-                if any(up.startswith(f"{resource}:") for up in user_permissions):
-                    return user
+    def permission_checker(identity: Union[VerifiedToken, UserSnapshot] = Depends(signed_in_token)):
+        # ✅ Exact, resource:* and system:* grants are set lookups (see PermissionSet)
+        if identity.permissions.allows_any(flat_permissions):
+            return dict(identity.user)
 
         # ❌ no match → deny
-        print(f"Permission denied for user: {user.get('email')}")
-        print(f"  Required: {flat_permissions}")
-        print(f"  User has: {user_permissions}")
+        user_permissions: List[str] = identity.user.get("permissions", [])
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Permission denied. Required: {flat_permissions}, You have: {user_permissions}")
 
     return permission_checker
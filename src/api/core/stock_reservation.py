@@ -0,0 +1,268 @@
+"""
+Stock reservation for order lines.
+
+reserve_stock() checks and decrements every line of an order with one
+conditional UPDATE per table:
+
+    UPDATE products SET quantity = quantity - r.n, ...
+    FROM (VALUES ...) AS r(id, n)
+    WHERE products.id = r.id AND products.quantity >= r.n
+    RETURNING products.id
+
+The row lock and the `quantity >= n` guard are checked together, so two
+concurrent checkouts cannot both take the last unit. Every affected row is
+locked first with SELECT ... ORDER BY id FOR UPDATE (products, simple and
+variation parents, then variations), so concurrent checkouts always lock
+in the same order and cannot deadlock. The UPDATEs run in a SAVEPOINT. If any line is short, the savepoint is rolled back and nothing
+is reserved. release_stock() puts stock back (cancellations, restores).
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, column, func, select, update, values
+
+from src.api.core.product_cache import invalidate_products
+from src.api.core.storefront_feeds import ORDER_FEEDS, mark_feeds_stale
+from src.api.core.variation_aggregates import AGGREGATE_FIELDS, apply_quantity_deltas
+from src.api.models.product_model.productsModel import Product
+from src.api.models.product_model.variationOptionModel import VariationOption
+
+_PRODUCT_FIELDS = AGGREGATE_FIELDS + ["total_sold_quantity", "in_stock"]
+_VARIATION_FIELDS = ["quantity", "is_active"]
+
+
+@dataclass(frozen=True)
+class StockLine:
+    product_id: int
+    quantity: float
+    variation_option_id: Optional[int] = None
+
+
+def stock_line(item) -> StockLine:
+    """StockLine from an OrderProductCreate / cart item (order_quantity or quantity)."""
+    quantity = getattr(item, "order_quantity", None)
+    if quantity is None:
+        quantity = getattr(item, "quantity", 0)
+    return StockLine(
+        product_id=item.product_id,
+        quantity=float(quantity),
+        variation_option_id=getattr(item, "variation_option_id", None) or None,
+    )
+
+
+def _units(quantity) -> Optional[int]:
+    """Whole, positive units or None."""
+    try:
+        quantity = float(quantity)
+    except (TypeError, ValueError):
+        return None
+    if quantity <= 0 or not quantity.is_integer():
+        return None
+    return int(quantity)
+
+
+def _group(lines: List[StockLine]) -> Tuple[Dict[int, int], Dict[Tuple[int, int], int], List[dict]]:
+    """Units per simple product, per (variation, product), and the invalid lines."""
+    simple: Dict[int, int] = defaultdict(int)
+    variations: Dict[Tuple[int, int], int] = defaultdict(int)
+    invalid = []
+    for index, line in enumerate(lines):
+        units = _units(line.quantity)
+        if units is None:
+            invalid.append(_shortfall(index, line, None, "Invalid quantity"))
+        elif line.variation_option_id:
+            variations[(line.variation_option_id, line.product_id)] += units
+        else:
+            simple[line.product_id] += units
+    return simple, variations, invalid
+
+
+def _shortfall(index: int, line: StockLine, available, message: str) -> dict:
+    return {
+        "line": index,
+        "product_id": line.product_id,
+        "variation_option_id": line.variation_option_id,
+        "requested": line.quantity,
+        "available": available,
+        "message": message,
+    }
+
+
+def _lock_rows(connection, product_ids, variation_ids):
+    """Lock the rows in one global order: products, then variations, each by id."""
+    if product_ids:
+        connection.execute(
+            select(Product.id)
+            .where(Product.id.in_(sorted(product_ids)))
+            .order_by(Product.id)
+            .with_for_update()
+        )
+    if variation_ids:
+        connection.execute(
+            select(VariationOption.id)
+            .where(VariationOption.id.in_(sorted(variation_ids)))
+            .order_by(VariationOption.id)
+            .with_for_update()
+        )
+
+
+def _update_products(connection, units: Dict[int, int], reserve: bool) -> set:
+    requested = values(
+        column("id", Integer), column("n", Integer), name="requested"
+    ).data(list(units.items()))
+    change = -requested.c.n if reserve else requested.c.n
+    conditions = [Product.id == requested.c.id]
+    if reserve:
+        conditions.append(Product.quantity >= requested.c.n)
+    statement = (
+        update(Product)
+        .where(*conditions)
+        .values(
+            quantity=Product.quantity + change,
+            total_sold_quantity=func.greatest(Product.total_sold_quantity - change, 0),
+            in_stock=Product.quantity + change > 0,
+        )
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(connection.execute(statement).scalars())
+
+
+def _update_variations(connection, units: Dict[Tuple[int, int], int], reserve: bool) -> set:
+    requested = values(
+        column("id", Integer), column("product_id", Integer), column("n", Integer), name="requested"
+    ).data([(variation_id, product_id, n) for (variation_id, product_id), n in units.items()])
+    change = -requested.c.n if reserve else requested.c.n
+    conditions = [
+        VariationOption.id == requested.c.id,
+        VariationOption.product_id == requested.c.product_id,
+    ]
+    if reserve:
+        conditions.append(VariationOption.quantity >= requested.c.n)
+        conditions.append(VariationOption.is_active == True)
+    statement = (
+        update(VariationOption)
+        .where(*conditions)
+        .values(
+            quantity=VariationOption.quantity + change,
+            # Sold out variations are hidden and shown again when released
+            # stock brings them back; a variation disabled with stock stays off
+            is_active=case(
+                (VariationOption.quantity + change <= 0, False),
+                (VariationOption.quantity <= 0, True),
+                else_=VariationOption.is_active,
+            ),
+        )
+        .returning(VariationOption.id, VariationOption.product_id)
+        .execution_options(synchronize_session=False)
+    )
+    return {(row.id, row.product_id) for row in connection.execute(statement)}
+
+
+def _available(session, simple_ids, variation_ids) -> Tuple[Dict[int, int], Dict[int, tuple]]:
+    """Stock of the short products, and (quantity, is_active) of the short variations."""
+    products, variations = {}, {}
+    if simple_ids:
+        products = dict(
+            session.execute(
+                select(Product.id, Product.quantity).where(Product.id.in_(simple_ids))
+            ).all()
+        )
+    if variation_ids:
+        variations = {
+            row.id: (row.quantity, row.is_active)
+            for row in session.execute(
+                select(VariationOption.id, VariationOption.quantity, VariationOption.is_active).where(
+                    VariationOption.id.in_(variation_ids)
+                )
+            )
+        }
+    return products, variations
+
+
+def _expire(session, Model, ids, fields):
+    for id in ids:
+        obj = session.identity_map.get(session.identity_key(Model, id))
+        if obj is not None:
+            session.expire(obj, fields)
+
+
+def _adjust(session, lines: Iterable[StockLine], reserve: bool) -> List[dict]:
+    lines = list(lines)
+    simple, variations, shortfalls = _group(lines)
+    if shortfalls or not (simple or variations):
+        return shortfalls
+
+    savepoint = session.begin_nested()
+    connection = session.connection()
+    _lock_rows(
+        connection,
+        set(simple) | {product_id for _, product_id in variations},
+        {variation_id for variation_id, _ in variations},
+    )
+    updated_products = _update_products(connection, simple, reserve) if simple else set()
+    updated_variations = _update_variations(connection, variations, reserve) if variations else set()
+
+    missing_products = set(simple) - updated_products
+    missing_variations = set(variations) - updated_variations
+    if reserve and (missing_products or missing_variations):
+        savepoint.rollback()
+        products, variation_stock = _available(
+            session, missing_products, {variation_id for variation_id, _ in missing_variations}
+        )
+        for index, line in enumerate(lines):
+            if line.variation_option_id:
+                if (line.variation_option_id, line.product_id) in missing_variations:
+                    available, is_active = variation_stock.get(line.variation_option_id, (0, True))
+                    if not is_active:
+                        shortfalls.append(_shortfall(index, line, 0, "Variation is not active"))
+                        continue
+                    shortfalls.append(_shortfall(index, line, available, (
+                        f"Insufficient variation stock. Available: {available}, Requested: {line.quantity}"
+                    )))
+            elif line.product_id in missing_products:
+                available = products.get(line.product_id, 0)
+                shortfalls.append(_shortfall(index, line, available, (
+                    f"Insufficient stock. Available: {available}, Requested: {line.quantity}"
+                )))
+        return shortfalls
+
+    # Parent products of the variations: sold count and variation aggregates
+    deltas: Dict[int, int] = defaultdict(int)
+    for variation_id, product_id in updated_variations:
+        n = variations[(variation_id, product_id)]
+        deltas[product_id] += -n if reserve else n
+    if deltas:
+        apply_quantity_deltas(connection, deltas, count_as_sold=True)
+    savepoint.commit()
+
+    # Loaded objects re-read the new stock on next access
+    product_ids = updated_products | set(deltas)
+    _expire(session, Product, product_ids, _PRODUCT_FIELDS)
+    _expire(session, VariationOption, [variation_id for variation_id, _ in updated_variations], _VARIATION_FIELDS)
+
+    invalidate_products(product_ids, session=session)
+    mark_feeds_stale(*ORDER_FEEDS)
+    return []
+
+
+def reserve_stock(session, lines: Iterable[StockLine]) -> List[dict]:
+    """
+    Take stock for every line, or for none of them.
+
+    Returns [] on success, otherwise one shortfall per failing line
+    ({"line", "product_id", "variation_option_id", "requested", "available",
+    "message"}). Lines for the same product or variation are checked
+    against their combined quantity.
+    """
+    return _adjust(session, lines, reserve=True)
+
+
+def release_stock(session, lines: Iterable[StockLine]) -> List[dict]:
+    """
+    Put the stock of `lines` back. Lines whose product or variation no longer
+    exists are skipped; only invalid quantities are returned.
+    """
+    return _adjust(session, lines, reserve=False)
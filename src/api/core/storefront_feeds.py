@@ -0,0 +1,142 @@
+"""
+Precomputed storefront feeds (trending, best sellers, new arrivals, limited
+edition, sales).
+
+Each feed is a ranked list of product ids per (shop, parameter), built by one
+id-only query and kept in the cache backend (shared between workers when
+FEED_CACHE_REDIS_URL is set). Write paths call mark_feeds_stale() for the feeds
+an event can reorder: orders and stock changes, price changes, product edits.
+That bumps the feed's generation so the next hit rebuilds it; FEED_TTL bounds
+the drift of the time-window feeds.
+"""
+
+import os
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from src.api.core.cache import build_cache_backend
+from src.api.core.product_query import ProductQuery, on_sale_condition
+from src.api.core.utility import now_pk
+from src.api.models.product_model.productsModel import Product
+
+FEED_TTL = int(os.getenv("FEED_TTL", 120))
+FEED_SIZE = int(os.getenv("FEED_SIZE", 500))  # deeper pages use the live query
+# Generations must outlive the entries built under them
+FEED_GENERATION_TTL = 7 * 24 * 3600
+
+TRENDING = "trending"
+BEST_SELLERS = "best_sellers"
+NEW_ARRIVALS = "new_arrivals"
+LIMITED_EDITION = "limited_edition"
+SALES = "sales"
+
+# Feeds each write event can reorder
+ORDER_FEEDS = (TRENDING, BEST_SELLERS, LIMITED_EDITION)
+STOCK_FEEDS = (LIMITED_EDITION,)
+PRICE_FEEDS = (SALES,)
+
+_backend = build_cache_backend(
+    os.getenv("FEED_CACHE_REDIS_URL"),
+    maxsize=512,
+    ttl=FEED_TTL,
+    prefix="feed:",
+)
+
+
+def _storefront_products(shop_id: Optional[int]):
+    """Active products of active shops (the base of every storefront feed)."""
+    return ProductQuery().storefront(True, shop_id).ids()
+
+
+def _trending(shop_id, days):
+    threshold_date = now_pk() - timedelta(days=days or 30)
+    return (
+        _storefront_products(shop_id)
+        .where(Product.total_sold_quantity > 0, Product.created_at >= threshold_date)
+        .order_by(Product.total_sold_quantity.desc(), Product.id.asc())
+    )
+
+
+def _best_sellers(shop_id, days):
+    statement = _storefront_products(shop_id).where(Product.total_sold_quantity > 0)
+    if days:
+        statement = statement.where(Product.created_at >= now_pk() - timedelta(days=days))
+    return statement.order_by(Product.total_sold_quantity.desc(), Product.id.asc())
+
+
+def _new_arrivals(shop_id, days):
+    threshold_date = now_pk() - timedelta(days=days or 30)
+    return (
+        _storefront_products(shop_id)
+        .where(Product.created_at >= threshold_date)
+        .order_by(Product.created_at.desc(), Product.id.asc())
+    )
+
+
+def _limited_edition(shop_id, low_stock_threshold):
+    return (
+        _storefront_products(shop_id)
+        .where(Product.quantity > 0, Product.quantity <= (low_stock_threshold or 20))
+        .order_by(Product.quantity.asc(), Product.id.asc())
+    )
+
+
+def _sales(shop_id, _param):
+    return (
+        _storefront_products(shop_id)
+        .where(on_sale_condition())
+        .order_by(Product.created_at.desc(), Product.id.asc())
+    )
+
+
+FEEDS = {
+    TRENDING: _trending,
+    BEST_SELLERS: _best_sellers,
+    NEW_ARRIVALS: _new_arrivals,
+    LIMITED_EDITION: _limited_edition,
+    SALES: _sales,
+}
+
+
+def _generation(feed: str) -> int:
+    return _backend.get(f"gen:{feed}") or 0
+
+
+def get_feed_ids(session, feed: str, shop_id: Optional[int] = None, param=None) -> Optional[List[int]]:
+    """Ranked product ids of a feed (at most FEED_SIZE); None if it cannot be built."""
+    try:
+        key = f"{feed}:{_generation(feed)}:{shop_id or '*'}:{param if param is not None else '*'}"
+        ids = _backend.get(key)
+        if ids is None:
+            ids = list(session.execute(FEEDS[feed](shop_id, param).limit(FEED_SIZE)).scalars().all())
+            _backend.set(key, ids)
+        return ids
+    except Exception as e:
+        print(f"Storefront feed '{feed}' unavailable, using live query: {e}")
+        return None
+
+
+def get_feed_page(
+    session,
+    feed: str,
+    skip: int,
+    limit: int,
+    shop_id: Optional[int] = None,
+    param=None,
+) -> Optional[Tuple[List[int], int]]:
+    """(page of ids, feed length) or None when the page lies past FEED_SIZE."""
+    if skip + limit > FEED_SIZE:
+        return None
+    ids = get_feed_ids(session, feed, shop_id, param)
+    if ids is None:
+        return None
+    return ids[skip:skip + limit], len(ids)
+
+
+def mark_feeds_stale(*feeds: str):
+    """Rebuild the given feeds (all when none given) on their next hit."""
+    for feed in feeds or tuple(FEEDS):
+        try:
+            _backend.set(f"gen:{feed}", _generation(feed) + 1, ttl=FEED_GENERATION_TTL)
+        except Exception as e:
+            print(f"Could not mark feed '{feed}' stale: {e}")
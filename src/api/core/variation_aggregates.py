@@ -0,0 +1,258 @@
+"""
+Variation aggregates kept on Product (variation_count, variation_quantity,
+min/max_price, min_sale_price, has_variation_sale, and quantity for variable
+products).
+
+Session listeners keep them in step with VariationOption in the same flush:
+
+- a plain quantity change (orders, returns, restocks) is applied as a delta
+  to variation_quantity (one executemany UPDATE); a variable product's
+  quantity is always set from variation_quantity, so a quantity written to
+  the product by hand is corrected on the next variation change;
+- anything else (new / deleted variations, price or sale price changes, a
+  variation moved to another product, SQL-expression quantities) re-runs one
+  grouped SELECT over the product's variations.
+
+Bulk SQL writes bypass the ORM and must call refresh_variation_aggregates()
+or apply_quantity_deltas() themselves; backfill_variation_aggregates.py
+rebuilds every product.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import Float, and_, bindparam, case, cast, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ClauseElement
+
+from src.api.models.product_model.productsModel import Product, ProductType
+from src.api.models.product_model.variationOptionModel import VariationOption
+
+# Product attributes written behind the ORM's back
+AGGREGATE_FIELDS = [
+    "variation_count",
+    "variation_quantity",
+    "min_price",
+    "max_price",
+    "min_sale_price",
+    "has_variation_sale",
+    "quantity",
+]
+
+# Changes to these need a full recount; quantity alone is a delta
+_RECOUNT_FIELDS = ("price", "sale_price", "product_id")
+
+_TOUCHED_KEY = "variation_aggregates_touched"
+
+
+def _price(column):
+    return cast(func.nullif(column, ""), Float)
+
+
+def _aggregates(product_ids: List[int]):
+    """One row per product in product_ids (all zero / NULL without variations)."""
+    price = _price(VariationOption.price)
+    sale_price = _price(VariationOption.sale_price)
+    on_sale = and_(sale_price > 0, sale_price < price)
+    grouped = (
+        select(
+            VariationOption.product_id.label("product_id"),
+            func.count().label("variation_count"),
+            func.coalesce(func.sum(VariationOption.quantity), 0).label("variation_quantity"),
+            func.min(price).label("min_price"),
+            func.max(price).label("max_price"),
+            func.min(case((on_sale, sale_price))).label("min_sale_price"),
+            func.coalesce(func.bool_or(on_sale), False).label("has_variation_sale"),
+        )
+        .where(VariationOption.product_id.in_(product_ids))
+        .group_by(VariationOption.product_id)
+        .subquery("grouped")
+    )
+    return (
+        select(
+            Product.id.label("product_id"),
+            func.coalesce(grouped.c.variation_count, 0).label("variation_count"),
+            func.coalesce(grouped.c.variation_quantity, 0).label("variation_quantity"),
+            grouped.c.min_price,
+            grouped.c.max_price,
+            grouped.c.min_sale_price,
+            func.coalesce(grouped.c.has_variation_sale, False).label("has_variation_sale"),
+        )
+        .select_from(Product)
+        .outerjoin(grouped, grouped.c.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+        .subquery("aggregates")
+    )
+
+
+def refresh_variation_aggregates(connection, product_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Recount the aggregates of `product_ids` from their variations in one
+    UPDATE ... FROM and return {product_id: aggregates}.
+
+    `connection` is a Connection or a Session (its current transaction).
+    Variable products also get quantity and, when they have variations,
+    min/max_price; other products only get the variation columns.
+    """
+    ids = sorted({product_id for product_id in product_ids if product_id is not None})
+    if not ids:
+        return {}
+
+    aggregates = _aggregates(ids)
+    is_variable = Product.product_type == ProductType.VARIABLE
+    priced = and_(is_variable, aggregates.c.variation_count > 0)
+    statement = (
+        update(Product)
+        .where(Product.id == aggregates.c.product_id)
+        .values(
+            variation_count=aggregates.c.variation_count,
+            variation_quantity=aggregates.c.variation_quantity,
+            min_sale_price=aggregates.c.min_sale_price,
+            has_variation_sale=aggregates.c.has_variation_sale,
+            quantity=case((is_variable, aggregates.c.variation_quantity), else_=Product.quantity),
+            min_price=case((priced, aggregates.c.min_price), else_=Product.min_price),
+            max_price=case((priced, aggregates.c.max_price), else_=Product.max_price),
+        )
+        .returning(
+            Product.id,
+            Product.variation_count,
+            Product.variation_quantity,
+            Product.min_price,
+            Product.max_price,
+            Product.min_sale_price,
+            Product.has_variation_sale,
+            Product.quantity,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if isinstance(connection, Session):
+        session = connection
+        # Pending variation changes first, so the recount sees them
+        session.flush()
+        result = {row.id: dict(row._mapping) for row in session.connection().execute(statement)}
+        expire_loaded_products(session, ids)
+        return result
+    return {row.id: dict(row._mapping) for row in connection.execute(statement)}
+
+
+def expire_loaded_products(session, product_ids: Iterable[int]):
+    """Loaded products re-read the values written by SQL on next access."""
+    for product_id in product_ids:
+        product = session.identity_map.get(session.identity_key(Product, product_id))
+        if product is not None:
+            session.expire(product, AGGREGATE_FIELDS)
+
+
+def apply_quantity_deltas(connection, deltas: Dict[int, int], count_as_sold: bool = False):
+    """
+    Add {product_id: delta} to variation_quantity (and a variable product's
+    quantity) for variation stock moved by SQL. With count_as_sold the
+    negated delta also goes to total_sold_quantity (never below zero) and a
+    variable product's in_stock follows its new quantity.
+    """
+    columns = {
+        "variation_quantity": Product.variation_quantity + bindparam("delta"),
+        "quantity": case(
+            (
+                Product.product_type == ProductType.VARIABLE,
+                Product.variation_quantity + bindparam("delta"),
+            ),
+            else_=Product.quantity,
+        ),
+    }
+    if count_as_sold:
+        columns["total_sold_quantity"] = func.greatest(
+            Product.total_sold_quantity - bindparam("delta"), 0
+        )
+        columns["in_stock"] = case(
+            (
+                Product.product_type == ProductType.VARIABLE,
+                Product.variation_quantity + bindparam("delta") > 0,
+            ),
+            else_=Product.in_stock,
+        )
+    statement = (
+        update(Product)
+        .where(Product.id == bindparam("pid"))
+        .values(**columns)
+        .execution_options(synchronize_session=False)
+    )
+    connection.execute(statement, [{"pid": pid, "delta": delta} for pid, delta in deltas.items()])
+
+
+def _quantity_delta(state):
+    """Integer quantity change of a flushed variation, or None when unknown."""
+    history = state.attrs.quantity.history
+    if not history.added:
+        return 0
+    if not history.deleted:
+        return None
+    old, new = history.deleted[0], history.added[0]
+    if isinstance(new, ClauseElement) or old is None or new is None:
+        return None
+    delta = new - old
+    if isinstance(delta, float):
+        if not delta.is_integer():
+            return None
+        delta = int(delta)
+    return delta
+
+
+def _collect(session):
+    """(product ids to recount, {product id: quantity delta}) for this flush."""
+    recount: Set[int] = set()
+    deltas: Dict[int, int] = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, VariationOption):
+            recount.add(obj.product_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, VariationOption):
+            state = inspect(obj)
+            history = state.attrs.product_id.history
+            recount.update(history.deleted or history.unchanged or [obj.product_id])
+
+    for obj in session.dirty:
+        if not isinstance(obj, VariationOption):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in _RECOUNT_FIELDS):
+            history = state.attrs.product_id.history
+            recount.update(history.deleted)
+            recount.add(obj.product_id)
+            continue
+        delta = _quantity_delta(state)
+        if delta is None:
+            recount.add(obj.product_id)
+        elif delta:
+            deltas[obj.product_id] += delta
+
+    recount.discard(None)
+    deltas = {pid: delta for pid, delta in deltas.items() if pid not in recount and delta}
+    return recount, deltas
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_aggregates(session, flush_context):
+    recount, deltas = _collect(session)
+    if not recount and not deltas:
+        return
+    connection = session.connection()
+    if deltas:
+        apply_quantity_deltas(connection, deltas)
+    if recount:
+        refresh_variation_aggregates(connection, recount)
+    session.info.setdefault(_TOUCHED_KEY, set()).update(recount, deltas)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_products(session, flush_context):
+    touched = session.info.pop(_TOUCHED_KEY, None)
+    if touched:
+        expire_loaded_products(session, touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_touched(session):
+    session.info.pop(_TOUCHED_KEY, None)
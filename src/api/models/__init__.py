@@ -12,7 +12,7 @@ from .role_model.userRoleModel import UserRole
 from .shop_model import Shop, UserShop
 
 # category
-from .category_model.categoryModel import Category
+from .category_model.categoryModel import Category, CategoryClosure
 
 
 # product
@@ -72,6 +72,9 @@ from .withdrawModel import *
 from .settingsModel import Settings
 from .taxModel import Tax
 from .transactionLogModel import TransactionLog
+from .idempotencyModel import IdempotencyKey
+from .outboxModel import OutboxEvent
+from .permissionSnapshotModel import PermissionSnapshot
 # from .attributes_model import Attribute, AttributeValue, AttributeProduct
 
 # # tag
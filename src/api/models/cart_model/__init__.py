@@ -2,5 +2,6 @@ from .cartModel import (
     Cart, CartCreate, CartRead, CartUpdate, CartBulkCreate, CartBulkResponse,
     CartBase, CartItemResponse, MyCartResponse, AddCartResponse,
     BulkAddCartRequest, BulkAddCartResponse, CartQuantityUpdate, CartDeleteRequest,
-    CartDeleteItem, CartDeleteManyRequest
+    CartDeleteItem, CartDeleteManyRequest, CartPricingSummary,
+    CartBulkItemResult
 )
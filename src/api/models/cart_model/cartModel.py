@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING, Literal, Optional, List
 from pydantic import BaseModel
-from sqlmodel import Field, Relationship, UniqueConstraint
+from sqlalchemy import text
+from sqlmodel import Field, Index, Relationship, UniqueConstraint
 from src.api.models.product_model.productsModel import ProductRead
 from src.api.models.baseModel import TimeStampReadModel, TimeStampedModel
 
@@ -14,6 +15,11 @@ class Cart(TimeStampedModel, table=True):
     # ✅ Unique constraint: one product + variation per user
     __table_args__ = (
         UniqueConstraint("user_id", "product_id", "variation_option_id", name="uix_user_product_variation"),
+        # ✅ NULLs never conflict in the constraint above; one row per product without variation
+        Index(
+            "uix_user_product_no_variation", "user_id", "product_id",
+            unique=True, postgresql_where=text("variation_option_id IS NULL"),
+        ),
     )
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -75,12 +81,23 @@ class CartRead(CartBase, TimeStampReadModel):
     variation_option_id: Optional[int] = None
 
 
+class CartBulkItemResult(BaseModel):
+    """Outcome of one item of cart/bulk-add and cart/bulk-create"""
+    index: int  # Position of the item in the request
+    product_id: int
+    variation_option_id: Optional[int] = None
+    status: Literal["added", "updated", "failed"]
+    quantity: Optional[int] = None  # Cart quantity after the change
+    error: Optional[str] = None
+
+
 class CartBulkResponse(BaseModel):
     success:int
     success_count: int
     failed_count: int
     failed_items: List[dict]
     message: str
+    results: List[CartBulkItemResult] = []
 
 
 # New models for cart/my-cart, cart/add, cart/bulk-add responses
@@ -126,10 +143,30 @@ class CartItemResponse(BaseModel):
     manufacturer: Optional[ManufacturerForCart] = None
 
 
+class CartPricingSummary(BaseModel):
+    """Server-side cart totals (see src/api/core/cart_pricing.py)"""
+    revision: int
+    item_count: int
+    valid: bool
+    message: Optional[str] = None
+    subtotal: float
+    actual_amount: float
+    product_discount: float
+    tax_rate: float
+    tax: float
+    delivery_fee: float
+    original_delivery_fee: float
+    coupon_discount: float
+    coupon_type: Optional[str] = None
+    free_shipping_source: str
+    total: float
+
+
 class MyCartResponse(BaseModel):
     """Response model for cart/my-cart endpoint"""
     success: int
     data: List[CartItemResponse]
+    summary: Optional[CartPricingSummary] = None
 
 
 class AddCartResponse(BaseModel):
@@ -146,4 +183,5 @@ class BulkAddCartRequest(BaseModel):
 class BulkAddCartResponse(BaseModel):
     """Response model for cart/bulk-add endpoint"""
     success: int
-    data: List[CartItemResponse]
\ No newline at end of file
+    data: List[CartItemResponse]
+    results: List[CartBulkItemResult] = []
\ No newline at end of file
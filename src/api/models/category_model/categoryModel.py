@@ -1,6 +1,6 @@
 # src/api/models/categoryModel.py
 from typing import TYPE_CHECKING, Literal, Optional, List, Dict, Any
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
 from src.api.models.baseModel import TimeStampedModel, TimeStampReadModel
@@ -57,6 +57,23 @@ class Category(TimeStampedModel, table=True):
     banners: List["Banner"] = Relationship(back_populates="category")
 
 
+class CategoryClosure(SQLModel, table=True):
+    """Every (ancestor, descendant) pair of the category tree, self pairs at depth 0."""
+
+    __tablename__ = "category_closure"
+    __table_args__ = (
+        Index("ix_category_closure_descendant", "descendant_id", "depth"),
+    )
+
+    ancestor_id: int = Field(
+        foreign_key="categories.id", primary_key=True, ondelete="CASCADE"
+    )
+    descendant_id: int = Field(
+        foreign_key="categories.id", primary_key=True, ondelete="CASCADE"
+    )
+    depth: int = Field(default=0)
+
+
 class CategoryCreate(SQLModel):
     name: str
     parent_id: Optional[int] = None
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Any, Literal, Optional
+
+from sqlmodel import JSON, Column, Field, UniqueConstraint
+
+from src.api.models.baseModel import TimeStampedModel
+
+
+class IdempotencyKey(TimeStampedModel, table=True):
+    """Stored response of a request sent with an Idempotency-Key header."""
+
+    __tablename__: Literal["idempotency_keys"] = "idempotency_keys"
+    # ✅ One key per scope (endpoint + user)
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uix_idempotency_scope_key"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    scope: str = Field(max_length=191)
+    key: str = Field(max_length=255)
+    request_hash: str = Field(max_length=64)
+    # NULL while the first request is still running
+    status_code: Optional[int] = None
+    response_body: Optional[Any] = Field(default=None, sa_column=Column(JSON))
+    locked_at: Optional[datetime] = None
+    expires_at: datetime = Field(index=True)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Any, Literal, Optional
+
+from sqlmodel import JSON, Column, Field, Index, SQLModel, Text
+
+from src.api.core.utility import now_pk
+
+
+class OutboxEvent(SQLModel, table=True):
+    """Side effect written with the change that caused it, run by the outbox dispatcher."""
+
+    __tablename__: Literal["outbox_events"] = "outbox_events"
+    # ✅ The dispatcher scans pending rows that are due
+    __table_args__ = (
+        Index("ix_outbox_events_status_available_at", "status", "available_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_type: str = Field(max_length=100)
+    payload: Any = Field(default=None, sa_column=Column(JSON))
+    # pending -> processing -> done, or failed after OUTBOX_MAX_ATTEMPTS
+    status: str = Field(default="pending", max_length=20)
+    attempts: int = Field(default=0)
+    available_at: datetime = Field(default_factory=now_pk)
+    locked_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    last_error: Optional[str] = Field(default=None, sa_column=Column(Text))
+    created_at: datetime = Field(default_factory=now_pk)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Any, Literal, Optional
+
+from sqlmodel import JSON, Column, Field, SQLModel
+
+from src.api.core.utility import now_pk
+
+
+class PermissionSnapshot(SQLModel, table=True):
+    """A user's roles, permissions and shops, read for compact access tokens."""
+
+    __tablename__: Literal["permission_snapshots"] = "permission_snapshots"
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True, ondelete="CASCADE")
+    # Bumped whenever the user's roles, permissions or shops change
+    version: int = Field(default=1)
+    # NULL after a bump: rebuilt from the user's roles on next use
+    data: Optional[Any] = Field(default=None, sa_column=Column(JSON))
+    updated_at: datetime = Field(default_factory=now_pk)
@@ -107,6 +107,12 @@ class Product(TimeStampedModel, table=True):
     rating: float = Field(default=0.0)
     review_count: int = Field(default=0)
 
+    # ADDED: Variation aggregates, maintained by core/variation_aggregates.py
+    variation_count: int = Field(default=0)
+    variation_quantity: int = Field(default=0)
+    min_sale_price: Optional[float] = None
+    has_variation_sale: bool = Field(default=False, index=True)
+
     # foreign key
     category_id: int = Field(foreign_key="categories.id", index=True)
     shop_id: Optional[int] = Field(foreign_key="shops.id", index=True)
@@ -325,6 +331,10 @@ class ProductRead(TimeStampReadModel):
     # CHANGED: Make variations_count a regular field instead of computed
     variations_count: int = 0
 
+    # ADDED: Lowest variation sale price and sale flag (variable products)
+    min_sale_price: Optional[float] = None
+    has_variation_sale: bool = False
+
     # ADDED: Field validators for string-to-number conversion
     @field_validator('price', 'sale_price', 'max_price', 'min_price', 'purchase_price', 
                      'weight', 'height', 'width', 'length', 'total_quantity', 
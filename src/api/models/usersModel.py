@@ -43,6 +43,8 @@ class User(TimeStampedModel, table=True):
     image: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
     contactinfo: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
     # contactinfo structure: {"name":"","father_name":"","cnic":"","employment_no":"","phoneno":"","address":"","email":""}
+    # ✅ Bumped on every cart change; keys the cached cart pricing (src/api/core/cart_pricing.py)
+    cart_revision: int = Field(default=0)
     # relationships
     user_roles: list["UserRole"] = Relationship(back_populates="user")
     media: List["UserMedia"] = Relationship(back_populates="user")
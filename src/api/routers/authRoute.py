@@ -16,6 +16,7 @@ from src.api.core.security import (
     verify_password,
     verify_refresh_token,
 )
+from src.api.core.permission_snapshot import build_user_data, issue_snapshot
 from src.api.models.role_model.roleModel import Role
 from src.api.models.role_model.userRoleModel import UserRole
 from src.api.models.usersModel import RegisterUser, User, UserRead, LoginRequest
@@ -43,6 +44,19 @@ def serialize_user_with_avatar(user: User) -> UserRead:
     return user_read
 
 
+def issue_tokens(session, user: User) -> tuple[str, str, dict]:
+    """
+    Access and refresh tokens for `user` (roles and shops loaded). They carry
+    only the user id and the version of the user's permission snapshot;
+    the roles, permissions and shops stay on the server. Commit afterwards.
+    """
+    version = issue_snapshot(session, user)
+    token_data = {"id": user.id, "v": version}
+    access_token = create_access_token(user_data=token_data)
+    refresh_token = create_access_token(user_data=token_data, refresh=True)
+    return access_token, refresh_token, build_user_data(user)
+
+
 @router.post("/init", response_model=UserRead)
 @handle_async_wrapper
 def initialize_first_user(
@@ -188,27 +202,14 @@ def register_user(
         print(f"Failed to send registration email: {e}")
 
     # Generate tokens and prepare response (same as login)
-    roles = user.role_names
-    permissions = user.permissions
-    shops = [{"id": shop.id, "name": shop.name} for shop in user.shops]
-
-    user_data = {
-        "id": user.id,
-        "email": user.email,
-        "is_root": user.is_root or False,
-        "roles": roles,
-        "permissions": permissions,
-        "shops": shops,
-    }
-
-    access_token = create_access_token(user_data=user_data)
-    refresh_token = create_access_token(user_data=user_data, refresh=True)
+    access_token, refresh_token, user_data = issue_tokens(session, user)
 
     exp_time = now_pk() + timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
     )
 
     user_read = serialize_user_with_avatar(user)
+    session.commit()
 
     # Set refresh token cookie
     response.set_cookie(
@@ -225,6 +226,8 @@ def register_user(
         "access_token": access_token,
         "refresh_token": refresh_token,
         "user": user_read,
+        # What the token used to carry (roles, permissions, shops)
+        "token_user": user_data,
         "exp": exp_time.isoformat(),
     }
 
@@ -260,30 +263,15 @@ def login_user(
     if not user.is_active:
         return api_response(403, "User account is disabled")
 
-    # Use properties instead of user.roles
-    roles = user.role_names
-    permissions = user.permissions
-
-    # 🔥 Extract shops
-    shops = [{"id": shop.id, "name": shop.name} for shop in user.shops]
-
-    user_data = {
-        "id": user.id,
-        "email": user.email,
-        "is_root": user.is_root or False,
-        "roles": roles,
-        "permissions": permissions,
-        "shops": shops,
-    }
-    # Print(user_data)
-    access_token = create_access_token(user_data=user_data)
-    refresh_token = create_access_token(user_data=user_data, refresh=True)
+    # 🔥 Roles, permissions and shops go to the permission snapshot, not the token
+    access_token, refresh_token, user_data = issue_tokens(session, user)
 
     exp_time = now_pk() + timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
     )
 
     user_read = serialize_user_with_avatar(user)
+    session.commit()
     print(f"user:{user_read}")
     # cookie will test in postman and frontend only with tag credential:true
     response.set_cookie(
@@ -299,6 +287,8 @@ def login_user(
         "access_token": access_token,
         "refresh_token": refresh_token,
         "user": user_read,
+        # What the token used to carry (roles, permissions, shops)
+        "token_user": user_data,
         "exp": exp_time.isoformat(),
     }
 
@@ -344,28 +334,15 @@ def refresh_token(
     if not user.is_active:
         return api_response(403, "User account is disabled")
 
-    # Build user data for token
-    roles = user.role_names
-    permissions = user.permissions
-    shops = [{"id": shop.id, "name": shop.name} for shop in user.shops]
-
-    user_data = {
-        "id": user.id,
-        "email": user.email,
-        "is_root": user.is_root or False,
-        "roles": roles,
-        "permissions": permissions,
-        "shops": shops,
-    }
-
-    access_token = create_access_token(user_data=user_data)
-    new_refresh_token = create_access_token(user_data=user_data, refresh=True)
+    # Fresh snapshot, so the new tokens reflect the current roles
+    access_token, new_refresh_token, user_data = issue_tokens(session, user)
 
     exp_time = now_pk() + timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
     )
 
     user_read = serialize_user_with_avatar(user)
+    session.commit()
 
     # Set refresh token cookie
     response.set_cookie(
@@ -382,6 +359,8 @@ def refresh_token(
         "access_token": access_token,
         "refresh_token": new_refresh_token,
         "user": user_read,
+        # What the token used to carry (roles, permissions, shops)
+        "token_user": user_data,
         "exp": exp_time.isoformat(),
     }
 
@@ -1,16 +1,21 @@
 from typing import List, Optional
 from fastapi import APIRouter, Body, HTTPException, Query
-from sqlalchemy import select
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import joinedload
 from sqlmodel import col
-from src.api.core.utility import Print
+from src.api.core.utility import Print, now_pk
 from src.api.core.operation import listRecords, updateOp
 from src.api.core.response import api_response, raiseExceptions
+from src.api.core.checkout_context import CheckoutContext
+from src.api.core.cart_pricing import (
+    bump_cart_revision, get_cart_revision, line_prices, price_cart,
+)
 from src.api.models.cart_model import (
     Cart, CartCreate, CartRead, CartUpdate, CartBulkCreate, CartBulkResponse,
     CartBase, CartItemResponse, MyCartResponse, AddCartResponse,
     BulkAddCartRequest, BulkAddCartResponse, CartQuantityUpdate, CartDeleteRequest,
-    CartDeleteManyRequest
+    CartDeleteManyRequest, CartBulkItemResult
 )
 from src.api.models.product_model.productsModel import Product, ProductType
 from src.api.models.product_model.variationOptionModel import VariationOption
@@ -51,18 +56,130 @@ def validate_variable_product(session: GetSession, product_id: int, variation_op
     return True, "", product
 
 
+def validate_cart_items(session: GetSession, items: list) -> tuple[list, list[CartBulkItemResult]]:
+    """
+    validate_variable_product() for a whole bulk request, with one query for
+    every product and variation. Returns (valid_items, failed_results);
+    valid_items are (index, item) pairs.
+    """
+    product_ids = {item.product_id for item in items}
+    variation_ids = {item.variation_option_id for item in items if item.variation_option_id}
+    rows = session.execute(
+        select(Product, VariationOption.id)
+        .outerjoin(
+            VariationOption,
+            and_(VariationOption.product_id == Product.id, VariationOption.id.in_(variation_ids)),
+        )
+        .where(Product.id.in_(product_ids))
+    ).all()
+    products = {product.id: product for product, _ in rows}
+    variations = {(product.id, variation_id) for product, variation_id in rows if variation_id}
+
+    valid_items, failed = [], []
+    for index, item in enumerate(items):
+        product = products.get(item.product_id)
+        variation_id = item.variation_option_id or None
+        if not product:
+            error = f"Product with ID {item.product_id} not found"
+        elif item.quantity < 1:
+            error = f"Quantity for product '{product.name}' must be at least 1"
+        elif product.product_type == ProductType.VARIABLE and not variation_id:
+            error = f"Product '{product.name}' is a variable product. Please select a valid variation option before adding to cart."
+        elif variation_id and (product.id, variation_id) not in variations:
+            error = f"Invalid variation option for product '{product.name}'. Please select a valid option."
+        else:
+            valid_items.append((index, item))
+            continue
+        failed.append(CartBulkItemResult(
+            index=index,
+            product_id=item.product_id,
+            variation_option_id=variation_id,
+            status="failed",
+            error=error,
+        ))
+    return valid_items, failed
+
+
+def upsert_cart_items(session: GetSession, user_id: int, items: list) -> tuple[list, list[CartBulkItemResult]]:
+    """
+    Add validated (index, item) pairs to the user's cart with INSERT ... ON CONFLICT DO
+    UPDATE, adding to the quantity of existing rows. Items for the same
+    product and variation are merged first. Returns (cart_rows, results).
+    """
+    now = now_pk()
+    merged = {}
+    for _, item in items:
+        key = (item.product_id, item.variation_option_id or None)
+        if key in merged:
+            merged[key]["quantity"] += item.quantity
+        else:
+            merged[key] = {
+                "user_id": user_id,
+                "product_id": item.product_id,
+                "variation_option_id": key[1],
+                "shop_id": item.shop_id,
+                "quantity": item.quantity,
+                "created_at": now,
+            }
+
+    cart_rows = []
+    # One statement per conflict target: the unique constraint, and the
+    # partial index for rows without a variation (NULLs never conflict)
+    for has_variation in (True, False):
+        values = [row for key, row in merged.items() if bool(key[1]) == has_variation]
+        if not values:
+            continue
+        stmt = insert(Cart).values(values)
+        set_ = {"quantity": Cart.quantity + stmt.excluded.quantity, "updated_at": now}
+        if has_variation:
+            stmt = stmt.on_conflict_do_update(constraint="uix_user_product_variation", set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Cart.user_id, Cart.product_id],
+                index_where=Cart.variation_option_id.is_(None),
+                set_=set_,
+            )
+        cart_rows.extend(session.execute(stmt.returning(
+            Cart.id, Cart.product_id, Cart.variation_option_id, Cart.shop_id,
+            Cart.quantity, Cart.created_at,
+        )).all())
+
+    # The ORM listener does not see bulk SQL
+    bump_cart_revision(session, [user_id])
+
+    rows_by_key = {(row.product_id, row.variation_option_id): row for row in cart_rows}
+    results = []
+    for index, item in items:
+        row = rows_by_key[(item.product_id, item.variation_option_id or None)]
+        results.append(CartBulkItemResult(
+            index=index,
+            product_id=row.product_id,
+            variation_option_id=row.variation_option_id,
+            # An updated row keeps its original created_at
+            status="added" if row.created_at == now else "updated",
+            quantity=row.quantity,
+        ))
+    return cart_rows, results
+
+
 def build_cart_item_response(
     session: GetSession,
     cart: Cart,
     product: Product,
-    variation_option: Optional[VariationOption] = None
+    variation_option: Optional[VariationOption] = None,
+    checkout: Optional[CheckoutContext] = None,
 ) -> CartItemResponse:
-    """Helper function to build CartItemResponse from cart, product, and optionally variation_option"""
+    """
+    Helper function to build CartItemResponse from cart, product, and optionally variation_option.
+    Category, shop and manufacturer come from `checkout` when given (see get_my_cart).
+    """
     from src.api.models.cart_model.cartModel import CategoryForCart, ShopForCart, ManufacturerForCart
     from src.api.models.category_model.categoryModel import Category
     from src.api.models.shop_model.shopsModel import Shop
     from src.api.models.manufacturer_model.manufacturerModel import Manufacturer
 
+    get = checkout.get if checkout else session.get
+
     # Get image URL from product or variation
     image_url = None
     if variation_option and variation_option.image:
@@ -70,15 +187,9 @@ def build_cart_item_response(
     elif product.image:
         image_url = product.image.get("original") or product.image.get("thumbnail")
 
-    # Determine prices based on whether variation exists
-    if variation_option:
-        # Use variation prices
-        unit_price = float(variation_option.sale_price) if variation_option.sale_price else float(variation_option.price)
-        original_price = float(variation_option.price)
-    else:
-        # Use product prices
-        unit_price = product.sale_price if product.sale_price else product.price
-        original_price = product.price
+    # Variation prices when a variation exists, product prices otherwise
+    original_price, sale_price = line_prices(product, variation_option)
+    unit_price = sale_price or original_price
 
     # Calculate discount
     discount = original_price - unit_price if original_price > unit_price else 0
@@ -89,7 +200,7 @@ def build_cart_item_response(
     # Get category info
     category = None
     if product.category_id:
-        cat_obj = session.get(Category, product.category_id)
+        cat_obj = get(Category, product.category_id)
         if cat_obj:
             category = CategoryForCart(
                 id=cat_obj.id,
@@ -100,7 +211,7 @@ def build_cart_item_response(
 
     # Get shop info
     shop = None
-    shop_obj = session.get(Shop, cart.shop_id)
+    shop_obj = get(Shop, cart.shop_id)
     if shop_obj:
         shop = ShopForCart(
             id=shop_obj.id,
@@ -112,7 +223,7 @@ def build_cart_item_response(
     # Get manufacturer info
     manufacturer = None
     if product.manufacturer_id:
-        mfr_obj = session.get(Manufacturer, product.manufacturer_id)
+        mfr_obj = get(Manufacturer, product.manufacturer_id)
         if mfr_obj:
             manufacturer = ManufacturerForCart(
                 id=mfr_obj.id,
@@ -143,32 +254,46 @@ def build_cart_item_response(
 def get_my_cart(
     session: GetSession,
     user: requireSignin,
+    tax_id: Optional[int] = Query(None),
+    shipping_id: Optional[int] = Query(None),
+    coupon_id: Optional[int] = Query(None),
 ):
     """
-    Get all cart items for the logged-in user with product details
+    Get all cart items for the logged-in user with product details,
+    and the cart totals for the given tax, shipping and coupon
     """
     user_id = user.get("id")
 
-    # Get all cart items for this user with product relationship
-    stmt = select(Cart).where(Cart.user_id == user_id).options(joinedload(Cart.product))
-    cart_items = session.execute(stmt).scalars().unique().all()
+    # ✅ Revision first: a write landing after it only makes this entry stale,
+    # never caches the old rows under the new revision
+    revision = get_cart_revision(session, user_id)
+
+    # Get all cart items for this user
+    stmt = select(Cart).where(Cart.user_id == user_id)
+    cart_items = session.execute(stmt).scalars().all()
+
+    # ✅ Products, variations, categories, shops and manufacturers: one IN query each
+    checkout = CheckoutContext.for_cart(session, cart_items)
 
     cart_responses = []
     for cart in cart_items:
-        product = cart.product
+        product = checkout.get(Product, cart.product_id)
         if not product:
             continue
 
         # Get variation option if exists
-        variation_option = None
-        if cart.variation_option_id:
-            var_stmt = select(VariationOption).where(VariationOption.id == cart.variation_option_id)
-            variation_option = session.execute(var_stmt).scalar_one_or_none()
+        variation_option = checkout.get(VariationOption, cart.variation_option_id)
 
-        cart_response = build_cart_item_response(session, cart, product, variation_option)
+        cart_response = build_cart_item_response(session, cart, product, variation_option, checkout=checkout)
         cart_responses.append(cart_response)
 
-    return MyCartResponse(success=1, data=cart_responses)
+    # ✅ Priced once per cart revision; the checkout rows are reused on a miss
+    summary = price_cart(
+        session, user_id, tax_id, shipping_id, coupon_id,
+        cart_items=cart_items, checkout=checkout, revision=revision,
+    )
+
+    return MyCartResponse(success=1, data=cart_responses, summary=summary)
 
 
 @router.post("/add", response_model=AddCartResponse)
@@ -251,72 +376,34 @@ def bulk_add_to_cart(
     """
     user_id = user.get("id")
 
-    # Validate all items first - check variable products require variation_option_id
-    validation_errors = []
-    for item in request.items:
-        is_valid, error_msg, _ = validate_variable_product(session, item.product_id, item.variation_option_id)
-        if not is_valid:
-            validation_errors.append({"product_id": item.product_id, "error": error_msg})
-
-    if validation_errors:
-        return api_response(400, "Some products require variation selection", {"errors": validation_errors})
-
-    # Get all existing cart items for this user
-    stmt = select(Cart).where(Cart.user_id == user_id)
-    existing_carts = session.execute(stmt).scalars().all()
-    existing_cart_dict = {cart.product_id: cart for cart in existing_carts}
-
-    added_carts = []
-
-    for item in request.items:
-        if item.product_id in existing_cart_dict:
-            # Update quantity if item exists
-            existing_cart = existing_cart_dict[item.product_id]
-            existing_cart.quantity += item.quantity
-            if item.variation_option_id is not None:
-                existing_cart.variation_option_id = item.variation_option_id
-            session.add(existing_cart)
-            added_carts.append(existing_cart)
-        else:
-            # Create new cart item
-            cart_data = {
-                "product_id": item.product_id,
-                "shop_id": item.shop_id,
-                "quantity": item.quantity,
-                "variation_option_id": item.variation_option_id,
-                "user_id": user_id
-            }
-            cart = Cart(**cart_data)
-            session.add(cart)
-            existing_cart_dict[item.product_id] = cart
-            added_carts.append(cart)
+    # ✅ Every product and variation checked with one query
+    valid_items, failed = validate_cart_items(session, request.items)
+    if not valid_items:
+        return api_response(400, "No items could be added to cart", {
+            "errors": [{"product_id": result.product_id, "error": result.error} for result in failed],
+        })
 
+    # ✅ One INSERT ... ON CONFLICT DO UPDATE instead of a select-then-write per item
+    cart_rows, results = upsert_cart_items(session, user_id, valid_items)
     session.commit()
 
-    # Refresh all carts to get their IDs
-    for cart in added_carts:
-        session.refresh(cart)
+    # Products, variations, categories, shops and manufacturers: one IN query each
+    checkout = CheckoutContext.for_cart(session, cart_rows)
 
     # Build response for all added items
     cart_responses = []
-    for cart in added_carts:
-        # Get product details
-        product_stmt = select(Product).where(Product.id == cart.product_id)
-        product = session.execute(product_stmt).scalar_one_or_none()
-
+    for cart in cart_rows:
+        product = checkout.get(Product, cart.product_id)
         if not product:
             continue
 
-        # Get variation option if exists
-        variation_option = None
-        if cart.variation_option_id:
-            var_stmt = select(VariationOption).where(VariationOption.id == cart.variation_option_id)
-            variation_option = session.execute(var_stmt).scalar_one_or_none()
+        variation_option = checkout.get(VariationOption, cart.variation_option_id)
 
-        cart_response = build_cart_item_response(session, cart, product, variation_option)
+        cart_response = build_cart_item_response(session, cart, product, variation_option, checkout=checkout)
         cart_responses.append(cart_response)
 
-    return BulkAddCartResponse(success=1, data=cart_responses)
+    results = sorted(failed + results, key=lambda result: result.index)
+    return BulkAddCartResponse(success=1, data=cart_responses, results=results)
 
 
 @router.post("/create")
@@ -399,60 +486,30 @@ def bulk_create_cart_items(
     }
     """
     user_id = user["id"]
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    # Validate all items first - check variable products require variation_option_id
-    validation_errors = []
-    for item in request.items:
-        is_valid, error_msg, _ = validate_variable_product(session, item.product_id, item.variation_option_id)
-        if not is_valid:
-            validation_errors.append({"product_id": item.product_id, "error": error_msg})
-
-    if validation_errors:
-        return api_response(400, "Some products require variation selection", {"errors": validation_errors})
-
-    # Get all existing cart items for this user to check for duplicates
-    stmt = select(Cart).where(Cart.user_id == user_id)
-    existing_carts = session.execute(stmt).scalars().all()
 
-    existing_cart_dict = {cart.product_id: cart for cart in existing_carts}
-
-    for item in request.items:
-        try:
-            if item.product_id in existing_cart_dict:
-                # Update quantity if item exists
-                existing_cart = existing_cart_dict[item.product_id]
-                existing_cart.quantity += item.quantity
-                session.add(existing_cart)
-                success_count += 1
-            else:
-                # Create new cart item - handle variation_option_id properly
-                cart_data = {
-                    "product_id": item.product_id,
-                    "shop_id": item.shop_id,
-                    "quantity": item.quantity,
-                    "variation_option_id": item.variation_option_id if item.variation_option_id is not None else None,
-                    "user_id": user_id
-                }
-                cart_item = Cart(**cart_data)
-                session.add(cart_item)
-                # Add to existing dict to prevent duplicates in same request
-                existing_cart_dict[item.product_id] = cart_item
-                success_count += 1
-
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({
-                "product_id": item.product_id,
-                "shop_id": item.shop_id,
-                "error": str(e)
-            })
+    # ✅ Every product and variation checked with one query
+    valid_items, failed = validate_cart_items(session, request.items)
+    if not valid_items:
+        return api_response(400, "No items could be added to cart", {
+            "errors": [{"product_id": result.product_id, "error": result.error} for result in failed],
+        })
+
+    failed_items = [
+        {
+            "product_id": result.product_id,
+            "shop_id": request.items[result.index].shop_id,
+            "error": result.error,
+        }
+        for result in failed
+    ]
 
     try:
+        # ✅ One INSERT ... ON CONFLICT DO UPDATE instead of a select-then-write per item
+        _, results = upsert_cart_items(session, user_id, valid_items)
         session.commit()
-        
+
+        success_count = len(results)
+        failed_count = len(failed)
         message = f"Successfully processed {success_count} items"
         if failed_count > 0:
             message += f", {failed_count} items failed"
@@ -462,7 +519,8 @@ def bulk_create_cart_items(
             success_count=success_count,
             failed_count=failed_count,
             failed_items=failed_items,
-            message=message
+            message=message,
+            results=sorted(failed + results, key=lambda result: result.index),
         )
 
     except Exception as e:
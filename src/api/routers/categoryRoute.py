@@ -1,11 +1,28 @@
 import ast
 from src.api.core.utility import now_pk
 from typing import Optional
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
 from sqlalchemy import select
 from src.api.core.utility import Print, uniqueSlugify
 from src.api.core.operation import listop, updateOp
 from src.api.core.response import api_response, raiseExceptions
+from src.api.core.category_closure import (
+    add_category_to_closure,
+    clear_descendants_cache,
+    delete_category_subtree,
+    is_descendant,
+    move_category_subtree,
+    relevel_subtree,
+    subtree_height,
+    update_subtree,
+)
+from src.api.core.category_tree import (
+    build_category_tree,
+    category_nodes,
+    etag_matches,
+    get_category_tree,
+    mark_category_tree_stale,
+)
 from sqlalchemy.orm import aliased
 from src.api.models.category_model.categoryModel import (
     Category,
@@ -16,7 +33,6 @@ from src.api.models.category_model.categoryModel import (
     CategoryActivate,
 )
 from src.api.core.dependencies import GetSession, requirePermission
-from sqlalchemy.orm import selectinload
 
 router = APIRouter(prefix="/category", tags=["Category"])
 
@@ -63,8 +79,11 @@ def create(
     if data.root_id is None:
         data.root_id = data.id
 
+    add_category_to_closure(session, data.id, data.parent_id)
+
     session.commit()  # commit everything in one transaction
     session.refresh(data)
+    mark_category_tree_stale()
 
     return api_response(
         200, "Category Created Successfully", CategoryRead.model_validate(data)
@@ -82,16 +101,21 @@ def update_category(
     category = session.get(Category, id)
     raiseExceptions((category, 404, "Category not found"))
 
-    if request.parent_id is not None and request.parent_id != category.parent_id:
+    moved = request.parent_id is not None and request.parent_id != category.parent_id
+    if moved:
         if request.parent_id == id:
-            api_response(400, "A category cannot be its own parent")
+            return api_response(400, "A category cannot be its own parent")
 
         parent = session.get(Category, request.parent_id)
         if not parent:
-            api_response(400, "New parent category not found")
+            return api_response(400, "New parent category not found")
+
+        # ✅ Uncached closure lookup: a stale cached subtree could let a cycle through
+        if is_descendant(session, parent.id, id):
+            return api_response(400, "Cannot move a category under its own descendant")
 
-        if parent.level >= 3:
-            api_response(400, "Cannot move under a level 3 category")
+        if parent.level + 1 + subtree_height(session, id) > 3:
+            return api_response(400, "Cannot create a category deeper than 3 levels")
 
         category.level = parent.level + 1
         category.root_id = parent.root_id if parent.root_id else parent.id
@@ -106,21 +130,23 @@ def update_category(
 
     session.add(category)
 
+    if moved:
+        session.flush()
+        move_category_subtree(session, id, category.parent_id)
+        relevel_subtree(session, id, category.root_id, category.level)
+
     if request.admin_commission_rate is not None:
-        def update_children_recursive(parent_cat):
-            children = session.exec(
-                select(Category).where(Category.parent_id == parent_cat.id)
-            ).scalars().all()
-            for child in children:
-                child.admin_commission_rate = request.admin_commission_rate
-                child.updated_at = now_pk()
-                session.add(child)
-                update_children_recursive(child)
-
-        update_children_recursive(category)
+        # ✅ One UPDATE for the whole subtree
+        update_subtree(
+            session,
+            id,
+            admin_commission_rate=request.admin_commission_rate,
+            updated_at=now_pk(),
+        )
 
     session.commit()
     session.refresh(category)
+    mark_category_tree_stale()
 
     return api_response(
         200, "Category updated successfully", CategoryRead.model_validate(category)
@@ -170,29 +196,17 @@ def delete(
     )
     session.delete(category)
     session.commit()
+    # closure rows go with the category (ON DELETE CASCADE)
+    clear_descendants_cache()
+    mark_category_tree_stale()
     return api_response(200, f"Category {category.name} deleted")
 
 
 def delete_category_tree(session, category_id: int):
     """
-    Recursively delete a category and all its children.
+    Delete a category and all its descendants (one statement via the closure table).
     """
-    # Get all direct children
-    children = (
-        session.exec(select(Category).where(Category.parent_id == category_id))
-        .scalars()
-        .all()
-    )
-
-    # Recursively delete children first
-    for child in children:
-        print("+++++++++++++++++++++++++", child)
-        delete_category_tree(session, child.id)
-
-    # Finally delete this category
-    category = session.get(Category, category_id)
-    if category:
-        session.delete(category)
+    delete_category_subtree(session, category_id)
 
 
 @router.delete("/delete-parent/{id}")
@@ -203,19 +217,20 @@ def deleteMany(
 ):
     category = session.get(Category, id)
     raiseExceptions((category, 404, "category not found"))
-    # Recursively delete this category and all its children
+    # Delete this category and all its descendants
     delete_category_tree(session, id)
     session.commit()
+    mark_category_tree_stale()
 
     return api_response(
         200, f"Category tree with root {category.name} deleted successfully"
     )
 
 
-# ✅ LIST
 # ✅ LIST
 @router.get("/list", response_model=list[CategoryReadNested])
 def list(
+    request: Request,
     session: GetSession,
     dateRange: Optional[str] = None,
     numberRange: Optional[str] = None,
@@ -226,6 +241,16 @@ def list(
     skip: int = 0,
     limit: int = Query(200, ge=1, le=200),
 ):
+    # ✅ Plain tree requests are served from memory with an ETag
+    if not (dateRange or numberRange or searchTerm or columnFilters or page or skip):
+        roots, etag = get_category_tree(session, is_active)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        if not roots:
+            return api_response(404, "No products found")
+        response = api_response(200, "Category found", roots, len(roots))
+        response.headers["ETag"] = etag
+        return response
 
     filters = {
         "searchTerm": searchTerm,
@@ -235,12 +260,6 @@ def list(
     }
     searchFields = ["name"]
 
-    # ✅ DEBUG: Print the is_active value
-    print(f"DEBUG: is_active filter value = {is_active}")
-    
-    # Check if listop supports custom_filters by looking at its function signature
-    # Let's try a different approach - modify the columnFilters to include is_active
-    
     if is_active is not None:
         # Convert is_active to string for columnFilters
         is_active_str = "true" if is_active else "false"
@@ -255,8 +274,6 @@ def list(
                 filters["columnFilters"] = f'[["is_active", "{is_active_str}"]]'
         else:
             filters["columnFilters"] = f'[["is_active", "{is_active_str}"]]'
-    
-    print(f"DEBUG: Final filters = {filters}")
 
     result = listop(
         session=session,
@@ -266,51 +283,12 @@ def list(
         skip=skip,
         page=page,
         limit=limit,
-        join_options=[selectinload(Category.children)],
     )
-    
-    # ✅ DEBUG: Check what results we got
-    print(f"DEBUG: Found {len(result['data']) if result['data'] else 0} categories")
-    if result['data']:
-        for cat in result['data']:
-            print(f"DEBUG: Category '{cat.name}' - is_active: {cat.is_active}")
 
     if not result["data"]:
         return api_response(404, "No products found")
 
-    categories = result["data"]
-
-    category_map = {
-        c.id: CategoryReadNested(
-            id=c.id,
-            name=c.name,
-            image=c.image,
-            root_id=c.root_id,
-            slug=c.slug,
-            details=c.details,
-            is_active=c.is_active,
-            parent_id=c.parent_id,
-            created_at=c.created_at,
-            updated_at=c.updated_at,
-            admin_commission_rate=c.admin_commission_rate,
-            children=[],
-        )
-        for c in categories
-    }
-    roots = []
-
-    for cat in category_map.values():
-        if cat.parent_id and cat.id != cat.parent_id:
-            parent = category_map.get(cat.parent_id)
-            if parent:
-                if not any(child.id == cat.id for child in parent.children):
-                    parent.children.append(cat)
-
-    for cat in category_map.values():
-        if not cat.parent_id:
-            roots.append(cat)
-        elif cat.parent_id not in category_map:
-            roots.append(cat)
+    roots = build_category_tree(category_nodes(result["data"]))
 
     total_roots = len(roots)
     if total_roots == 0:
@@ -336,6 +314,7 @@ def patch_category_status(
     session.add(updated)
     session.commit()
     session.refresh(updated)
+    mark_category_tree_stale()
 
     return api_response(
         200,
@@ -24,6 +24,8 @@ from src.api.models.shop_model.shopsModel import Shop
 from src.api.core.utility import uniqueSlugify
 from src.api.core.sku_generator import generate_unique_sku
 from src.api.core.transaction_logger import TransactionLogger
+from src.api.core.product_cache import invalidate_products
+from src.api.core.storefront_feeds import mark_feeds_stale
 
 router = APIRouter(prefix="/product", tags=["Product Import"])
 
@@ -677,6 +679,11 @@ def import_products_from_excel(
                 error_msg = f"Sheet '{sheet_name}': {str(e)}"
                 results['errors'].append(error_msg)
         
+        # Imported products must not be served from a stale product cache
+        invalidate_products(item['product_id'] for item in results['imported_products'])
+        if results['imported_products']:
+            mark_feeds_stale()
+
         # Update import history with final results
         import_service.update_import_history(
             status="completed",
@@ -0,0 +1,33 @@
+# src/api/routers/metricsRoute.py
+from fastapi import APIRouter
+
+from src.api.core.response import api_response
+from src.api.core.dependencies import requireAdmin
+from src.lib.db_instrumentation import (
+    DB_REPEAT_WARN_THRESHOLD,
+    metrics_snapshot,
+    reset_metrics,
+)
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+# ✅ SQL METRICS PER ROUTE (since startup or last reset)
+@router.get("")
+def get_metrics(user: requireAdmin):
+    routes = metrics_snapshot()
+    return api_response(
+        200,
+        "Metrics found" if routes else "No requests recorded yet",
+        {
+            "repeat_warn_threshold": DB_REPEAT_WARN_THRESHOLD,
+            "routes": routes,
+        },
+    )
+
+
+# ✅ RESET SQL METRICS
+@router.delete("/reset")
+def clear_metrics(user: requireAdmin):
+    reset_metrics()
+    return api_response(200, "Metrics reset")
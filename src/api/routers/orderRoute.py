@@ -9,9 +9,20 @@ from sqlmodel import SQLModel, Field, Relationship
 from src.api.models.cart_model.cartModel import Cart
 from src.api.core.utility import Print, uniqueSlugify
 from src.api.core.operation import listop, updateOp
+from src.api.core.operation.fieldsets import parse_fields, pick_fields
+from src.api.core.stock_reservation import release_stock, reserve_stock, stock_line
+from src.api.core.checkout_context import CheckoutContext
+from src.api.core.cart_pricing import (
+    calculate_item_tax,
+    calculate_product_discount,
+    line_prices,
+    price_line,
+    price_totals,
+)
+from src.api.core.idempotency import request_fingerprint, run_idempotent
+from src.api.core.outbox import enqueue
 from src.api.core.response import api_response, raiseExceptions
 from sqlalchemy.orm import selectinload, joinedload
-from src.api.core.email_helper import send_email
 from src.api.core.avatar_helper import get_user_avatar
 
 from src.api.models.order_model.orderModel import (
@@ -30,9 +41,7 @@ from src.api.models.order_model.orderModel import (
     OrderProductCreate,
     OrderFromCartCreate,
     FulfillmentUserInfo,
-    FreeShippingSource
 )
-from src.api.models.usersModel import User
 from src.api.models.product_model.productsModel import Product, ProductRead, ProductType
 from src.api.models.product_model.variationOptionModel import VariationOption
 from src.api.models.category_model import Category
@@ -40,15 +49,11 @@ from src.api.models.shop_model.shopsModel import Shop
 from src.api.models.shop_model.userShopModel import UserShop
 from src.api.models.role_model.userRoleModel import UserRole
 from src.api.models.withdrawModel import ShopEarning
-# NEW: Import tax and shipping models
-from src.api.models.taxModel import Tax
-from src.api.models.shipping_model.shippingModel import Shipping
-from src.api.models.couponModel import Coupon, CouponType
 from src.api.models.addressModel import Address, AddressDetail, Location
-from src.api.models.settingsModel import Settings
 from src.api.models.returnModel import UserWallet, WalletTransaction
 from src.api.core.dependencies import (
     GetSession,
+    IdempotencyKeyHeader,
     requirePermission,
     requireSignin,
     isAuthenticated,
@@ -57,8 +62,6 @@ from datetime import datetime
 from src.api.core.utility import now_pk
 import uuid
 from decimal import Decimal
-from src.api.core.transaction_logger import TransactionLogger
-from src.api.core.notification_helper import NotificationHelper
 # Add this cancellation request model to your orderModel.py
 class OrderCancelRequest(SQLModel):
     reason: Optional[str] = Field(default=None, max_length=500)
@@ -261,9 +264,12 @@ def add_fulfillment_user_info(order_data, order, session):
     return order_data
 
 
-def get_product_snapshot(session, product_id: int) -> Dict[str, Any]:
+def get_product_snapshot(
+    session, product_id: int, checkout: Optional[CheckoutContext] = None
+) -> Dict[str, Any]:
     """Get product snapshot for order record"""
-    product = session.get(Product, product_id)
+    get = checkout.get if checkout else session.get
+    product = get(Product, product_id)
     if not product:
         return {}
 
@@ -271,7 +277,7 @@ def get_product_snapshot(session, product_id: int) -> Dict[str, Any]:
     shop_name = None
     shop_slug = None
     if product.shop_id:
-        shop = session.get(Shop, product.shop_id)
+        shop = get(Shop, product.shop_id)
         if shop:
             shop_name = shop.name
             shop_slug = shop.slug
@@ -292,9 +298,12 @@ def get_product_snapshot(session, product_id: int) -> Dict[str, Any]:
     }
 
 
-def get_variation_snapshot(session, variation_option_id: int) -> Dict[str, Any]:
+def get_variation_snapshot(
+    session, variation_option_id: int, checkout: Optional[CheckoutContext] = None
+) -> Dict[str, Any]:
     """Get variation snapshot for order record"""
-    variation = session.get(VariationOption, variation_option_id)
+    get = checkout.get if checkout else session.get
+    variation = get(VariationOption, variation_option_id)
     if not variation:
         return {}
 
@@ -311,10 +320,11 @@ def get_variation_snapshot(session, variation_option_id: int) -> Dict[str, Any]:
 
 
 def validate_product_availability(
-    session, product_data: OrderProductCreate
+    session, product_data: OrderProductCreate, checkout: Optional[CheckoutContext] = None
 ) -> tuple[bool, str]:
     """Validate product availability based on type"""
-    product = session.get(Product, product_data.product_id)
+    get = checkout.get if checkout else session.get
+    product = get(Product, product_data.product_id)
     if not product or not product.is_active:
         return False, "Product not found or inactive"
 
@@ -338,7 +348,7 @@ def validate_product_availability(
     elif product_data.item_type == OrderItemType.VARIABLE:
         if not product_data.variation_option_id:
             return False, "Variation option ID required for variable product"
-        variation = session.get(VariationOption, product_data.variation_option_id)
+        variation = get(VariationOption, product_data.variation_option_id)
         if (
             variation
             and variation.quantity >= float(product_data.order_quantity)
@@ -358,75 +368,37 @@ def validate_product_availability(
 def update_product_inventory(
     session, product_data: OrderProductCreate, operation: str = "deduct"
 ):
-    """Update product inventory based on product type and track sales"""
-    multiplier = -1 if operation == "deduct" else 1
-
-    if product_data.item_type == OrderItemType.SIMPLE:
-        product = session.get(Product, product_data.product_id)
-        if product:
-            quantity_change = multiplier * float(product_data.order_quantity)
-            product.quantity += quantity_change
-
-            # Update sales tracking
-            if operation == "deduct":
-                product.total_sold_quantity += float(product_data.order_quantity)
-            else:  # restore/refund
-                product.total_sold_quantity -= float(product_data.order_quantity)
-
-            if product.quantity <= 0:
-                product.in_stock = False
-            else:
-                product.in_stock = True
-            session.add(product)
-
-    elif (
-        product_data.item_type == OrderItemType.VARIABLE
-        and product_data.variation_option_id
-    ):
-        variation = session.get(VariationOption, product_data.variation_option_id)
-        if variation:
-            quantity_change = multiplier * float(product_data.order_quantity)
-            variation.quantity += quantity_change
-
-            # Update parent product quantity and sales tracking
-            product = session.get(Product, product_data.product_id)
-            if product:
-                if operation == "deduct":
-                    product.total_sold_quantity += float(product_data.order_quantity)
-                else:
-                    product.total_sold_quantity -= float(product_data.order_quantity)
-
-                # FIXED: Recalculate total quantity from variations using scalar()
-                total_variation_quantity = session.scalar(
-                    select(func.sum(VariationOption.quantity)).where(
-                        VariationOption.product_id == product_data.product_id
-                    )
-                ) or 0
-                
-                product.quantity = total_variation_quantity
-                session.add(product)
+    """
+    Update product inventory for one order line and track sales.
+    Returns the shortfalls of a deduction ([] when the stock was taken).
+    """
+    if product_data.item_type == OrderItemType.VARIABLE and not product_data.variation_option_id:
+        return []
 
-            if variation.quantity <= 0:
-                variation.is_active = False
-            session.add(variation)
+    lines = [stock_line(product_data)]
+    if operation == "deduct":
+        return reserve_stock(session, lines)
+    return release_stock(session, lines)
 
 
 def calculate_admin_commission(
-    session, product_id: int, subtotal_after_discount: float
+    session,
+    product_id: int,
+    subtotal_after_discount: float,
+    checkout: Optional[CheckoutContext] = None,
 ) -> Decimal:
     """
     Calculate admin commission based on product's category commission rate
     Commission is calculated on the subtotal AFTER sale price discount is applied
     """
+    get = checkout.get if checkout else session.get
     try:
-        product = session.exec(
-            select(Product).where(Product.id == product_id)
-        ).scalar_one_or_none()
+        product = get(Product, product_id)
 
         if not product or not product.category_id:
             return Decimal("0.00")
 
-        category = session.get(Category, product.category_id)
+        category = get(Category, product.category_id)
         if not category or not category.admin_commission_rate:
             return Decimal("0.00")
 
@@ -470,174 +442,6 @@ def update_order_status_history(session, order_id: int, status_field: str):
     session.add(order_status)
 
 
-def validate_tax_shipping_coupon(
-    session,
-    tax_id: Optional[int],
-    shipping_id: Optional[int],
-    coupon_id: Optional[int],
-    order_amount: float,
-    language: str = "en"
-) -> tuple[bool, str, Dict[str, Any]]:
-    """
-    Validate tax, shipping, and coupon with enhanced coupon validation
-    and settings-based free shipping support.
-
-    Returns: (is_valid, error_message, calculation_data)
-
-    calculation_data includes:
-    - tax_rate, tax_amount
-    - shipping_amount (final amount after free shipping discount)
-    - original_shipping_amount (original shipping before discount)
-    - coupon_discount (discount amount from FIXED/PERCENTAGE coupons only)
-    - coupon_type
-    - free_shipping_source ('none', 'settings', 'coupon')
-    """
-    calculation_data = {
-        'tax_rate': 0.0,
-        'tax_amount': 0.0,
-        'shipping_amount': 0.0,
-        'original_shipping_amount': 0.0,
-        'coupon_discount': 0.0,
-        'coupon_type': None,
-        'free_shipping_source': FreeShippingSource.NONE.value
-    }
-
-    # Validate tax
-    if tax_id:
-        tax = session.get(Tax, tax_id)
-        if not tax:
-            return False, "Tax not found", calculation_data
-        if not tax.is_global and not tax.is_active:
-            return False, "Tax is not active", calculation_data
-        calculation_data['tax_rate'] = tax.rate
-
-    # Validate shipping and store original amount
-    original_shipping = 0.0
-    if shipping_id:
-        shipping = session.get(Shipping, shipping_id)
-        if not shipping:
-            return False, "Shipping not found", calculation_data
-        if not shipping.is_active:
-            return False, "Shipping is not active", calculation_data
-        original_shipping = shipping.amount
-        calculation_data['shipping_amount'] = original_shipping
-        calculation_data['original_shipping_amount'] = original_shipping
-
-    # Fetch settings for free shipping configuration
-    settings_statement = select(Settings).where(Settings.language == language)
-    settings_result = session.exec(settings_statement).first()
-
-    # Handle Row object vs Settings model
-    settings = None
-    if settings_result:
-        if hasattr(settings_result, 'options'):
-            settings = settings_result
-        elif hasattr(settings_result, '_mapping'):
-            # Extract Settings from Row object
-            mapping = dict(settings_result._mapping)
-            settings = mapping.get('Settings') or mapping.get(Settings)
-
-    # Fallback to English settings if language-specific not found
-    if not settings and language != "en":
-        settings_statement = select(Settings).where(Settings.language == "en")
-        settings_result = session.exec(settings_statement).first()
-        if settings_result:
-            if hasattr(settings_result, 'options'):
-                settings = settings_result
-            elif hasattr(settings_result, '_mapping'):
-                mapping = dict(settings_result._mapping)
-                settings = mapping.get('Settings') or mapping.get(Settings)
-
-    # Get free shipping settings (with defaults)
-    free_shipping_enabled = False
-    free_shipping_amount = 0       # order must reach this to qualify for free shipping
-    minimum_order_amount = 0       # minimum order amount (always enforced)
-    max_shipping_amount_off = 0    # max discount cap on shipping fee
-
-    options = None
-    if settings:
-        if hasattr(settings, 'options'):
-            options = settings.options
-        elif isinstance(settings, dict):
-            options = settings.get('options')
-
-    def _to_float(val):
-        try:
-            return float(val or 0)
-        except (ValueError, TypeError):
-            return 0.0
-
-    if options:
-        free_shipping_enabled = bool(options.get('freeShipping', False))
-        free_shipping_amount   = _to_float(options.get('freeShippingAmount', 0))
-        minimum_order_amount   = _to_float(options.get('minimumOrderAmount', 0))
-        max_shipping_amount_off = _to_float(options.get('maximumShippingAmountOff', 0))
-
-    # Always enforce minimum order amount (independent of free shipping)
-    if minimum_order_amount > 0 and order_amount < minimum_order_amount:
-        return False, f"Minimum order amount is {minimum_order_amount} without shipping fee", calculation_data
-
-    # Apply settings-based free shipping when enabled and order qualifies
-    settings_free_shipping_applied = False
-    if (
-        free_shipping_enabled
-        and original_shipping > 0
-        and free_shipping_amount > 0
-        and order_amount >= free_shipping_amount
-    ):
-        # Discount is capped by maximumShippingAmountOff (0 = no cap = full discount)
-        shipping_discount = min(original_shipping, max_shipping_amount_off) if max_shipping_amount_off > 0 else original_shipping
-        calculation_data['shipping_amount'] = original_shipping - shipping_discount
-        calculation_data['free_shipping_source'] = FreeShippingSource.SETTINGS.value
-        settings_free_shipping_applied = True
-
-    # Validate coupon with enhanced checks
-    if coupon_id:
-        coupon = session.get(Coupon, coupon_id)
-        if not coupon:
-            return False, "Coupon not found", calculation_data
-
-        # Check if coupon is active
-        now = now_pk()
-        if now < coupon.active_from or now > coupon.expire_at:
-            return False, "Coupon is not active", calculation_data
-
-        # Check minimum cart amount
-        if order_amount < coupon.minimum_cart_amount:
-            return False, f"Order amount must be at least {coupon.minimum_cart_amount} to use this coupon", calculation_data
-
-        calculation_data['coupon_type'] = coupon.type
-
-        # Calculate coupon discount based on type
-        if coupon.type == CouponType.FIXED:
-            calculation_data['coupon_discount'] = min(coupon.amount, order_amount)
-        elif coupon.type == CouponType.PERCENTAGE:
-            calculation_data['coupon_discount'] = order_amount * (coupon.amount / 100)
-        elif coupon.type == CouponType.FREE_SHIPPING:
-            # Only apply coupon free shipping if settings-based free shipping wasn't already applied
-            if not settings_free_shipping_applied and original_shipping > 0:
-                # Discount capped by maximumShippingAmountOff (0 = no cap = full discount)
-                shipping_discount = min(original_shipping, max_shipping_amount_off) if max_shipping_amount_off > 0 else original_shipping
-                calculation_data['shipping_amount'] = original_shipping - shipping_discount
-                calculation_data['free_shipping_source'] = FreeShippingSource.COUPON.value
-            # Note: coupon_discount stays 0.0 for FREE_SHIPPING coupons
-            # The shipping discount is tracked via free_shipping_source field
-
-    return True, "Validation successful", calculation_data
-
-
-def calculate_product_discount(price: float, sale_price: Optional[float], quantity: float) -> float:
-    """Calculate product-level discount"""
-    if sale_price and sale_price > 0 and sale_price < price:
-        return (price - sale_price) * quantity
-    return 0.0
-
-
-def calculate_item_tax(subtotal: float, tax_rate: float) -> float:
-    """Calculate tax for individual item"""
-    return subtotal * (tax_rate / 100)
-
-
 def get_payment_status_by_gateway(payment_gateway: Optional[str]) -> str:
     """
     Determine payment status based on payment gateway.
@@ -687,10 +491,17 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
     # Get unique product IDs to handle duplicates in cart_items
     unique_product_ids = set(product_ids)
 
-    # ✅ 2. Validate products exist in db
-    products = (
-        session.exec(select(Product).where(Product.id.in_(product_ids))).scalars().all()
+    # ✅ 2. Validate products exist in db (with variations, shops, categories,
+    # tax, shipping and coupon prefetched for the whole checkout)
+    checkout = CheckoutContext.load(
+        session,
+        product_ids,
+        [item.variation_option_id for item in cart_items],
+        request.tax_id,
+        request.shipping_id,
+        request.coupon_id,
     )
+    products = [checkout.products[pid] for pid in unique_product_ids if pid in checkout.products]
     if len(products) != len(unique_product_ids):
         found = {p.id for p in products}
         missing = [pid for pid in unique_product_ids if pid not in found]
@@ -709,14 +520,10 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
             .all()
         )
 
-    # ✅ 4. Calculate initial totals and validate variable products
-    subtotal_amount = 0.0
-    total_product_discount = 0.0
-    actual_amount = 0.0  # Sum of (price * quantity) without any discount
+    # ✅ 4. Validate variable products and price each line
+    priced_lines = []
     validation_errors = []
 
-    # NEW: Calculate initial subtotal for tax/shipping/coupon validation
-    initial_calculation = {}
     for item in cart_items:
         product = next((p for p in products if p.id == item.product_id), None)
         if not product:
@@ -737,7 +544,7 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
 
         # Handle variable products
         if item.variation_option_id:
-            variation = session.get(VariationOption, item.variation_option_id)
+            variation = checkout.get(VariationOption, item.variation_option_id)
             if not variation:
                 validation_errors.append(f"Variation option {item.variation_option_id} not found")
                 continue
@@ -751,54 +558,39 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
                 validation_errors.append(f"Insufficient stock for variation {variation.title}. Available: {variation.quantity}, Requested: {quantity}")
                 continue
                 
-            price = float(variation.price)
-            sale_price = float(variation.sale_price) if variation.sale_price and variation.sale_price > 0 else None
+            price, sale_price = line_prices(product, variation)
         else:
             # Handle simple product
             if product.quantity < quantity:
                 validation_errors.append(f"Insufficient stock for {product.name}. Available: {product.quantity}, Requested: {quantity}")
                 continue
                 
-            price = float(product.price)
-            sale_price = float(product.sale_price) if product.sale_price and product.sale_price > 0 else None
+            price, sale_price = line_prices(product)
         
-        # Calculate product discount
-        item_discount = calculate_product_discount(price, sale_price, quantity)
-        total_product_discount += item_discount
-
-        # Calculate actual_amount (price * quantity without any discount)
-        actual_amount += price * quantity
-
-        # Use sale price if available, otherwise use regular price
-        final_price = sale_price if sale_price and sale_price > 0 else price
-        subtotal_amount += final_price * quantity
+        # Actual amount, sale-price subtotal and product discount of the line
+        priced_lines.append(price_line(price, sale_price, quantity))
 
     if validation_errors:
         return api_response(400, "Product validation failed", {"errors": validation_errors})
 
     # NEW: Validate tax, shipping, and coupon (with settings-based free shipping)
-    is_valid, error_msg, calc_data = validate_tax_shipping_coupon(
-        session, request.tax_id, request.shipping_id, request.coupon_id, subtotal_amount, "en"
+    is_valid, error_msg, totals = price_totals(
+        session, priced_lines, request.tax_id, request.shipping_id, request.coupon_id, "en",
+        checkout=checkout,
     )
     if not is_valid:
         return api_response(400, error_msg)
 
-    # NEW: Calculate final amounts with tax, shipping, and coupon
-    tax_amount = round(subtotal_amount * (calc_data['tax_rate'] / 100))
-    shipping_amount = round(calc_data['shipping_amount'])
-    original_shipping_amount = round(calc_data['original_shipping_amount'])
-    coupon_discount = round(calc_data['coupon_discount'])
-    free_shipping_source = calc_data['free_shipping_source']
-
-    # Round subtotal and product discount
-    subtotal_amount = round(subtotal_amount)
-    total_product_discount = round(total_product_discount)
-
-    # Calculate final total
-    final_total = round(subtotal_amount + tax_amount + shipping_amount - coupon_discount)
-
-    # Ensure total doesn't go below zero
-    final_total = max(0, final_total)
+    # Amounts are rounded to whole numbers by price_totals
+    subtotal_amount = totals["subtotal"]
+    actual_amount = totals["actual_amount"]
+    total_product_discount = totals["product_discount"]
+    tax_amount = totals["tax"]
+    shipping_amount = totals["delivery_fee"]
+    original_shipping_amount = totals["original_delivery_fee"]
+    coupon_discount = totals["coupon_discount"]
+    free_shipping_source = totals["free_shipping_source"]
+    final_total = totals["total"]
 
     # ✅ WALLET DEDUCTION: Process wallet payment if requested
     wallet_amount_used = 0.0
@@ -826,6 +618,13 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
                 paid_total = round(final_total - wallet_amount_used, 2)
                 paid_total = max(0, paid_total)
 
+    # ✅ Reserve stock for every line in one pass (all or nothing)
+    shortfalls = reserve_stock(session, [stock_line(item) for item in cart_items])
+    if shortfalls:
+        return api_response(400, "Product validation failed", {
+            "errors": [f"Product {shortfall['product_id']}: {shortfall['message']}" for shortfall in shortfalls],
+        })
+
     # ✅ 5. Build order fields with NEW fields
     tracking_number = generate_tracking_number()
     order = Order(
@@ -880,38 +679,36 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
         item_type = OrderItemType.VARIABLE if item.variation_option_id else OrderItemType.SIMPLE
         
         # Create product and variation snapshots
-        product_snapshot = get_product_snapshot(session, product.id)
+        product_snapshot = get_product_snapshot(session, product.id, checkout)
         variation_snapshot = None
         
         if item_type == OrderItemType.VARIABLE:
-            variation = session.get(VariationOption, item.variation_option_id)
+            variation = checkout.get(VariationOption, item.variation_option_id)
             if not variation:
                 continue
                 
-            price = float(variation.price)
-            sale_price = float(variation.sale_price) if variation.sale_price and variation.sale_price > 0 else None
+            price, sale_price = line_prices(product, variation)
             
             # Create variation snapshot
-            variation_snapshot = get_variation_snapshot(session, item.variation_option_id)
+            variation_snapshot = get_variation_snapshot(session, item.variation_option_id, checkout)
             variation_data = {
                 "id": variation.id,
                 "title": variation.title,
                 "options": variation.options,
             } if variation else None
         else:
-            price = float(product.price)
-            sale_price = float(product.sale_price) if product.sale_price and product.sale_price > 0 else None
+            price, sale_price = line_prices(product)
             variation_data = None
 
         # Calculate item-level values (rounded to whole numbers)
         final_price = sale_price if sale_price and sale_price > 0 else price
         subtotal = round(final_price * quantity)
         item_discount = round(calculate_product_discount(price, sale_price, quantity))
-        item_tax = round(calculate_item_tax(subtotal, calc_data['tax_rate']))
+        item_tax = round(calculate_item_tax(subtotal, totals['tax_rate']))
 
         # Calculate admin commission on subtotal (after sale price discount)
         admin_commission = calculate_admin_commission(
-            session, product.id, subtotal
+            session, product.id, subtotal, checkout
         )
         total_admin_commission += admin_commission
 
@@ -945,26 +742,6 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
     order_status = OrderStatus(order_id=order.id, order_pending_date=now_pk())
     session.add(order_status)
     
-    # Update inventory using the proper update_product_inventory function
-    for item in cart_items:
-        product = next((p for p in products if p.id == item.product_id), None)
-        if not product:
-            continue
-        
-        # Create OrderProductCreate object for inventory update
-        product_data = OrderProductCreate(
-            product_id=item.product_id,
-            variation_option_id=item.variation_option_id,
-            order_quantity=str(item.quantity),
-            unit_price=0.0,
-            subtotal=0.0,
-            item_type=OrderItemType.VARIABLE if item.variation_option_id else OrderItemType.SIMPLE,
-            shop_id=product.shop_id,
-        )
-        
-        # Use the centralized update_product_inventory function
-        update_product_inventory(session, product_data, operation="deduct")
-
     # ✅ 7. Clear user cart if authenticated
     if user and carts:
         for cart in carts:
@@ -1004,84 +781,19 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
             wallet.total_debited = round(wallet.total_debited + wallet_amount_used, 2)
             session.add(wallet)
 
+    # Logs, notifications and the confirmation email go out through the outbox
+    enqueue(session, "order.placed", {
+        "order_id": order.id,
+        "user_id": user["id"] if user else None,
+        "notes": f"Order {tracking_number} created from cart",
+        "notify": bool(user),
+        "email_to": shipping_address.get("email") or order.customer_contact,
+    })
+
     try:
         session.commit()
         session.refresh(order)
 
-        # Log order placement transaction
-        try:
-            logger = TransactionLogger(session)
-            logger.log_order_placed(
-                order=order,
-                user_id=user["id"] if user else None,
-                notes=f"Order {tracking_number} created from cart"
-            )
-
-            # Log stock deduction for each product
-            for op in order_products:
-                product = session.get(Product, op.product_id)
-                if product:
-                    logger.log_stock_deduction(
-                        product=product,
-                        quantity=int(float(op.order_quantity)),
-                        user_id=user["id"] if user else None,
-                        notes=f"Stock deducted for order {tracking_number}",
-                        order_id=order.id,
-                        order_product_id=op.id,
-                        variation_option_id=op.variation_option_id if op.item_type == OrderItemType.VARIABLE else None,
-                        unit_price=float(op.unit_price) if op.unit_price else None,
-                        sale_price=float(op.sale_price) if op.sale_price else None,
-                        subtotal=float(op.subtotal) if op.subtotal else None,
-                        discount=float(op.item_discount) if op.item_discount else None,
-                        tax=float(op.item_tax) if op.item_tax else None,
-                        total=float(op.subtotal) if op.subtotal else None
-                    )
-        except Exception as e:
-            Print(f"Failed to log order transaction: {e}")
-
-        # Send notifications to customer, shop owners, and admins
-        try:
-            # Get unique shop IDs from order products
-            shop_ids = list(set([op.shop_id for op in order_products if op.shop_id]))
-            Print(f"📢 Sending notifications for order {tracking_number} to {len(shop_ids)} shop(s): {shop_ids}")
-
-            if user:
-                NotificationHelper.notify_order_placed(
-                    session=session,
-                    order_id=order.id,
-                    tracking_number=tracking_number,
-                    customer_id=user["id"],
-                    shop_ids=shop_ids,
-                    total_amount=float(final_total)
-                )
-                Print(f"✅ Notifications sent successfully")
-        except Exception as e:
-            Print(f"❌ Failed to send order notifications: {e}")
-            import traceback
-            Print(f"Traceback: {traceback.format_exc()}")
-
-        # Send order confirmation email
-        try:
-            send_email(
-                to_email=shipping_address.get("email") or order.customer_contact,
-                email_template_id=5,  # Use appropriate template ID for order confirmation
-                replacements={
-                    "customer_name": order.customer_name,
-                    "order_number": tracking_number,
-                    "order_date":order.created_at,
-                    "order_id": order.id,
-                    "amount": order.amount,
-                    "delivery_date":order.delivery_time,
-                    "payment_gateway":order.payment_gateway,
-                    "total_amount": f"Rs.{float(order.total):,.2f}" if order.total else "N/A",
-                    "delivery_fee": f"Rs.{float(order.delivery_fee):,.2f}" if order.delivery_fee else "N/A" ,
-                },
-                session=session
-            )
-        except Exception as e:
-            # Log email error but don't fail order creation
-            Print(f"Failed to send order confirmation email: {e}")
-
         return api_response(
             201,
             "Order created successfully",
@@ -1105,11 +817,22 @@ def create(request: OrderCartCreate, session: GetSession, user: isAuthenticated
 def create_order_from_cart(
     request: OrderFromCartCreate,
     session: GetSession, 
-    user: requireSignin
+    user: requireSignin,
+    idempotency_key: IdempotencyKeyHeader = None,
 ):
     """
-    Create order from user's cart items and clear cart after successful order creation
+    Create order from user's cart items and clear cart after successful order creation.
+    Retries sent with the same Idempotency-Key get the first response back.
     """
+    return run_idempotent(
+        idempotency_key,
+        scope=f"order:create-from-cart:{user.get('id')}",
+        fingerprint=request_fingerprint(request),
+        handler=lambda: _create_order_from_cart(request, session, user),
+    )
+
+
+def _create_order_from_cart(request: OrderFromCartCreate, session, user: dict):
     user_id = user.get("id")
     shipping_address = request.shipping_address
     
@@ -1224,42 +947,19 @@ def create_order_from_cart(
         Print("❌ No valid product IDs found in cart items")
         return api_response(400, "No valid products found in cart")
     
-    # ✅ 4. Get products from database
+    # ✅ 4. Prefetch products, variations, shops, categories, tax, shipping and coupon
     try:
         Print(f"🔍 Fetching products from database for IDs: {product_ids}")
-        products_stmt = select(Product).where(Product.id.in_(product_ids))
-        products_result = session.exec(products_stmt)
-        products_rows = products_result.all()
-        
-        # Process product rows similarly
-        products = []
-        for product_row in products_rows:
-            if hasattr(product_row, '_mapping'):
-                # Extract Product object from Row
-                mapping = dict(product_row._mapping)
-                product_obj = None
-                
-                if 'Product' in mapping:
-                    product_obj = mapping['Product']
-                elif Product in mapping:
-                    product_obj = mapping[Product]
-                else:
-                    for key, value in mapping.items():
-                        if isinstance(value, Product):
-                            product_obj = value
-                            break
-                
-                if product_obj:
-                    products.append(product_obj)
-            elif isinstance(product_row, Product):
-                products.append(product_row)
-        
+        checkout = CheckoutContext.load(
+            session,
+            product_ids,
+            [cart_data.get('variation_option_id') for cart_data in valid_cart_items],
+            request.tax_id,
+            request.shipping_id,
+            request.coupon_id,
+        )
+        products = list(checkout.products.values())
         Print(f"✅ Found {len(products)} products in database")
-        
-        # Debug each product found
-        for i, product in enumerate(products):
-            Print(f"   Product {i}: ID={product.id}, Name='{product.name}', Active={product.is_active}, Price={product.price}")
-            
     except Exception as e:
         Print(f"❌ Error fetching products: {str(e)}")
         return api_response(500, f"Error fetching products: {str(e)}")
@@ -1268,10 +968,8 @@ def create_order_from_cart(
     product_dict = {product.id: product for product in products}
     Print(f"📋 Product lookup dictionary keys: {list(product_dict.keys())}")
     
-    # ✅ 5. Validate all cart items and calculate initial totals
-    subtotal_amount = 0.0
-    total_product_discount = 0.0
-    actual_amount = 0.0  # Sum of (price * quantity) without any discount
+    # ✅ 5. Validate all cart items and price each line
+    priced_lines = []
     validation_errors = []
     order_products_data = []
 
@@ -1337,7 +1035,7 @@ def create_order_from_cart(
         # Validate variable products
         if item_type == OrderItemType.VARIABLE:
             Print(f"   🔍 Validating variable product...")
-            variation = session.get(VariationOption, variation_option_id)
+            variation = checkout.get(VariationOption, variation_option_id)
             if not variation:
                 error_msg = f"Variation option {variation_option_id} not found"
                 Print(f"   ❌ {error_msg}")
@@ -1361,8 +1059,7 @@ def create_order_from_cart(
             Print(f"   ✅ Variation stock is sufficient")
             
             # Get variation prices
-            price = float(variation.price)
-            sale_price = float(variation.sale_price) if variation.sale_price and variation.sale_price > 0 else None
+            price, sale_price = line_prices(product, variation)
             Print(f"   Variation price: {price}, sale_price: {sale_price}")
             
             variation_data = {
@@ -1384,24 +1081,16 @@ def create_order_from_cart(
             Print(f"   ✅ Product stock is sufficient")
             
             # Get product prices
-            price = float(product.price)
-            sale_price = float(product.sale_price) if product.sale_price and product.sale_price > 0 else None
+            price, sale_price = line_prices(product)
             Print(f"   Product price: {price}, sale_price: {sale_price}")
             variation_data = None
         
-        # Calculate product discount
-        item_discount = calculate_product_discount(price, sale_price, quantity)
-        total_product_discount += item_discount
-
-        # Calculate actual_amount (price * quantity without any discount)
-        actual_amount += price * quantity
+        # Actual amount, sale-price subtotal and product discount of the line
+        line = price_line(price, sale_price, quantity)
+        priced_lines.append(line)
+        subtotal = line["subtotal"]
 
-        # Use sale price if available, otherwise use regular price
-        final_price = sale_price if sale_price and sale_price > 0 else price
-        subtotal = final_price * quantity
-        subtotal_amount += subtotal
-
-        Print(f"   💰 Price calculations: final_price={final_price}, subtotal={subtotal}, item_discount={item_discount}")
+        Print(f"   💰 Price calculations: subtotal={subtotal}, item_discount={line['discount']}")
         
         # Prepare order product data
         order_product_data = OrderProductCreate(
@@ -1424,28 +1113,23 @@ def create_order_from_cart(
         return api_response(400, "Cart validation failed", {"errors": validation_errors})
 
     # ✅ 6. Validate tax, shipping, and coupon (with settings-based free shipping)
-    is_valid, error_msg, calc_data = validate_tax_shipping_coupon(
-        session, request.tax_id, request.shipping_id, request.coupon_id, subtotal_amount, "en"
+    is_valid, error_msg, totals = price_totals(
+        session, priced_lines, request.tax_id, request.shipping_id, request.coupon_id, "en",
+        checkout=checkout,
     )
     if not is_valid:
         return api_response(400, error_msg)
 
-    # ✅ 7. Calculate final amounts with tax, shipping, and coupon (rounded to whole numbers)
-    tax_amount = round(subtotal_amount * (calc_data['tax_rate'] / 100))
-    shipping_amount = round(calc_data['shipping_amount'])
-    original_shipping_amount = round(calc_data['original_shipping_amount'])
-    coupon_discount = round(calc_data['coupon_discount'])
-    free_shipping_source = calc_data['free_shipping_source']
-
-    # Round subtotal and product discount
-    subtotal_amount = round(subtotal_amount)
-    total_product_discount = round(total_product_discount)
-
-    # Calculate final total
-    final_total = round(subtotal_amount + tax_amount + shipping_amount - coupon_discount)
-
-    # Ensure total doesn't go below zero
-    final_total = max(0, final_total)
+    # Amounts are rounded to whole numbers by price_totals
+    subtotal_amount = totals["subtotal"]
+    actual_amount = totals["actual_amount"]
+    total_product_discount = totals["product_discount"]
+    tax_amount = totals["tax"]
+    shipping_amount = totals["delivery_fee"]
+    original_shipping_amount = totals["original_delivery_fee"]
+    coupon_discount = totals["coupon_discount"]
+    free_shipping_source = totals["free_shipping_source"]
+    final_total = totals["total"]
 
     # ✅ 7.5. Calculate wallet deduction if requested
     wallet_amount_used = 0.0
@@ -1470,6 +1154,13 @@ def create_order_from_cart(
                 paid_total = round(final_total - wallet_amount_used, 2)
                 paid_total = max(0, paid_total)
 
+    # ✅ Reserve stock for every line in one pass (all or nothing)
+    shortfalls = reserve_stock(session, [stock_line(data) for data in order_products_data])
+    if shortfalls:
+        return api_response(400, "Cart validation failed", {
+            "errors": [f"Product {shortfall['product_id']}: {shortfall['message']}" for shortfall in shortfalls],
+        })
+
     # ✅ 8. Create order with enhanced fields
     tracking_number = generate_tracking_number()
 
@@ -1516,10 +1207,10 @@ def create_order_from_cart(
             continue
             
         # Create product snapshots
-        product_snapshot = get_product_snapshot(session, product_data.product_id)
+        product_snapshot = get_product_snapshot(session, product_data.product_id, checkout)
         variation_snapshot = None
         if product_data.variation_option_id:
-            variation_snapshot = get_variation_snapshot(session, product_data.variation_option_id)
+            variation_snapshot = get_variation_snapshot(session, product_data.variation_option_id, checkout)
 
         # Calculate item-level values (rounded to whole numbers)
         quantity = float(product_data.order_quantity)
@@ -1528,13 +1219,14 @@ def create_order_from_cart(
             product.sale_price if product.sale_price and product.sale_price > 0 else None,
             quantity
         ))
-        item_tax = round(calculate_item_tax(product_data.subtotal, calc_data['tax_rate']))
+        item_tax = round(calculate_item_tax(product_data.subtotal, totals['tax_rate']))
 
         # Calculate admin commission on subtotal (after sale price discount)
         admin_commission = calculate_admin_commission(
             session,
             product_data.product_id,
-            product_data.subtotal
+            product_data.subtotal,
+            checkout,
         )
         total_admin_commission += admin_commission
 
@@ -1558,9 +1250,6 @@ def create_order_from_cart(
         )
         session.add(order_product)
         created_order_products.append(order_product)
-        
-        # Update inventory
-        update_product_inventory(session, product_data, "deduct")
     
     # ✅ 10. Update order with total admin commission
     order.admin_commission_amount = total_admin_commission
@@ -1614,62 +1303,20 @@ def create_order_from_cart(
                 wallet.total_debited = round(wallet.total_debited + wallet_amount_used, 2)
                 session.add(wallet)
 
+        # Logs, notifications and the confirmation email go out through the outbox
+        enqueue(session, "order.placed", {
+            "order_id": order.id,
+            "user_id": user_id,
+            "notes": f"Order {tracking_number} created from user cart",
+            "notify": True,
+            "email_to": shipping_address.get("email") or order.customer_contact,
+        })
+
         # Commit all changes (order creation + cart clearance + wallet transaction)
         session.commit()
 
         Print(f"✅ Successfully cleared {len(cart_items_to_delete)} items from cart")
 
-        # Log order placement transaction
-        try:
-            logger = TransactionLogger(session)
-            logger.log_order_placed(
-                order=order,
-                user_id=user_id,
-                notes=f"Order {tracking_number} created from user cart"
-            )
-
-            # Log stock deduction for each product
-            for op in created_order_products:
-                product = session.get(Product, op.product_id)
-                if product:
-                    logger.log_stock_deduction(
-                        product=product,
-                        quantity=int(float(op.order_quantity)),
-                        user_id=user_id,
-                        notes=f"Stock deducted for order {tracking_number}",
-                        order_id=order.id,
-                        order_product_id=op.id,
-                        variation_option_id=op.variation_option_id if op.item_type == OrderItemType.VARIABLE else None,
-                        unit_price=float(op.unit_price) if op.unit_price else None,
-                        sale_price=float(op.sale_price) if op.sale_price else None,
-                        subtotal=float(op.subtotal) if op.subtotal else None,
-                        discount=float(op.item_discount) if op.item_discount else None,
-                        tax=float(op.item_tax) if op.item_tax else None,
-                        total=float(op.subtotal) if op.subtotal else None
-                    )
-        except Exception as e:
-            Print(f"❌ Failed to log order transaction: {e}")
-
-        # Send notifications to customer, shop owners, and admins
-        try:
-            # Get unique shop IDs from created order products
-            shop_ids = list(set([op.shop_id for op in created_order_products if op.shop_id]))
-            Print(f"📢 Sending notifications for order {tracking_number} to {len(shop_ids)} shop(s): {shop_ids}")
-
-            NotificationHelper.notify_order_placed(
-                session=session,
-                order_id=order.id,
-                tracking_number=tracking_number,
-                customer_id=user_id,
-                shop_ids=shop_ids,
-                total_amount=float(final_total)
-            )
-            Print(f"✅ Notifications sent successfully")
-        except Exception as e:
-            Print(f"❌ Failed to send order notifications: {e}")
-            import traceback
-            Print(f"Traceback: {traceback.format_exc()}")
-
     except Exception as e:
         # Rollback if cart clearance fails
         session.rollback()
@@ -1685,7 +1332,7 @@ def create_order_from_cart(
         # Include variation information if applicable
         cart_item_data = next((item for item in valid_cart_items if item['product_id'] == product.id), None)
         if cart_item_data and cart_item_data.get('variation_option_id'):
-            variation = session.get(VariationOption, cart_item_data['variation_option_id'])
+            variation = checkout.get(VariationOption, cart_item_data['variation_option_id'])
             if variation:
                 product_data["selected_variation"] = {
                     "id": variation.id,
@@ -1694,28 +1341,6 @@ def create_order_from_cart(
                 }
         products_data.append(product_data)
 
-    # Send order confirmation email
-    try:
-        send_email(
-            to_email=shipping_address.get("email") or order.customer_contact,
-            email_template_id=5,  # Use appropriate template ID for order confirmation
-            replacements={
-                "customer_name": order.customer_name,
-                "order_number": tracking_number,
-                "order_date":order.created_at,
-                "order_id": order.id,
-                "amount": f"Rs.{float(order.amount):,.2f}" if order.amount else "N/A",
-                "delivery_date":order.delivery_time,
-                "payment_gateway":order.payment_gateway,
-                "total_amount": f"Rs.{float(order.total):,.2f}" if order.total else "N/A",
-                "delivery_fee": f"Rs.{float(order.delivery_fee):,.2f}" if order.delivery_fee else "N/A",
-            },
-            session=session
-        )
-    except Exception as e:
-        # Log email error but don't fail order creation
-        Print(f"Failed to send order confirmation email: {e}")
-
     return api_response(
         201,
         "Order created successfully from cart and cart cleared",
@@ -1743,19 +1368,26 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
     if not request.order_products:
         return api_response(400, "Order products cannot be empty")
 
-    # ✅ 2. Validate products and calculate initial totals
-    subtotal_amount = 0.0
-    total_product_discount = 0.0
-    actual_amount = 0.0  # Sum of (price * quantity) without any discount
+    # ✅ 2. Validate products and price each line
+    priced_lines = []
     validation_errors = []
 
+    checkout = CheckoutContext.load(
+        session,
+        [op_request.product_id for op_request in request.order_products],
+        [op_request.variation_option_id for op_request in request.order_products],
+        request.tax_id,
+        request.shipping_id,
+        request.coupon_id,
+    )
+
     for op_request in request.order_products:
-        is_available, message = validate_product_availability(session, op_request)
+        is_available, message = validate_product_availability(session, op_request, checkout)
         if not is_available:
             validation_errors.append(f"Product {op_request.product_id}: {message}")
             continue
 
-        product = session.get(Product, op_request.product_id)
+        product = checkout.get(Product, op_request.product_id)
         if not product:
             validation_errors.append(f"Product {op_request.product_id} not found")
             continue
@@ -1767,7 +1399,7 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
                 validation_errors.append(f"Product '{product.name}' is a variable product. Please select a valid variation option before purchasing.")
                 continue
             # Verify variation belongs to product
-            variation = session.get(VariationOption, variation_id)
+            variation = checkout.get(VariationOption, variation_id)
             if not variation or variation.product_id != product.id:
                 validation_errors.append(f"Invalid variation option for product '{product.name}'. Please select a valid option.")
                 continue
@@ -1778,45 +1410,45 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
             validation_errors.append(f"Invalid quantity for product {product.name}: {op_request.order_quantity}")
             continue
             
-        # Calculate product discount
-        item_discount = calculate_product_discount(
-            op_request.unit_price,
-            product.sale_price if product.sale_price and product.sale_price > 0 else None,
-            quantity
-        )
-        total_product_discount += item_discount
-
-        # Calculate actual_amount (price * quantity without any discount)
-        actual_amount += op_request.unit_price * quantity
-
-        subtotal_amount += op_request.subtotal
+        # Direct orders carry their own unit price and subtotal
+        priced_lines.append({
+            "actual_amount": op_request.unit_price * quantity,
+            "subtotal": op_request.subtotal,
+            "discount": calculate_product_discount(
+                op_request.unit_price,
+                product.sale_price if product.sale_price and product.sale_price > 0 else None,
+                quantity
+            ),
+        })
 
     if validation_errors:
         return api_response(400, "Product validation failed", {"errors": validation_errors})
 
     # NEW: Validate tax, shipping, and coupon (with settings-based free shipping)
-    is_valid, error_msg, calc_data = validate_tax_shipping_coupon(
-        session, request.tax_id, request.shipping_id, request.coupon_id, subtotal_amount, "en"
+    is_valid, error_msg, totals = price_totals(
+        session, priced_lines, request.tax_id, request.shipping_id, request.coupon_id, "en",
+        checkout=checkout,
     )
     if not is_valid:
         return api_response(400, error_msg)
 
-    # NEW: Calculate final amounts with tax, shipping, and coupon (rounded to whole numbers)
-    tax_amount = round(subtotal_amount * (calc_data['tax_rate'] / 100))
-    shipping_amount = round(calc_data['shipping_amount'])
-    original_shipping_amount = round(calc_data['original_shipping_amount'])
-    coupon_discount = round(calc_data['coupon_discount'])
-    free_shipping_source = calc_data['free_shipping_source']
-
-    # Round subtotal and product discount
-    subtotal_amount = round(subtotal_amount)
-    total_product_discount = round(total_product_discount)
-
-    # Calculate final total
-    final_total = round(subtotal_amount + tax_amount + shipping_amount - coupon_discount)
-
-    # Ensure total doesn't go below zero
-    final_total = max(0, final_total)
+    # Amounts are rounded to whole numbers by price_totals
+    subtotal_amount = totals["subtotal"]
+    actual_amount = totals["actual_amount"]
+    total_product_discount = totals["product_discount"]
+    tax_amount = totals["tax"]
+    shipping_amount = totals["delivery_fee"]
+    original_shipping_amount = totals["original_delivery_fee"]
+    coupon_discount = totals["coupon_discount"]
+    free_shipping_source = totals["free_shipping_source"]
+    final_total = totals["total"]
+
+    # ✅ Reserve stock for every line in one pass (all or nothing)
+    shortfalls = reserve_stock(session, [stock_line(op_request) for op_request in request.order_products])
+    if shortfalls:
+        return api_response(400, "Product validation failed", {
+            "errors": [f"Product {shortfall['product_id']}: {shortfall['message']}" for shortfall in shortfalls],
+        })
 
     # ✅ 3. Create order with enhanced fields
     tracking_number = generate_tracking_number()
@@ -1857,7 +1489,7 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
     order_products = []
     
     for op_request in request.order_products:
-        product = session.get(Product, op_request.product_id)
+        product = checkout.get(Product, op_request.product_id)
         if not product:
             continue
             
@@ -1867,7 +1499,7 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
             continue
             
         # Create product snapshot
-        product_snapshot = get_product_snapshot(session, product.id)
+        product_snapshot = get_product_snapshot(session, product.id, checkout)
 
         # Calculate item-level values (rounded to whole numbers)
         item_discount = round(calculate_product_discount(
@@ -1875,11 +1507,11 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
             product.sale_price if product.sale_price and product.sale_price > 0 else None,
             quantity
         ))
-        item_tax = round(calculate_item_tax(op_request.subtotal, calc_data['tax_rate']))
+        item_tax = round(calculate_item_tax(op_request.subtotal, totals['tax_rate']))
 
         # Calculate admin commission on subtotal (after sale price discount)
         admin_commission = calculate_admin_commission(
-            session, product.id, op_request.subtotal
+            session, product.id, op_request.subtotal, checkout
         )
         total_admin_commission += admin_commission
 
@@ -1901,9 +1533,6 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
             product_snapshot=product_snapshot,
         )
         order_products.append(op)
-        
-        # Update inventory
-        update_product_inventory(session, op_request, operation="deduct")
 
     session.add_all(order_products)
     
@@ -1925,51 +1554,17 @@ def create_order(request: OrderCreate, session: GetSession, user: isAuthenticate
         is_authenticated=user is not None
     )
 
+    # Logs and notifications go out through the outbox
+    enqueue(session, "order.placed", {
+        "order_id": order.id,
+        "user_id": customer_id,
+        "notes": f"Order {tracking_number} created",
+        "notify": True,
+    })
+
     try:
         session.commit()
 
-        # Log order placement transaction
-        logger = TransactionLogger(session)
-        logger.log_order_placed(
-            order=order,
-            user_id=request.customer_id or (user["id"] if user else None),
-            notes=f"Order {tracking_number} created"
-        )
-
-        # Log stock deduction for each product
-        for op in order_products:
-            product = session.get(Product, op.product_id)
-            if product:
-                logger.log_stock_deduction(
-                    product=product,
-                    quantity=int(float(op.order_quantity)),
-                    user_id=request.customer_id or (user["id"] if user else None),
-                    notes=f"Stock deducted for order {tracking_number}",
-                    order_id=order.id,
-                    order_product_id=op.id,
-                    variation_option_id=op.variation_option_id if op.item_type == OrderItemType.VARIABLE else None,
-                    unit_price=float(op.unit_price) if op.unit_price else None,
-                    sale_price=float(op.sale_price) if op.sale_price else None,
-                    subtotal=float(op.subtotal) if op.subtotal else None,
-                    discount=float(op.item_discount) if op.item_discount else None,
-                    tax=float(op.item_tax) if op.item_tax else None,
-                    total=float(op.subtotal) if op.subtotal else None
-                )
-
-        # Send notifications to shop owners and admins (always), and customer (if logged in)
-        customer_id = request.customer_id or (user["id"] if user else None)
-        # Get unique shop IDs from order products
-        shop_ids = list(set([op.shop_id for op in order_products if op.shop_id]))
-
-        NotificationHelper.notify_order_placed(
-            session=session,
-            order_id=order.id,
-            tracking_number=tracking_number,
-            customer_id=customer_id,  # Can be None for guest users
-            shop_ids=shop_ids,
-            total_amount=float(final_total)
-        )
-
         return api_response(
             201,
             "Order created successfully",
@@ -2021,41 +1616,20 @@ def update(id: int, request: OrderUpdate, session: GetSession, user: requireSign
         if status_field:
             update_order_status_history(session, order.id, status_field)
 
-    session.commit()
-    session.refresh(order)
-
-    # Create shop earnings if order is completed
-    create_shop_earning(session, order)
-    session.commit()  # Commit shop earnings
+    # Shop earnings once the order is completed
+    if order.order_status == OrderStatusEnum.COMPLETED and old_order_status != OrderStatusEnum.COMPLETED:
+        enqueue(session, "shop_earning", {"order_id": order.id})
 
-    # Send fulfillment assignment notification + email when fullfillment_id is newly assigned
+    # Fulfillment assignment notification + email when fullfillment_id is newly assigned
     new_fulfillment_id = request.fullfillment_id
     if new_fulfillment_id and new_fulfillment_id != old_fulfillment_id:
-        try:
-            fulfillment_user = session.get(User, new_fulfillment_id)
-            if fulfillment_user:
-                NotificationHelper.notify_order_assigned_to_fulfillment(
-                    session=session,
-                    order_id=order.id,
-                    tracking_number=order.tracking_number,
-                    customer_id=order.customer_id,
-                    fulfillment_user_id=new_fulfillment_id
-                )
-                send_email(
-                    to_email=fulfillment_user.email,
-                    email_template_id=7,  # Fulfillment assignment template
-                    replacements={
-                        "fulfillment_name": fulfillment_user.name,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "customer_name": order.customer_name,
-                        "order_total": f"Rs.{float(order.total):,.2f}" if order.total else "N/A",
-                        "order_status": order.order_status.value if order.order_status else "N/A",
-                    },
-                    session=session
-                )
-        except Exception as e:
-            Print(f"Failed to send fulfillment assignment notification/email: {e}")
+        enqueue(session, "order.fulfillment_assigned", {
+            "order_id": order.id,
+            "fulfillment_user_id": new_fulfillment_id,
+        })
+
+    session.commit()
+    session.refresh(order)
 
     return api_response(
         200, "Order Updated Successfully", OrderReadNested.model_validate(order)
@@ -2238,111 +1812,24 @@ def update_status(
     if request.payment_status:
         order.payment_status = request.payment_status
 
-    session.add(order)
-    session.commit()
-    session.refresh(order)
-
-    # Create shop earnings if order is completed
-    create_shop_earning(session, order)
-    session.commit()  # Commit shop earnings
-
-    # Send order status update email for OUT_FOR_DELIVERY and ORDER_DELIVER
+    # Shop earnings, status emails and cancellation notices go out through the outbox
+    if request.order_status == OrderStatusEnum.COMPLETED:
+        enqueue(session, "shop_earning", {"order_id": order.id})
     if request.order_status in [OrderStatusEnum.OUT_FOR_DELIVERY, OrderStatusEnum.ORDER_DELIVER]:
-        try:
-            customer_email = None
-            if order.customer_id:
-                customer = session.get(User, order.customer_id)
-                if customer:
-                    customer_email = customer.email
-
-            if customer_email or order.customer_contact:
-                send_email(
-                    to_email=customer_email or order.customer_contact,
-                    email_template_id=6,
-                    replacements={
-                        "customer_name": order.customer_name,
-                        "tracking_number": order.tracking_number,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "order_status": order.order_status,
-                        "payment_status": order.payment_status,
-                    },
-                    session=session
-                )
-        except Exception as e:
-            Print(f"Failed to send order status update email: {e}")
-
-    # Send cancellation/refund emails + notifications to customer, shop owners, and admin
+        enqueue(session, "order.status_changed", {
+            "order_id": order.id,
+            "order_status": request.order_status.value,
+        })
     if request.order_status in [OrderStatusEnum.CANCELLED, OrderStatusEnum.REFUNDED]:
-        try:
-            shop_ids = list(set([op.shop_id for op in order.order_products if op.shop_id]))
-            template_id = 8  # Order cancellation/refund template
-
-            # Email customer
-            customer_email = None
-            if order.customer_id:
-                customer = session.get(User, order.customer_id)
-                if customer:
-                    customer_email = customer.email
-            if customer_email or order.customer_contact:
-                send_email(
-                    to_email=customer_email or order.customer_contact,
-                    email_template_id=template_id,
-                    replacements={
-                        "customer_name": order.customer_name,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "order_status": order.order_status,
-                    },
-                    session=session
-                )
-
-            # Email shop owners
-            for shop_id in shop_ids:
-                shop = session.get(Shop, shop_id)
-                if shop:
-                    shop_owner = session.get(User, shop.owner_id)
-                    if shop_owner:
-                        send_email(
-                            to_email=shop_owner.email,
-                            email_template_id=template_id,
-                            replacements={
-                                "customer_name": order.customer_name,
-                                "order_number": order.tracking_number,
-                                "order_id": order.id,
-                                "shop_name": shop.name,
-                                "order_status": order.order_status,
-                            },
-                            session=session
-                        )
-
-            # Email + notify admins
-            admin_users = session.exec(select(User).where(User.is_root == True)).all()
-            for admin in admin_users:
-                send_email(
-                    to_email=admin.email,
-                    email_template_id=template_id,
-                    replacements={
-                        "customer_name": order.customer_name,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "order_status": order.order_status,
-                    },
-                    session=session
-                )
+        enqueue(session, "order.cancelled", {
+            "order_id": order.id,
+            "cancelled_by": "admin",
+            "order_status": request.order_status.value,
+        })
 
-            # Notifications to customer, shops, admins
-            if order.customer_id:
-                NotificationHelper.notify_order_cancelled(
-                    session=session,
-                    order_id=order.id,
-                    tracking_number=order.tracking_number,
-                    customer_id=order.customer_id,
-                    shop_ids=shop_ids,
-                    cancelled_by="admin"
-                )
-        except Exception as e:
-            Print(f"Failed to send cancellation/refund notifications: {e}")
+    session.add(order)
+    session.commit()
+    session.refresh(order)
 
     return api_response(
         200, "Order Status Updated Successfully", OrderRead.model_validate(order)
@@ -2350,7 +1837,18 @@ def update_status(
 
 
 @router.get("/read/{id}", response_model=OrderReadNested)
-def get(id: int, session: GetSession, user: requireSignin):
+def get(
+    id: int,
+    session: GetSession,
+    user: requireSignin,
+    fields: Optional[str] = Query(None, description="Example : id,tracking_number,order_status,total"),
+):
+    """
+    Order with its products and shops.
+
+    `fields=` only shapes the response: the nested order is still loaded and
+    built in full, then trimmed to the requested fields.
+    """
     order = session.get(Order, id)
     print(f"order:{order}")
     raiseExceptions((order, 404, "Order not found"))
@@ -2377,7 +1875,7 @@ def get(id: int, session: GetSession, user: requireSignin):
     # Add fulfillment user info if fullfillment_id > 0
     order_data = add_fulfillment_user_info(order_data, order, session)
 
-    return api_response(200, "Order Found", order_data)
+    return api_response(200, "Order Found", pick_fields(order_data, parse_fields(fields)))
 
 
 @router.get("/tracking/{tracking_number}", response_model=OrderReadNested)
@@ -2487,6 +1985,8 @@ def list_orders(
     skip: int = 0,
     limit: int = Query(200, ge=1, le=200),
     objectArrayFilters: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: send empty for the first page, then the returned next_cursor"),
+    count: Optional[str] = Query(None, pattern="^(exact|estimate|capped)$", description="totalCount mode: exact (default), estimate, or capped (\">1000\")"),
 ):
     parsed_cf, parsed_oaf, shop_id, fulfillment_filter = extract_custom_order_filters(
         columnFilters, objectArrayFilters, shop_id
@@ -2546,6 +2046,8 @@ def list_orders(
         limit=limit,
         sort=sort,
         Statement=stmt,
+        cursor=cursor,
+        count=count,
         join_options=[selectinload(Order.order_products)],
     )
 
@@ -2615,7 +2117,7 @@ def list_orders(
             Print(f"Error processing order {order.id if order else 'unknown'}: {str(e)}")
             continue
     
-    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"))
+    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"), next_cursor=result.get("next_cursor"), count_mode=result.get("countMode"))
 
 @router.get(
     "/my-orders",
@@ -2637,6 +2139,8 @@ def list_orders(
     skip: int = 0,
     limit: int = Query(200, ge=1, le=200),
     objectArrayFilters: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: send empty for the first page, then the returned next_cursor"),
+    count: Optional[str] = Query(None, pattern="^(exact|estimate|capped)$", description="totalCount mode: exact (default), estimate, or capped (\">1000\")"),
 ):
     parsed_cf, parsed_oaf, shop_id, fulfillment_filter = extract_custom_order_filters(
         columnFilters, objectArrayFilters, shop_id
@@ -2696,6 +2200,8 @@ def list_orders(
         limit=limit,
         sort=sort,
         Statement=stmt,
+        cursor=cursor,
+        count=count,
         join_options=[selectinload(Order.order_products)],
     )
 
@@ -2765,7 +2271,7 @@ def list_orders(
             Print(f"Error processing order {order.id if order else 'unknown'}: {str(e)}")
             continue
     
-    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"))
+    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"), next_cursor=result.get("next_cursor"), count_mode=result.get("countMode"))
 
 @router.get(
     "/listorder",
@@ -2787,6 +2293,8 @@ def list_all_orders(
     skip: int = 0,
     limit: int = Query(200, ge=1, le=200),
     objectArrayFilters: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: send empty for the first page, then the returned next_cursor"),
+    count: Optional[str] = Query(None, pattern="^(exact|estimate|capped)$", description="totalCount mode: exact (default), estimate, or capped (\">1000\")"),
 ):
    # customFilters = [["customer_id", user.get("id")]]
     print(f"user:{user}")
@@ -2847,6 +2355,8 @@ def list_all_orders(
         limit=limit,
         sort=sort,
         Statement=stmt,
+        cursor=cursor,
+        count=count,
         join_options=[selectinload(Order.order_products)],
     )
 
@@ -2914,7 +2424,7 @@ def list_all_orders(
 
         enhanced_orders.append(order_data)
 
-    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"))
+    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"), next_cursor=result.get("next_cursor"), count_mode=result.get("countMode"))
 
 @router.get(
     "/shoporders",
@@ -2936,6 +2446,8 @@ def list_all_orders(
     skip: int = 0,
     limit: int = Query(200, ge=1, le=200),
     objectArrayFilters: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: send empty for the first page, then the returned next_cursor"),
+    count: Optional[str] = Query(None, pattern="^(exact|estimate|capped)$", description="totalCount mode: exact (default), estimate, or capped (\">1000\")"),
 ):
     user_id = user.get("id")
     is_root = user.get("is_root", False)
@@ -3026,6 +2538,8 @@ def list_all_orders(
         limit=limit,
         sort=sort,
         Statement=stmt,
+        cursor=cursor,
+        count=count,
         otherFilters=order_id_filter if filter_order_ids else None,
         join_options=[selectinload(Order.order_products)],
     )
@@ -3090,7 +2604,7 @@ def list_all_orders(
 
         enhanced_orders.append(order_data)
 
-    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"))
+    return api_response(200, "Orders found", enhanced_orders, result["total"], result.get("totalCount"), next_cursor=result.get("next_cursor"), count_mode=result.get("countMode"))
 
 
 @router.get("/customer/{customer_id}", response_model=list[OrderReadNested])
@@ -4016,104 +3530,19 @@ def cancel_order(
         # 5. Update shop earnings if order was completed (reverse earnings)
         reverse_shop_earnings(session, order)
 
+        # 6. Logs, notifications and emails go out through the outbox
+        enqueue(session, "order.cancelled", {
+            "order_id": order.id,
+            "cancelled_by": "admin" if is_admin else "customer",
+            "user_id": user_id,
+            "reason": request.reason if request else None,
+            "log_stock": True,
+        })
+
         session.add(order)
         session.commit()
         session.refresh(order)
 
-        # 6. Log order cancellation transaction
-        logger = TransactionLogger(session)
-        for order_product in order.order_products:
-            product = session.get(Product, order_product.product_id)
-            if product:
-                logger.log_order_cancelled(
-                    order_id=order.id,
-                    product_id=order_product.product_id,
-                    quantity=int(float(order_product.order_quantity)),
-                    unit_price=order_product.unit_price,
-                    sale_price=order_product.sale_price,
-                    user_id=user_id,
-                    shop_id=order_product.shop_id,
-                    notes=f"Order {order.tracking_number} cancelled - stock restored"
-                )
-
-        # 7. Send cancellation notifications + emails
-        shop_ids = list(set([op.shop_id for op in order.order_products if op.shop_id]))
-        cancelled_by = "admin" if is_admin else "customer"
-
-        if order.customer_id:
-            NotificationHelper.notify_order_cancelled(
-                session=session,
-                order_id=order.id,
-                tracking_number=order.tracking_number,
-                customer_id=order.customer_id,
-                shop_ids=shop_ids,
-                cancelled_by=cancelled_by
-            )
-
-        try:
-            # Email customer
-            customer_email = None
-            if order.customer_id:
-                customer = session.get(User, order.customer_id)
-                if customer:
-                    customer_email = customer.email
-            cancel_reason = (request.reason if request and request.reason else "Not specified")
-            cancel_amount = f"Rs.{float(order.paid_total):,.2f}" if order.paid_total else "N/A"
-            if customer_email or order.customer_contact:
-                send_email(
-                    to_email=customer_email or order.customer_contact,
-                    email_template_id=8,  # Order cancellation template
-                    replacements={
-                        "customer_name": order.customer_name,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "cancelled_by": cancelled_by,
-                        "reason": cancel_reason,
-                        "paid_total": f"Rs.{float(cancel_amount):,.2f}" if cancel_amount else "N/A",
-                    },
-                    session=session
-                )
-
-            # Email shop owners
-            for shop_id in shop_ids:
-                shop = session.get(Shop, shop_id)
-                if shop:
-                    shop_owner = session.get(User, shop.owner_id)
-                    if shop_owner:
-                        send_email(
-                            to_email=shop_owner.email,
-                            email_template_id=8,
-                            replacements={
-                                "customer_name": order.customer_name,
-                                "order_number": order.tracking_number,
-                                "order_id": order.id,
-                                "shop_name": shop.name,
-                                "cancelled_by": cancelled_by,
-                                "reason": cancel_reason,
-                                "paid_total": f"Rs.{float(cancel_amount):,.2f}" if cancel_amount else "N/A",
-                            },
-                            session=session
-                        )
-
-            # Email admins
-            admin_users = session.exec(select(User).where(User.is_root == True)).all()
-            for admin in admin_users:
-                send_email(
-                    to_email=admin.email,
-                    email_template_id=8,
-                    replacements={
-                        "customer_name": order.customer_name,
-                        "order_number": order.tracking_number,
-                        "order_id": order.id,
-                        "cancelled_by": cancelled_by,
-                        "reason": cancel_reason,
-                        "paid_total": f"Rs.{float(cancel_amount):,.2f}" if cancel_amount else "N/A",
-                    },
-                    session=session
-                )
-        except Exception as e:
-            Print(f"Failed to send cancellation emails: {e}")
-
         Print(f"✅ Order {order_id} cancelled successfully")
         
         return OrderCancelResponse(
@@ -4137,67 +3566,21 @@ def cancel_order(
 def return_products_to_stock(session: GetSession, order: Order) -> bool:
     """Return all products in order back to stock"""
     Print(f"📦 Restoring inventory for {len(order.order_products)} products")
-    
-    products_restocked = False
-    
-    for order_product in order.order_products:
-        try:
-            quantity = float(order_product.order_quantity)
-            Print(f"  🔄 Processing product {order_product.product_id}, quantity: {quantity}")
-            
-            if order_product.item_type == OrderItemType.SIMPLE:
-                # Handle simple product
-                product = session.get(Product, order_product.product_id)
-                if product:
-                    product.quantity += quantity
-                    
-                    # Update sales tracking
-                    product.total_sold_quantity = max(0, product.total_sold_quantity - quantity)
-                    
-                    if product.quantity > 0:
-                        product.in_stock = True
-                    
-                    session.add(product)
-                    Print(f"    ✅ Restored {quantity} units to simple product {product.name}")
-                    products_restocked = True
-            
-            elif order_product.item_type == OrderItemType.VARIABLE and order_product.variation_option_id:
-                # Handle variable product
-                variation = session.get(VariationOption, order_product.variation_option_id)
-                if variation:
-                    # Restore variation stock
-                    variation.quantity += quantity
-                    
-                    # Update parent product quantity and sales tracking
-                    product = session.get(Product, order_product.product_id)
-                    if product:
-                        product.total_sold_quantity = max(0, product.total_sold_quantity - quantity)
-                        
-                        # Recalculate total quantity from variations
-                        total_variation_quantity = session.scalar(
-                            select(func.sum(VariationOption.quantity)).where(
-                                VariationOption.product_id == order_product.product_id
-                            )
-                        ) or 0
-                        
-                        product.quantity = total_variation_quantity
-                        session.add(product)
-                    
-                    if variation.quantity > 0:
-                        variation.is_active = True
-                    
-                    session.add(variation)
-                    Print(f"    ✅ Restored {quantity} units to variation {variation.title}")
-                    products_restocked = True
-                    
-        except (ValueError, TypeError) as e:
-            Print(f"    ❌ Error processing product {order_product.product_id}: {str(e)}")
-            continue
-        except Exception as e:
-            Print(f"    ❌ Unexpected error with product {order_product.product_id}: {str(e)}")
-            continue
-    
-    return products_restocked
+
+    lines = [
+        stock_line(order_product)
+        for order_product in order.order_products
+        if not (order_product.item_type == OrderItemType.VARIABLE and not order_product.variation_option_id)
+    ]
+    if not lines:
+        return False
+
+    # ✅ Same SQL path as checkout: also drops the product cache and stock feeds
+    invalid = release_stock(session, lines)
+    for shortfall in invalid:
+        Print(f"    ❌ Error processing product {shortfall['product_id']}: {shortfall['message']}")
+
+    return len(invalid) < len(lines)
 
 def reverse_shop_earnings(session: GetSession, order: Order):
     """Reverse shop earnings if order was completed before cancellation"""
@@ -4266,6 +3649,15 @@ def admin_cancel_order(
         
         # Reverse shop earnings
         reverse_shop_earnings(session, order)
+
+        # Logs, notifications and emails go out through the outbox
+        enqueue(session, "order.cancelled", {
+            "order_id": order.id,
+            "cancelled_by": "admin",
+            "user_id": user_id,
+            "reason": request.reason,
+            "log_stock": True,
+        })
         
         session.add(order)
         session.commit()
@@ -4324,69 +3716,6 @@ def get_order_cancellation_eligibility(order: Order, user_data: Optional[Dict])
         "current_user_id": user_id
     }
 
-def create_shop_earning(session, order: Order):
-    """Create shop earning records when order is completed - UPDATED for multi-shop orders"""
-    print(f"ordre:{order.order_status}")
-    print(f"ordre:{OrderStatusEnum.COMPLETED}")
-
-    # Only create earnings for completed orders
-    if order.order_status != OrderStatusEnum.COMPLETED:
-        return
-
-    # Check if earnings already exist for this order (prevent duplicates)
-    existing_earnings = session.exec(
-        select(ShopEarning).where(ShopEarning.order_id == order.id)
-    ).first()
-
-    if existing_earnings:
-        print(f"⚠️ Shop earnings already exist for order {order.id}, skipping creation")
-        return
-
-    # Get all order products for this order
-    order_products = session.exec(
-        select(OrderProduct).where(OrderProduct.order_id == order.id)
-    ).scalars().all()
-    print(f"order_products:{order_products}")
-
-    if not order_products:
-        print(f"⚠️ No order products found for order {order.id}")
-        return
-
-    for order_product in order_products:
-        if not order_product.shop_id:
-            continue
-
-        # Calculate shop earning for this specific product
-        # (subtotal - admin_commission - proportional delivery fee)
-        delivery_fee_per_product = Decimal("0.00")
-        if order.delivery_fee and len(order_products) > 0:
-            # Distribute delivery fee proportionally based on subtotal
-            total_subtotal = sum(op.subtotal for op in order_products)
-            if total_subtotal > 0:
-                delivery_fee_per_product = Decimal(str(order.delivery_fee)) * (
-                    Decimal(str(order_product.subtotal)) / Decimal(str(total_subtotal))
-                )
-        print(f"delivery_fee_per_product:{delivery_fee_per_product}")
-        shop_earning = (
-            Decimal(str(order_product.subtotal))
-            - order_product.admin_commission
-            - delivery_fee_per_product
-        )
-        print(f"shop_earning:{shop_earning}")
-        # Create shop earning record for this shop and product
-        earning = ShopEarning(
-            shop_id=order_product.shop_id,
-            order_id=order.id,
-            order_product_id=order_product.id,  # Link to specific order product
-            order_amount=Decimal(str(order_product.subtotal)),
-            admin_commission=order_product.admin_commission,
-            delivery_fee_per_product=delivery_fee_per_product,
-            shop_earning=shop_earning,
-        )
-        print(f"earning:{earning}")
-        session.add(earning)
-
-
 # ==========================================
 # NEW: Role-based Order Statistics & Lists
 # ==========================================
@@ -4,7 +4,8 @@ from typing import Optional
 from decimal import Decimal
 
 from src.api.core.response import api_response
-from src.api.core.dependencies import GetSession, requireSignin, isAuthenticated
+from src.api.core.dependencies import GetSession, IdempotencyKeyHeader, requireSignin, isAuthenticated
+from src.api.core.idempotency import request_fingerprint, run_idempotent
 from src.api.core.payment.payment_helper import PaymentHelper
 from src.api.core.payment.gateway_factory import PaymentGatewayFactory
 from src.api.models.order_model.orderModel import Order
@@ -47,13 +48,24 @@ def initiate_payment(
     session: GetSession = None,
     request: Request = None,
     user: isAuthenticated = None,
+    idempotency_key: IdempotencyKeyHeader = None,
 ):
     """
     Initiate payment for an order.
 
     For redirect-based gateways: Returns redirect URL
     For API-based gateways: Returns payment data
+    Retries with the same Idempotency-Key reuse the first gateway session.
     """
+    return run_idempotent(
+        idempotency_key,
+        scope=f"payment:initiate:{order_id}:{user.get('id') if user else 'guest'}",
+        fingerprint=request_fingerprint(order_id, gateway_name),
+        handler=lambda: _initiate_payment(order_id, gateway_name, session, request, user),
+    )
+
+
+def _initiate_payment(order_id: int, gateway_name: str, session, request: Optional[Request], user: Optional[dict]):
     # Get order
     order = session.get(Order, order_id)
     if not order:
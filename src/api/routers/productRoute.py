@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Query, HTTPException
-from sqlalchemy import select, func, and_, or_, cast, Float, exists
+from sqlalchemy import select, or_
 from typing import List, Dict, Optional
 from sqlmodel import select
 from src.api.models.category_model.categoryModel import Category
@@ -12,6 +12,24 @@ from src.api.core.middleware import handle_async_wrapper
 from src.api.core.utility import uniqueSlugify, now_pk
 from datetime import timedelta
 from src.api.core.operation import listRecords, updateOp
+from src.api.core.category_closure import descendant_ids_subquery
+from src.api.core.product_facets import parse_price_buckets, product_facets
+from src.api.core.product_query import ProductQuery
+from src.api.core.operation.fieldsets import parse_fields, pick_fields
+from src.api.core.product_cache import cache_product, get_cached_product, invalidate_product
+from src.api.core.variation_aggregates import refresh_variation_aggregates
+from fastapi.encoders import jsonable_encoder
+from src.api.core.storefront_feeds import (
+    BEST_SELLERS,
+    LIMITED_EDITION,
+    NEW_ARRIVALS,
+    PRICE_FEEDS,
+    SALES,
+    STOCK_FEEDS,
+    TRENDING,
+    get_feed_page,
+    mark_feeds_stale,
+)
 from src.api.core.response import api_response, raiseExceptions
 from src.api.utils.video_processor import VideoProcessor
 from src.api.models.product_model.productsModel import (
@@ -34,7 +52,7 @@ from src.api.core.dependencies import (
     requireSignin,
 )
 from src.api.core.sku_generator import generate_unique_sku, generate_sku_for_variation
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, selectinload
 from src.api.core.transaction_logger import TransactionLogger
 
 router = APIRouter(prefix="/product", tags=["Product"])
@@ -87,77 +105,34 @@ class RemoveQtyRequest(BaseModel):
         return v
 
 
-def apply_number_range_filter(query, query_params_dict, Model):
-    """Helper function to apply numberRange filter to a query"""
-    if query_params_dict.get('numberRange'):
-        try:
-            import json
-            import ast
-            number_range = query_params_dict['numberRange']
-            try:
-                parsed = json.loads(number_range)
-            except json.JSONDecodeError:
-                parsed = ast.literal_eval(number_range)
-
-            column_name = parsed[0]
-            min_val = float(parsed[1]) if len(parsed) > 1 and parsed[1] is not None else None
-            max_val = float(parsed[2]) if len(parsed) > 2 and parsed[2] is not None else None
-
-            if hasattr(Model, column_name):
-                column = getattr(Model, column_name)
-                if min_val is not None and max_val is not None:
-                    query = query.where(column.between(min_val, max_val))
-                elif min_val is not None:
-                    query = query.where(column >= min_val)
-                elif max_val is not None:
-                    query = query.where(column <= max_val)
-        except Exception as e:
-            print(f"Error parsing numberRange: {e}")
-    return query
-
-
-def apply_sort_filter(query, query_params_dict, Model, default_sort_field=None, default_sort_order="desc"):
-    """Helper function to apply sort filter to a query"""
-    if query_params_dict.get('sort'):
-        try:
-            import json
-            import ast
-            sort_param = query_params_dict['sort']
-            try:
-                parsed = json.loads(sort_param)
-            except json.JSONDecodeError:
-                parsed = ast.literal_eval(sort_param)
+# Query params that turn a storefront request into an ad-hoc (live) query
+FEED_BYPASS_PARAMS = (
+    'searchTerm', 'columnFilters', 'numberRange', 'dateRange', 'sort',
+    'stringArrayFilters', 'objectArrayFilters', 'customFilters', 'cursor',
+)
 
-            column_name, direction = parsed[0], parsed[1]
 
-            if hasattr(Model, column_name):
-                column = getattr(Model, column_name)
-                if direction.lower() == "asc":
-                    query = query.order_by(column.asc())
-                else:
-                    query = query.order_by(column.desc())
-        except Exception as e:
-            print(f"Error parsing sort: {e}")
-            # Apply default sort if parsing fails
-            if default_sort_field and hasattr(Model, default_sort_field):
-                column = getattr(Model, default_sort_field)
-                if default_sort_order.lower() == "asc":
-                    query = query.order_by(column.asc())
-                else:
-                    query = query.order_by(column.desc())
-    elif default_sort_field and hasattr(Model, default_sort_field):
-        # Apply default sort if no sort param provided
-        column = getattr(Model, default_sort_field)
-        if default_sort_order.lower() == "asc":
-            query = query.order_by(column.asc())
-        else:
-            query = query.order_by(column.desc())
+def storefront_feed_page(session, feed, query_params_dict, skip, limit, shop_id=None,
+                         param=None, is_active=True, extra_filters=()):
+    """Page of product ids from a precomputed feed, or None when the live query is needed"""
+    if is_active is not True:
+        return None
+    if any(query_params_dict.get(key) for key in FEED_BYPASS_PARAMS):
+        return None
+    if any(value is not None for value in extra_filters):
+        return None
+    return get_feed_page(session, feed, skip, limit, shop_id=shop_id, param=param)
 
-    # Add secondary sort by id for deterministic pagination
-    if hasattr(Model, 'id'):
-        query = query.order_by(Model.id.asc())
 
-    return query
+def load_products_in_order(session, product_ids):
+    """Load products with one IN query, keeping the order of product_ids"""
+    if not product_ids:
+        return []
+    by_id = {
+        product.id: product
+        for product in session.exec(select(Product).where(Product.id.in_(product_ids))).all()
+    }
+    return [by_id[pid] for pid in product_ids if pid in by_id]
 
 
 def get_unique_enhanced_products(session, products, return_dict=False):
@@ -173,27 +148,9 @@ def get_unique_enhanced_products(session, products, return_dict=False):
     Returns:
         List of unique enhanced products (either as ProductRead objects or dicts)
     """
-    seen_ids = set()
-    enhanced_products = []
-
-    for product in products:
-        # Get product ID (handle both Product objects and raw IDs)
-        product_id = product.id if hasattr(product, 'id') else product
-
-        # Skip if we've already seen this product
-        if product_id in seen_ids:
-            continue
-
-        seen_ids.add(product_id)
-
-        # Get enhanced product data
-        enhanced_product = get_product_with_enhanced_data(session, product_id)
-        if enhanced_product:
-            if return_dict:
-                enhanced_products.append(enhanced_product.model_dump())
-            else:
-                enhanced_products.append(enhanced_product)
-
+    enhanced_products = get_products_with_enhanced_data(session, products)
+    if return_dict:
+        return [product.model_dump() for product in enhanced_products]
     return enhanced_products
 
 
@@ -259,92 +216,85 @@ def update_variations_for_product(
     return create_variations_for_product(session, product_id, variations_data, base_sku)
 
 
-# def get_product_with_enhanced_data(session, product_id: int):
-#     """Get product with enhanced data for variable products"""
-#     product = session.get(Product, product_id)
-#     if not product:
-#         return None
+def get_products_with_enhanced_data(session, products) -> List[ProductRead]:
+    """
+    Enhanced data for a whole page of products in a fixed number of queries.
 
-#     # Calculate total quantity for variable products
-#     total_quantity = product.quantity
-#     variations_data = []
+    Accepts Product objects and/or product IDs, keeps the first occurrence of
+    each id in the original order. The products and every relationship
+    ProductRead serializes (category, shop, manufacturer, variation options)
+    are loaded with one IN query each, also for products that were passed in
+    already loaded, so building ProductRead never lazy-loads.
+    """
+    ordered_ids = []
+    seen_ids = set()
+    for product in products:
+        product_id = product.id if hasattr(product, 'id') else product
+        if product_id is None or product_id in seen_ids:
+            continue
+        seen_ids.add(product_id)
+        ordered_ids.append(product_id)
 
-#     if product.product_type == ProductType.VARIABLE:
-#         variations = session.exec(
-#             select(VariationOption).where(VariationOption.product_id == product_id)
-#         ).all()
+    loaded = {}
+    if ordered_ids:
+        for product in session.execute(
+            select(Product)
+            .options(
+                selectinload(Product.category),
+                selectinload(Product.shop),
+                selectinload(Product.manufacturer),
+                selectinload(Product.variation_options),
+            )
+            .where(Product.id.in_(ordered_ids))
+        ).scalars().all():
+            loaded[product.id] = product
 
-#         # Recalculate total quantity from variations
-#         variation_total_quantity = 0
-#         for variation in variations:
-#             variation_total_quantity += variation.quantity
-#             variations_data.append(variation)
+    enhanced_products = []
+    for product_id in ordered_ids:
+        product = loaded.get(product_id)
+        if not product:
+            continue
 
-#         # Update total quantity
-#         total_quantity = variation_total_quantity
+        # Variable products: quantity and count are the maintained variation aggregates
+        total_quantity = product.quantity
+        variations_count = 0
+        if product.product_type == ProductType.VARIABLE:
+            total_quantity = product.variation_quantity
+            variations_count = product.variation_count
 
-#     # Calculate current stock value
-#     current_stock_value = None
-#     if product.purchase_price and product.quantity:
-#         current_stock_value = product.purchase_price * product.quantity
+        # Calculate current stock value
+        current_stock_value = None
+        if product.purchase_price and product.quantity:
+            current_stock_value = product.purchase_price * product.quantity
 
-#     # Convert to ProductRead with enhanced data
-#     product_data = ProductRead.model_validate(product)
+        # Convert to ProductRead with enhanced data
+        product_data = ProductRead.model_validate(product)
+        product_data.total_quantity = total_quantity
+        product_data.variations_count = variations_count
+        product_data.current_stock_value = current_stock_value
+        enhanced_products.append(product_data)
 
-#     # Add enhanced data
-#     if hasattr(product_data, "variations"):
-#         product_data.variations = variations_data
+    return enhanced_products
 
-#     # Update quantities based on product type
-#     if product.product_type == ProductType.VARIABLE:
-#         product_data.total_quantity = total_quantity
-#         product_data.quantity = total_quantity
 
-#     # Add stock value
-#     product_data.current_stock_value = current_stock_value
+def sale_variation_discounts(enhanced_product: ProductRead) -> List[float]:
+    """Discount % of each variation on sale, from the already loaded variation_options."""
+    discounts = []
+    for variation in enhanced_product.variation_options or []:
+        try:
+            price_val = float(variation.price)
+            sale_val = float(variation.sale_price) if variation.sale_price else 0
+        except (ValueError, TypeError):
+            continue
+        if 0 < sale_val < price_val:
+            discounts.append(((price_val - sale_val) / price_val) * 100)
+    return discounts
 
-#     return product_data
 
 def get_product_with_enhanced_data(session, product_id: int):
     """Get product with enhanced data for variable products"""
-    product = session.get(Product, product_id)
-    if not product:
-        return None
-
-    # Calculate total quantity for variable products
-    total_quantity = product.quantity
-    variations_data = []
-    variations_count = 0
-
-    if product.product_type == ProductType.VARIABLE:
-        variations = session.exec(
-            select(VariationOption).where(VariationOption.product_id == product_id)
-        ).all()
-
-        # Recalculate total quantity from variations
-        variation_total_quantity = 0
-        for variation in variations:
-            variation_total_quantity += variation.quantity
-            variations_data.append(variation)
-
-        # Update total quantity and count
-        total_quantity = variation_total_quantity
-        variations_count = len(variations)
-
-    # Calculate current stock value
-    current_stock_value = None
-    if product.purchase_price and product.quantity:
-        current_stock_value = product.purchase_price * product.quantity
-
-    # Convert to ProductRead with enhanced data
-    product_data = ProductRead.model_validate(product)
-    
-    # Set the calculated values
-    product_data.total_quantity = total_quantity
-    product_data.variations_count = variations_count
-    product_data.current_stock_value = current_stock_value
-
-    return product_data
+    enhanced = get_products_with_enhanced_data(session, [product_id])
+    return enhanced[0] if enhanced else None
 
 # ✅ CREATE
 @router.post("/create")
@@ -416,6 +366,8 @@ def create(
     # Create variations for variable products
     if request.product_type == ProductType.VARIABLE and request.variations:
         create_variations_for_product(session, data.id, request.variations, data.sku)
+    invalidate_product(data.id)
+    mark_feeds_stale()
 
     # Return enhanced product data
     enhanced_product = get_product_with_enhanced_data(session, data.id)
@@ -473,17 +425,13 @@ def update(
 
     # Update variations for variable products
     if request.product_type == ProductType.VARIABLE and request.variations:
+        # Total quantity and price range follow through the variation aggregates
         update_variations_for_product(session, data.id, request.variations, data.sku)
-        # Update total quantity after variations are created
-        variations = session.exec(
-            select(VariationOption).where(VariationOption.product_id == data.id)
-        ).all()
-        total_variation_quantity = sum(var.quantity for var in variations)
-        data.quantity = total_variation_quantity
-        session.add(data)
 
     session.commit()
     session.refresh(data)
+    invalidate_product(data.id)
+    mark_feeds_stale()
 
     # Return enhanced product data
     enhanced_product = get_product_with_enhanced_data(session, data.id)
@@ -494,7 +442,22 @@ def update(
     "/read/{id_slug}",
     description="Product ID (int) or slug (str)",
 )
-def get(id_slug: str, session: GetSession):
+def get(
+    id_slug: str,
+    session: GetSession,
+    fields: Optional[str] = Query(None, description="Example : id,name,price,image"),
+):
+    """
+    Product by id or slug.
+
+    `fields=` only shapes the response: the full enhanced product is still
+    loaded and cached (one cache entry serves every fieldset), then trimmed.
+    """
+    # Serve from the product cache (invalidated by every product write path)
+    cached = get_cached_product(id_slug)
+    if cached is not None:
+        return api_response(200, "Product Found", pick_fields(cached, parse_fields(fields)))
+
     # Check if it's an integer ID
     if id_slug.isdigit():
         product_id = int(id_slug)
@@ -508,9 +471,14 @@ def get(id_slug: str, session: GetSession):
 
     raiseExceptions((product, 404, "Product not found"))
 
-    # Return enhanced product data
+    # Return enhanced product data (trimmed to ?fields= when given)
     enhanced_product = get_product_with_enhanced_data(session, product_id)
-    return api_response(200, "Product Found", enhanced_product)
+    if enhanced_product:
+        enhanced_product = jsonable_encoder(enhanced_product)
+        cache_product(enhanced_product)
+    return api_response(
+        200, "Product Found", pick_fields(enhanced_product, parse_fields(fields))
+    )
 
 
 # ✅ DELETE
@@ -533,34 +501,21 @@ def delete(
 
     session.delete(product)
     session.commit()
+    invalidate_product(id)
+    mark_feeds_stale()
     return api_response(200, f"Product {product.name} deleted")
 
 
-@router.get("/list", response_model=list[ProductRead])
-def list(
-    query_params: ListQueryParams,
-    session: GetSession,
-    is_active: Optional[bool] = Query(None, description="Filter by active status"),
-    is_feature: Optional[bool] = Query(None, description="Filter by feature status"),
-    qty_eq: Optional[int] = Query(None, description="Filter by exact quantity"),
-    qty_lt: Optional[int] = Query(None, description="Filter by quantity less than"),
-    qty_gt: Optional[int] = Query(None, description="Filter by quantity greater than"),
-    category_is_active: Optional[bool] = Query(None, description="Filter by category active status"),
-    manufacturer_is_active: Optional[bool] = Query(None, description="Filter by manufacturer active status"),
-    manufacturer_is_approved: Optional[bool] = Query(None, description="Filter by manufacturer approved status"),
-    shop_s_active: Optional[bool] = Query(None, description="Filter by shop active status"),
+def product_list_filter(
+    qty_eq: Optional[int] = None,
+    qty_lt: Optional[int] = None,
+    qty_gt: Optional[int] = None,
+    category_is_active: Optional[bool] = None,
+    manufacturer_is_active: Optional[bool] = None,
+    manufacturer_is_approved: Optional[bool] = None,
+    shop_s_active: Optional[bool] = None,
 ):
-    query_params = vars(query_params)
-    searchFields = ["name", "description", "category.name"]
-
-    # Add filters to customFilters if provided
-    custom_filters = []
-    if is_active is not None:
-        custom_filters.append(["is_active", is_active])
-    if is_feature is not None:
-        custom_filters.append(["is_feature", is_feature])
-    if custom_filters:
-        query_params["customFilters"] = custom_filters
+    """otherFilters hook shared by /list and /facets."""
 
     # Filter out soft-deleted products and products from inactive shops
     def active_shop_filter(statement, Model):
@@ -593,15 +548,111 @@ def list(
             )
         return statement
 
+    return active_shop_filter
+
+
+@router.get("/list", response_model=list[ProductRead])
+def list(
+    query_params: ListQueryParams,
+    session: GetSession,
+    is_active: Optional[bool] = Query(None, description="Filter by active status"),
+    is_feature: Optional[bool] = Query(None, description="Filter by feature status"),
+    qty_eq: Optional[int] = Query(None, description="Filter by exact quantity"),
+    qty_lt: Optional[int] = Query(None, description="Filter by quantity less than"),
+    qty_gt: Optional[int] = Query(None, description="Filter by quantity greater than"),
+    category_is_active: Optional[bool] = Query(None, description="Filter by category active status"),
+    manufacturer_is_active: Optional[bool] = Query(None, description="Filter by manufacturer active status"),
+    manufacturer_is_approved: Optional[bool] = Query(None, description="Filter by manufacturer approved status"),
+    shop_s_active: Optional[bool] = Query(None, description="Filter by shop active status"),
+):
+    query_params = vars(query_params)
+    searchFields = ["name", "description", "category.name"]
+
+    # Add filters to customFilters if provided
+    custom_filters = []
+    if is_active is not None:
+        custom_filters.append(["is_active", is_active])
+    if is_feature is not None:
+        custom_filters.append(["is_feature", is_feature])
+    if custom_filters:
+        query_params["customFilters"] = custom_filters
+
     return listRecords(
         query_params=query_params,
         searchFields=searchFields,
         Model=Product,
         Schema=ProductRead,
-        otherFilters=active_shop_filter,
+        otherFilters=product_list_filter(
+            qty_eq,
+            qty_lt,
+            qty_gt,
+            category_is_active,
+            manufacturer_is_active,
+            manufacturer_is_approved,
+            shop_s_active,
+        ),
     )
 
 
+# ✅ FACETS (same filters as /list, counts instead of rows)
+@router.get("/facets")
+def facets(
+    query_params: ListQueryParams,
+    session: GetSession,
+    is_active: Optional[bool] = Query(None, description="Filter by active status"),
+    is_feature: Optional[bool] = Query(None, description="Filter by feature status"),
+    qty_eq: Optional[int] = Query(None, description="Filter by exact quantity"),
+    qty_lt: Optional[int] = Query(None, description="Filter by quantity less than"),
+    qty_gt: Optional[int] = Query(None, description="Filter by quantity greater than"),
+    category_is_active: Optional[bool] = Query(None, description="Filter by category active status"),
+    manufacturer_is_active: Optional[bool] = Query(None, description="Filter by manufacturer active status"),
+    manufacturer_is_approved: Optional[bool] = Query(None, description="Filter by manufacturer approved status"),
+    shop_s_active: Optional[bool] = Query(None, description="Filter by shop active status"),
+    price_buckets: Optional[str] = Query(
+        None, description="Comma-separated price bucket bounds, e.g. 0,500,1000,5000"
+    ),
+):
+    """
+    Counts per category, manufacturer, shop, price bucket, stock state and
+    attribute value for the products matching the /list filters.
+    """
+    query_params = vars(query_params)
+    searchFields = ["name", "description", "category.name"]
+
+    custom_filters = []
+    if is_active is not None:
+        custom_filters.append(["is_active", is_active])
+    if is_feature is not None:
+        custom_filters.append(["is_feature", is_feature])
+
+    filters = {
+        "searchTerm": query_params.get("searchTerm"),
+        "columnFilters": query_params.get("columnFilters"),
+        "dateRange": query_params.get("dateRange"),
+        "numberRange": query_params.get("numberRange"),
+        "customFilters": custom_filters or None,
+        "stringArrayFilters": query_params.get("stringArrayFilters"),
+        "objectArrayFilters": query_params.get("objectArrayFilters"),
+    }
+
+    data = product_facets(
+        session,
+        filters,
+        searchFields,
+        otherFilters=product_list_filter(
+            qty_eq,
+            qty_lt,
+            qty_gt,
+            category_is_active,
+            manufacturer_is_active,
+            manufacturer_is_approved,
+            shop_s_active,
+        ),
+        price_buckets=parse_price_buckets(price_buckets),
+    )
+    return api_response(200, "Product facets found", data, data["total"])
+
+
 @router.get("/my-products")
 def my_products(
     query_params: ListQueryParams,
@@ -660,20 +711,8 @@ def get_products_by_category(
     if not category:
         return api_response(404, f"Category with id {category_id} not found", [], 0)
 
-    # Get all descendant category IDs in a single query (max 3 levels)
-    # Level 1: direct children, Level 2: grandchildren
-    descendants = session.exec(
-        select(Category.id).where(
-            or_(
-                Category.parent_id == category_id,  # Direct children
-                Category.parent_id.in_(
-                    select(Category.id).where(Category.parent_id == category_id)
-                )  # Grandchildren
-            )
-        )
-    ).all()
-
-    category_ids = [category_id] + [d for d in descendants]
+    # Category and all its descendants (any depth) from the closure table
+    category_ids = descendant_ids_subquery(category_id)
 
     # Convert query_params to dict
     query_params = vars(query_params)
@@ -737,6 +776,8 @@ def patch_product_status(
     session.add(updated)
     session.commit()
     session.refresh(updated)
+    invalidate_product(id)
+    mark_feeds_stale()
 
     # Return enhanced product data
     enhanced_product = get_product_with_enhanced_data(session, id)
@@ -782,14 +823,12 @@ def sync_variable_product_quantity(id: int, session: GetSession):
     if product.product_type != ProductType.VARIABLE:
         return api_response(400, "Product is not a variable product")
 
-    variations = session.exec(
-        select(VariationOption).where(VariationOption.product_id == id)
-    ).all()
-
-    total_quantity = sum(var.quantity for var in variations)
-    product.quantity = total_quantity
-    session.add(product)
+    previous_quantity = product.quantity
+    # ✅ Rebuilds every variation aggregate, not only quantity
+    aggregates = refresh_variation_aggregates(session, [id])[id]
     session.commit()
+    invalidate_product(id)
+    mark_feeds_stale(*STOCK_FEEDS)
 
     return api_response(
         200,
@@ -797,9 +836,9 @@ def sync_variable_product_quantity(id: int, session: GetSession):
         {
             "product_id": product.id,
             "product_name": product.name,
-            "previous_quantity": product.quantity,
-            "new_quantity": total_quantity,
-            "variations_count": len(variations),
+            "previous_quantity": previous_quantity,
+            "new_quantity": aggregates["quantity"],
+            "variations_count": aggregates["variation_count"],
         },
     )
 
@@ -825,87 +864,43 @@ def get_trending_products(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, TRENDING, query_params_dict, skip, limit,
+            shop_id=shop_id, param=days, is_active=is_active,
+            extra_filters=(category_is_active, manufacturer_is_active, manufacturer_is_approved),
+        )
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            enhanced_products = get_unique_enhanced_products(session, feed_ids)
+            if not enhanced_products:
+                return api_response(404, "No trending products found", [], 0)
+            return api_response(
+                200,
+                f"Found {len(enhanced_products)} trending products",
+                enhanced_products,
+                feed_total
+            )
+
         # Calculate date threshold
         threshold_date = now_pk() - timedelta(days=days)
 
         # Query products with highest sales in recent period
         # Using total_sold_quantity as a proxy for trending
-        query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.total_sold_quantity > 0,
-                    Product.created_at >= threshold_date
-                )
+        products, _ = (
+            ProductQuery(
+                Product.total_sold_quantity > 0,
+                Product.created_at >= threshold_date,
             )
+            .storefront(is_active, shop_id)
+            .list_params(query_params_dict)
+            .related_active(category_is_active, manufacturer_is_active, manufacturer_is_approved)
+            .sort(query_params_dict.get('sort'), "total_sold_quantity", "desc")
+            .page(session, skip, limit, with_count=False)
         )
 
-        # Add shop filter
-        if shop_id:
-            query = query.where(Product.shop_id == shop_id)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
-
-        # Apply numberRange filter
-        query = apply_number_range_filter(query, query_params_dict, Product)
-
-        # Apply category/manufacturer filters
-        if category_is_active is not None:
-            active_cat_ids = select(Category.id).where(Category.is_active == category_is_active)
-            query = query.where(Product.category_id.in_(active_cat_ids))
-        if manufacturer_is_active is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_active == manufacturer_is_active)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-        if manufacturer_is_approved is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_approved == manufacturer_is_approved)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-
-        # Apply sort filter
-        query = apply_sort_filter(query, query_params_dict, Product, "total_sold_quantity", "desc")
-
-        query = (
-            query
-            .offset(skip)
-            .limit(limit)
-        )
-
-        products = distinct_products(session.exec(query).all())
-
-        # Remove duplicates by product id
-        seen_ids = set()
-        enhanced_products = []
-        for product in products:
-            if product.id in seen_ids:
-                continue
-            seen_ids.add(product.id)
-            enhanced_product = get_product_with_enhanced_data(session, product.id)
-            if enhanced_product:
-                enhanced_products.append(enhanced_product)
+        # Remove duplicates by product id and enhance the page in one pass
+        enhanced_products = get_unique_enhanced_products(session, products)
 
         # Check if no products found
         if not enhanced_products:
@@ -923,6 +918,8 @@ def get_trending_products(
             len(enhanced_products)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         return api_response(500, f"Error fetching trending products: {str(e)}")
 
@@ -947,72 +944,36 @@ def get_limited_edition_products(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
-        query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Product.quantity > 0,
-                    Product.quantity <= low_stock_threshold,
-                    Shop.is_active == True
-                )
-            )
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, LIMITED_EDITION, query_params_dict, skip, limit,
+            shop_id=shop_id, param=low_stock_threshold, is_active=is_active,
+            extra_filters=(category_is_active, manufacturer_is_active, manufacturer_is_approved),
         )
-
-        # Add shop filter
-        if shop_id:
-            query = query.where(Product.shop_id == shop_id)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            enhanced_products = get_unique_enhanced_products(session, feed_ids)
+            if not enhanced_products:
+                return api_response(404, "No limited edition products found", [], 0)
+            return api_response(
+                200,
+                f"Found {len(enhanced_products)} limited edition products",
+                enhanced_products,
+                feed_total
             )
 
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
-
-        # Apply numberRange filter
-        query = apply_number_range_filter(query, query_params_dict, Product)
-
-        # Apply category/manufacturer filters
-        if category_is_active is not None:
-            active_cat_ids = select(Category.id).where(Category.is_active == category_is_active)
-            query = query.where(Product.category_id.in_(active_cat_ids))
-        if manufacturer_is_active is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_active == manufacturer_is_active)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-        if manufacturer_is_approved is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_approved == manufacturer_is_approved)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-
-        # Apply sort filter
-        query = apply_sort_filter(query, query_params_dict, Product, "quantity", "asc")
-
-        query = (
-            query
-            .offset(skip)
-            .limit(limit)
+        products, _ = (
+            ProductQuery(
+                Product.quantity > 0,
+                Product.quantity <= low_stock_threshold,
+            )
+            .storefront(is_active, shop_id)
+            .list_params(query_params_dict)
+            .related_active(category_is_active, manufacturer_is_active, manufacturer_is_approved)
+            .sort(query_params_dict.get('sort'), "quantity", "asc")
+            .page(session, skip, limit, with_count=False)
         )
 
-        products = distinct_products(session.exec(query).all())
-
         # Get unique enhanced products
         enhanced_products = get_unique_enhanced_products(session, products)
 
@@ -1032,6 +993,8 @@ def get_limited_edition_products(
             len(enhanced_products)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         return api_response(500, f"Error fetching limited edition products: {str(e)}")
 
@@ -1059,85 +1022,40 @@ def get_best_seller_products(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
-        query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True
-                )
-            )
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, BEST_SELLERS, query_params_dict, skip, limit,
+            shop_id=shop_id, param=days, is_active=is_active,
+            extra_filters=(qty_eq, qty_lt, qty_gt, category_is_active, manufacturer_is_active, manufacturer_is_approved),
         )
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            enhanced_products = get_unique_enhanced_products(session, feed_ids)
+            if not enhanced_products:
+                return api_response(404, "No best seller products found", [], 0)
+            return api_response(
+                200,
+                f"Found {len(enhanced_products)} best seller products",
+                enhanced_products,
+                feed_total
+            )
 
-        # Add shop filter
-        if shop_id:
-            query = query.where(Product.shop_id == shop_id)
+        product_query = ProductQuery(Product.total_sold_quantity > 0).storefront(is_active, shop_id)
 
         # If days parameter provided, filter by date
         if days:
             threshold_date = now_pk() - timedelta(days=days)
-            query = query.where(Product.created_at >= threshold_date)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
-
-        # Apply numberRange filter
-        query = apply_number_range_filter(query, query_params_dict, Product)
-
-        # Apply quantity filters
-        if qty_eq is not None:
-            query = query.where(Product.quantity == qty_eq)
-        if qty_lt is not None:
-            query = query.where(Product.quantity < qty_lt)
-        if qty_gt is not None:
-            query = query.where(Product.quantity > qty_gt)
-
-        # Apply category/manufacturer filters
-        if category_is_active is not None:
-            active_cat_ids = select(Category.id).where(Category.is_active == category_is_active)
-            query = query.where(Product.category_id.in_(active_cat_ids))
-        if manufacturer_is_active is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_active == manufacturer_is_active)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-        if manufacturer_is_approved is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_approved == manufacturer_is_approved)
-            query = query.where(or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids)))
-
-        query = query.where(Product.total_sold_quantity > 0)
-
-        # Apply sort filter
-        query = apply_sort_filter(query, query_params_dict, Product, "total_sold_quantity", "desc")
-
-        query = (
-            query
-            .offset(skip)
-            .limit(limit)
+            product_query.where(Product.created_at >= threshold_date)
+
+        products, _ = (
+            product_query
+            .list_params(query_params_dict)
+            .quantity(eq=qty_eq, lt=qty_lt, gt=qty_gt)
+            .related_active(category_is_active, manufacturer_is_active, manufacturer_is_approved)
+            .sort(query_params_dict.get('sort'), "total_sold_quantity", "desc")
+            .page(session, skip, limit, with_count=False)
         )
 
-        products = distinct_products(session.exec(query).all())
-
         # Get unique enhanced products
         enhanced_products = get_unique_enhanced_products(session, products)
 
@@ -1157,6 +1075,8 @@ def get_best_seller_products(
             len(enhanced_products)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         return api_response(500, f"Error fetching best seller products: {str(e)}")
 
@@ -1282,208 +1202,35 @@ def get_sale_products(
         
         print(f"Fetching sale products: is_active={is_active}, limit={limit}, page={page}")
         
-        # SIMPLE PRODUCTS - Direct query without joins first
-        simple_condition = and_(
-            Product.is_active == is_active,
-            Shop.is_active == True,
-            Product.product_type == ProductType.SIMPLE,
-            Product.sale_price > 0,
-            Product.sale_price < Product.price
-        )
-
-        simple_products_stmt = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(simple_condition)
-        )
-
-        # Add shop filter if provided
-        if shop_id:
-            simple_products_stmt = simple_products_stmt.where(Product.shop_id == shop_id)
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        simple_products_stmt = simple_products_stmt.where(field.in_(field_value))
-                    else:
-                        simple_products_stmt = simple_products_stmt.where(field == field_value)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            simple_products_stmt = simple_products_stmt.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply numberRange filter
-        simple_products_stmt = apply_number_range_filter(simple_products_stmt, query_params_dict, Product)
-
-        # Apply quantity filters
-        if qty_eq is not None:
-            simple_products_stmt = simple_products_stmt.where(Product.quantity == qty_eq)
-        if qty_lt is not None:
-            simple_products_stmt = simple_products_stmt.where(Product.quantity < qty_lt)
-        if qty_gt is not None:
-            simple_products_stmt = simple_products_stmt.where(Product.quantity > qty_gt)
-
-        # Apply category_is_active filter
-        if category_is_active is not None:
-            active_cat_ids = select(Category.id).where(Category.is_active == category_is_active)
-            simple_products_stmt = simple_products_stmt.where(Product.category_id.in_(active_cat_ids))
-
-        # Apply manufacturer filters
-        if manufacturer_is_active is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_active == manufacturer_is_active)
-            simple_products_stmt = simple_products_stmt.where(
-                or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids))
-            )
-
-        if manufacturer_is_approved is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_approved == manufacturer_is_approved)
-            simple_products_stmt = simple_products_stmt.where(
-                or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids))
-            )
-
-        # Apply sort filter
-        simple_products_stmt = apply_sort_filter(simple_products_stmt, query_params_dict, Product, "created_at", "desc")
-
-        simple_products_stmt = (
-            simple_products_stmt
-            .offset(skip)
-            .limit(limit)
-        )
-
-        print("Executing simple products query...")
-        simple_products = distinct_products(session.exec(simple_products_stmt).all())
-        print(f"Found {len(simple_products)} simple products on sale")
-        
-        # VARIABLE PRODUCTS - Using subquery approach to avoid DISTINCT ON error
-        # First get product IDs that have sale variations
-        sale_product_ids_subq = (
-            select(VariationOption.product_id)
-            .where(
-                and_(
-                    VariationOption.sale_price.isnot(None),
-                    VariationOption.sale_price != "",
-                    cast(VariationOption.sale_price, Float) > 0,
-                    cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                )
-            )
-            .distinct()
-            .subquery()
-        )
-        
-        # Then get the actual products
-        variable_products_stmt = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.product_type == ProductType.VARIABLE,
-                    Product.id.in_(select(sale_product_ids_subq))
-                )
-            )
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, SALES, query_params_dict, skip, limit,
+            shop_id=shop_id, is_active=is_active,
+            extra_filters=(qty_eq, qty_lt, qty_gt, category_is_active, manufacturer_is_active, manufacturer_is_approved),
         )
-
-        # Add shop filter if provided
-        if shop_id:
-            variable_products_stmt = variable_products_stmt.where(Product.shop_id == shop_id)
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        variable_products_stmt = variable_products_stmt.where(field.in_(field_value))
-                    else:
-                        variable_products_stmt = variable_products_stmt.where(field == field_value)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            variable_products_stmt = variable_products_stmt.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply numberRange filter
-        variable_products_stmt = apply_number_range_filter(variable_products_stmt, query_params_dict, Product)
-
-        # Apply quantity filters
-        if qty_eq is not None:
-            variable_products_stmt = variable_products_stmt.where(Product.quantity == qty_eq)
-        if qty_lt is not None:
-            variable_products_stmt = variable_products_stmt.where(Product.quantity < qty_lt)
-        if qty_gt is not None:
-            variable_products_stmt = variable_products_stmt.where(Product.quantity > qty_gt)
-
-        # Apply category_is_active filter
-        if category_is_active is not None:
-            active_cat_ids = select(Category.id).where(Category.is_active == category_is_active)
-            variable_products_stmt = variable_products_stmt.where(Product.category_id.in_(active_cat_ids))
-
-        # Apply manufacturer filters
-        if manufacturer_is_active is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_active == manufacturer_is_active)
-            variable_products_stmt = variable_products_stmt.where(
-                or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids))
-            )
-
-        if manufacturer_is_approved is not None:
-            mfr_ids = select(Manufacturer.id).where(Manufacturer.is_approved == manufacturer_is_approved)
-            variable_products_stmt = variable_products_stmt.where(
-                or_(Product.manufacturer_id.is_(None), Product.manufacturer_id.in_(mfr_ids))
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            sale_products = load_products_in_order(session, feed_ids)
+        else:
+            # Simple and variable products on sale, paged as one list
+            sale_products, _ = (
+                ProductQuery()
+                .storefront(is_active, shop_id)
+                .on_sale()
+                .list_params(query_params_dict)
+                .quantity(eq=qty_eq, lt=qty_lt, gt=qty_gt)
+                .related_active(category_is_active, manufacturer_is_active, manufacturer_is_approved)
+                .sort(query_params_dict.get('sort'), "created_at", "desc")
+                .page(session, skip, limit, with_count=False)
             )
 
-        # Apply sort filter - now we can order normally without DISTINCT ON issues
-        variable_products_stmt = apply_sort_filter(variable_products_stmt, query_params_dict, Product, "created_at", "desc")
-
-        variable_products_stmt = (
-            variable_products_stmt
-            .offset(skip)
-            .limit(limit)
-        )
-
-        print("Executing variable products query...")
-        variable_products = distinct_products(session.exec(variable_products_stmt).all())
-        print(f"Found {len(variable_products)} variable products with sale variations")
-        
-        # Combine and deduplicate products
-        all_products = simple_products + variable_products
-        
-        # Get unique enhanced products (maintain order and remove duplicates)
-        seen_ids = set()
-        sale_products = []
-        for product in all_products:
-            if product.id not in seen_ids:
-                seen_ids.add(product.id)
-                sale_products.append(product)
-                if len(sale_products) >= limit:
-                    break
-
         # Enhance product data with sale-specific information
+        enhanced_by_id = {
+            item.id: item for item in get_products_with_enhanced_data(session, sale_products)
+        }
         enhanced_products = []
         for product in sale_products:
-            enhanced_product = get_product_with_enhanced_data(session, product.id)
+            enhanced_product = enhanced_by_id.get(product.id)
             if enhanced_product:
                 # Add sale-specific information
                 product_dict = enhanced_product.model_dump()
@@ -1498,38 +1245,13 @@ def get_sale_products(
                 
                 # For variable products, find which variations are on sale
                 elif product.product_type == ProductType.VARIABLE:
-                    sale_variations = session.exec(
-                        select(VariationOption)
-                        .where(
-                            and_(
-                                VariationOption.product_id == product.id,
-                                VariationOption.sale_price.isnot(None),
-                                VariationOption.sale_price != "",
-                                cast(VariationOption.sale_price, Float) > 0,
-                                cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                            )
-                        )
-                    ).all()
-                    
-                    product_dict['sale_variations_count'] = len(sale_variations)
-                    
+                    # ✅ From the selectinloaded variation_options, no query per product
+                    discounts = sale_variation_discounts(enhanced_product)
+                    product_dict['sale_variations_count'] = len(discounts)
+
                     # Calculate average discount for variable products
-                    if sale_variations:
-                        total_discount = 0
-                        for var in sale_variations:
-                            try:
-                                price_val = float(var.price)
-                                sale_price_val = float(var.sale_price) if var.sale_price else price_val
-                                if price_val > 0:
-                                    discount = ((price_val - sale_price_val) / price_val) * 100
-                                    total_discount += discount
-                            except (ValueError, TypeError):
-                                continue
-                        
-                        if total_discount > 0:
-                            product_dict['average_discount_percent'] = round(total_discount / len(sale_variations), 2)
-                        else:
-                            product_dict['average_discount_percent'] = 0
+                    if discounts:
+                        product_dict['average_discount_percent'] = round(sum(discounts) / len(discounts), 2)
                     else:
                         product_dict['average_discount_percent'] = 0
                 
@@ -1548,9 +1270,12 @@ def get_sale_products(
             200,
             f"Found {len(enhanced_products)} sale products",
             enhanced_products,
-            len(enhanced_products)
+            # Feed pages know the full total; the ad-hoc path is not counted
+            feed_total if feed_page is not None else len(enhanced_products)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching sale products: {str(e)}")
         import traceback
@@ -1577,103 +1302,43 @@ def get_sale_products_optimized(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
-        # Build the main query
-        query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True
-                )
-            )
-        )
+        product_query = ProductQuery().storefront(is_active)
 
         # Filter by shop_id parameter or user's shops
         if shop_id:
-            query = query.where(Product.shop_id == shop_id)
+            product_query.where(Product.shop_id == shop_id)
         else:
             shop_ids = [s["id"] for s in user.get("shops", [])]
             if shop_ids:
-                query = query.where(Product.shop_id.in_(shop_ids))
-
-        # Filter by product type if specified
-        if product_type:
-            if product_type.upper() == "SIMPLE":
-                query = query.where(Product.product_type == ProductType.SIMPLE)
-            elif product_type.upper() == "VARIABLE":
-                query = query.where(Product.product_type == ProductType.VARIABLE)
-        
-        # Subquery for simple products on sale
-        simple_sale_condition = and_(
-            Product.product_type == ProductType.SIMPLE,
-            Product.sale_price > 0,
-            Product.sale_price < Product.price
-        )
-        
-        # Subquery for variable products with sale variations
-        variable_sale_condition = and_(
-            Product.product_type == ProductType.VARIABLE,
-            exists().where(
-                and_(
-                    VariationOption.product_id == Product.id,
-                    VariationOption.sale_price.isnot(None),
-                    VariationOption.sale_price != "",
-                    cast(VariationOption.sale_price, Float) > 0,
-                    cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                )
-            )
-        )
-        
-        # Combine conditions
-        query = query.where(or_(simple_sale_condition, variable_sale_condition))
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
+                product_query.shops(shop_ids)
 
         # Add ordering by discount amount (highest discount first)
         from sqlalchemy import case
-        
+
         discount_case = case(
             (Product.product_type == ProductType.SIMPLE, 
              (Product.price - Product.sale_price) / Product.price * 100),
             else_=0
-        ).label('discount_percent')
-        
-        query = query.order_by(discount_case.desc(), Product.id.asc())
+        )
 
-        # Execute query
-        products = distinct_products(session.exec(
-            query
-            .offset(skip)
-            .limit(limit)
-        ).all())
+        # Simple products on sale or variable products with sale variations
+        products, total_count = (
+            product_query
+            .product_type(product_type)
+            .on_sale()
+            .search(query_params_dict.get('searchTerm'))
+            .column_filters(query_params_dict.get('columnFilters'))
+            .order_by(discount_case.desc(), Product.id.asc())
+            .page(session, skip, limit)
+        )
 
         # Enhance product data
+        enhanced_by_id = {
+            item.id: item for item in get_products_with_enhanced_data(session, products)
+        }
         enhanced_products = []
         for product in products:
-            enhanced_product = get_product_with_enhanced_data(session, product.id)
+            enhanced_product = enhanced_by_id.get(product.id)
             if enhanced_product:
                 product_data = enhanced_product.model_dump()
                 
@@ -1684,47 +1349,14 @@ def get_sale_products_optimized(
                     product_data['sale_variations_count'] = 0
                     
                 elif product.product_type == ProductType.VARIABLE:
-                    # Count sale variations
-                    sale_vars = session.exec(
-                        select(VariationOption)
-                        .where(
-                            and_(
-                                VariationOption.product_id == product.id,
-                                VariationOption.sale_price.isnot(None),
-                                cast(VariationOption.sale_price, Float) > 0,
-                                cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                            )
-                        )
-                    ).all()
-                    
-                    product_data['sale_variations_count'] = len(sale_vars)
-                    
+                    # Count sale variations (loaded with the page, no query per product)
+                    discounts = sale_variation_discounts(enhanced_product)
+                    product_data['sale_variations_count'] = len(discounts)
+
                     # Calculate max discount
-                    max_discount = 0
-                    for var in sale_vars:
-                        try:
-                            price_val = float(var.price)
-                            sale_val = float(var.sale_price)
-                            discount = ((price_val - sale_val) / price_val) * 100
-                            max_discount = max(max_discount, discount)
-                        except (ValueError, TypeError):
-                            continue
-                    
-                    product_data['max_discount_percent'] = round(max_discount, 2)
+                    product_data['max_discount_percent'] = round(max(discounts, default=0), 2)
                 
                 enhanced_products.append(product_data)
-        
-        # Get total count for pagination
-        count_query = select(func.count(Product.id)).where(
-            and_(
-                Product.is_active == is_active,
-                or_(simple_sale_condition, variable_sale_condition)
-            )
-        )
-        if shop_ids:
-            count_query = count_query.where(Product.shop_id.in_(shop_ids))
-
-        total_count = session.exec(count_query).first()
 
         # Check if no products found
         if not enhanced_products:
@@ -1742,6 +1374,8 @@ def get_sale_products_optimized(
             total_count
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in optimized sale products: {str(e)}")
         return api_response(500, f"Error fetching sale products: {str(e)}")
@@ -1765,96 +1399,33 @@ def get_public_sale_products(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
-        # Simple products on sale
-        simple_query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.product_type == ProductType.SIMPLE,
-                    Product.sale_price > 0,
-                    Product.sale_price < Product.price
-                )
-            )
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, SALES, query_params_dict, skip, limit,
+            shop_id=shop_id, param=None, is_active=is_active,
         )
-
-        # Add shop filter if provided
-        if shop_id:
-            simple_query = simple_query.where(Product.shop_id == shop_id)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            simple_query = simple_query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            enhanced_products = get_unique_enhanced_products(session, feed_ids, return_dict=True)
+            if not enhanced_products:
+                return api_response(404, "No sale products found", [], 0)
+            return api_response(
+                200,
+                f"Found {len(enhanced_products)} sale products",
+                enhanced_products,
+                feed_total
             )
 
-        simple_query = simple_query.order_by(Product.created_at.desc(), Product.id.asc())
-        simple_products = distinct_products(session.exec(
-            simple_query
-            .offset(skip)
-            .limit(limit)
-        ).all())
-
-        # Variable products with sale variations
-        variable_query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .join(VariationOption, Product.id == VariationOption.product_id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.product_type == ProductType.VARIABLE,
-                    VariationOption.sale_price.isnot(None),
-                    cast(VariationOption.sale_price, Float) > 0,
-                    cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                )
-            )
-            .distinct(Product.id)
+        # Simple and variable products on sale, paged as one list
+        unique_product_list, _ = (
+            ProductQuery()
+            .storefront(is_active, shop_id)
+            .on_sale()
+            .search(query_params_dict.get('searchTerm'))
+            .order_by(Product.created_at.desc(), Product.id.asc())
+            .page(session, skip, limit, with_count=False)
         )
 
-        # Add shop filter if provided
-        if shop_id:
-            variable_query = variable_query.where(Product.shop_id == shop_id)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            variable_query = variable_query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        variable_query = variable_query.order_by(Product.created_at.desc(), Product.id.asc())
-        variable_products = distinct_products(session.exec(
-            variable_query
-            .offset(skip)
-            .limit(limit)
-        ).all())
-
-        # Combine results and get unique enhanced products
-        all_products = simple_products + variable_products
-
-        # Get unique products maintaining order and limiting to requested amount
-        seen_ids = set()
-        unique_product_list = []
-        for product in all_products:
-            if product.id not in seen_ids:
-                seen_ids.add(product.id)
-                unique_product_list.append(product)
-                if len(unique_product_list) >= limit:
-                    break
-
         # Enhance data
         enhanced_products = get_unique_enhanced_products(session, unique_product_list, return_dict=True)
 
@@ -1874,6 +1445,8 @@ def get_public_sale_products(
             len(enhanced_products)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         return api_response(500, f"Error fetching sale products: {str(e)}")
     
@@ -1896,162 +1469,27 @@ def get_sale_products_simple(
         
         print(f"Fetching sale products: is_active={is_active}, limit={limit}, page={page}")
         
-        # SIMPLE PRODUCTS - Direct query without joins first
-        simple_condition = and_(
-            Product.is_active == is_active,
-            Shop.is_active == True,
-            Product.product_type == ProductType.SIMPLE,
-            Product.sale_price > 0,
-            Product.sale_price < Product.price
-        )
-
-        simple_products_stmt = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(simple_condition)
-        )
-
-        # Add shop filter
-        if shop_id:
-            simple_products_stmt = simple_products_stmt.where(Product.shop_id == shop_id)
-
-        # Apply columnFilters
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        simple_products_stmt = simple_products_stmt.where(field.in_(field_value))
-                    else:
-                        simple_products_stmt = simple_products_stmt.where(field == field_value)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            simple_products_stmt = simple_products_stmt.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply numberRange filter
-        simple_products_stmt = apply_number_range_filter(simple_products_stmt, query_params_dict, Product)
-
-        # Apply sort filter
-        simple_products_stmt = apply_sort_filter(simple_products_stmt, query_params_dict, Product, "created_at", "desc")
-
-        simple_products_stmt = (
-            simple_products_stmt
-            .offset(skip)
-            .limit(limit)
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, SALES, query_params_dict, skip, limit,
+            shop_id=shop_id, is_active=is_active,
         )
-
-        print("Executing simple products query...")
-        simple_products = distinct_products(session.exec(simple_products_stmt).all())
-        print(f"Found {len(simple_products)} simple products on sale")
-        
-        # VARIABLE PRODUCTS - Separate query to avoid complex joins
-        # First get product IDs that have sale variations
-        variable_product_ids_stmt = (
-            select(VariationOption.product_id)
-            .where(
-                and_(
-                    VariationOption.sale_price.isnot(None),
-                    cast(VariationOption.sale_price, Float) > 0,
-                    cast(VariationOption.sale_price, Float) < cast(VariationOption.price, Float)
-                )
-            )
-            .distinct()
-        )
-        
-        print("Getting variable product IDs...")
-        variable_product_ids = session.exec(variable_product_ids_stmt).all()
-        print(f"Found {len(variable_product_ids)} variable products with sale variations")
-        
-        # Now get the actual products
-        variable_products = []
-        if variable_product_ids:
-            variable_condition = and_(
-                Product.is_active == is_active,
-                Shop.is_active == True,
-                Product.product_type == ProductType.VARIABLE,
-                Product.id.in_(variable_product_ids)
-            )
-
-            variable_products_stmt = (
-                select(Product)
-                .join(Shop, Product.shop_id == Shop.id)
-                .where(variable_condition)
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            sale_products = load_products_in_order(session, feed_ids)
+        else:
+            # Simple and variable products on sale, paged as one list
+            sale_products, _ = (
+                ProductQuery()
+                .storefront(is_active, shop_id)
+                .on_sale()
+                .list_params(query_params_dict)
+                .sort(query_params_dict.get('sort'), "created_at", "desc")
+                .page(session, skip, limit, with_count=False)
             )
 
-            # Add shop filter
-            if shop_id:
-                variable_products_stmt = variable_products_stmt.where(Product.shop_id == shop_id)
-
-            # Apply columnFilters
-            if query_params_dict.get('columnFilters'):
-                import ast
-                column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-                for col_filter in column_filters:
-                    field_name, field_value = col_filter[0], col_filter[1]
-                    if hasattr(Product, field_name):
-                        field = getattr(Product, field_name)
-                        if isinstance(field_value, list):
-                            variable_products_stmt = variable_products_stmt.where(field.in_(field_value))
-                        else:
-                            variable_products_stmt = variable_products_stmt.where(field == field_value)
-
-            # Apply searchTerm
-            if query_params_dict.get('searchTerm'):
-                search = f"%{query_params_dict['searchTerm']}%"
-                variable_products_stmt = variable_products_stmt.where(
-                    or_(
-                        Product.name.ilike(search),
-                        Product.description.ilike(search),
-                        Product.sku.ilike(search)
-                    )
-                )
-
-            # Apply numberRange filter
-            variable_products_stmt = apply_number_range_filter(variable_products_stmt, query_params_dict, Product)
-
-            # Apply sort filter
-            variable_products_stmt = apply_sort_filter(variable_products_stmt, query_params_dict, Product, "created_at", "desc")
-
-            variable_products_stmt = (
-                variable_products_stmt
-                .offset(skip)
-                .limit(limit)
-            )
+            print(f"Total unique sale products: {len(sale_products)}")
 
-            print("Executing variable products query...")
-            variable_products = distinct_products(session.exec(variable_products_stmt).all())
-            print(f"Retrieved {len(variable_products)} variable products")
-        
-        # Combine results manually - NO list() function calls
-        all_products = []
-        all_products.extend(simple_products)
-        all_products.extend(variable_products)
-        
-        # Remove duplicates using a dictionary
-        unique_products_dict = {}
-        for product in all_products:
-            unique_products_dict[product.id] = product
-        
-        # Convert to list using list comprehension - NOT the list() function
-        sale_products = [product for product in unique_products_dict.values()]
-        
-        # Apply limit
-        if len(sale_products) > limit:
-            sale_products = sale_products[:limit]
-        
-        print(f"Total unique sale products: {len(sale_products)}")
-        
         # Build response - completely manual, no external function calls
         response_data = []
         for product in sale_products:
@@ -2100,9 +1538,12 @@ def get_sale_products_simple(
             200,
             f"Found {len(response_data)} sale products",
             response_data,
-            len(response_data)
+            # Feed pages know the full total; the ad-hoc path is not counted
+            feed_total if feed_page is not None else len(response_data)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"CRITICAL ERROR in sales-simple: {str(e)}")
         import traceback
@@ -2132,79 +1573,32 @@ def get_new_arrivals(
         page = query_params_dict.get('page', 1)
         skip = (page - 1) * limit
 
-        # Build base query
-        query = (
-            select(Product)
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.created_at >= threshold_date
-                )
-            )
+        # Homepage requests without ad-hoc filters page over the precomputed feed
+        feed_page = storefront_feed_page(
+            session, NEW_ARRIVALS, query_params_dict, skip, limit,
+            shop_id=shop_id, param=days, is_active=is_active,
         )
-
-        # Add shop filter if provided
-        if shop_id:
-            query = query.where(Product.shop_id == shop_id)
-
-        # Apply columnFilters from query_params
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
-
-        # Apply searchTerm
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
+        if feed_page is not None:
+            feed_ids, feed_total = feed_page
+            enhanced_products = get_unique_enhanced_products(session, feed_ids, return_dict=True)
+            if not enhanced_products:
+                return api_response(404, "No new arrival products found", [], 0)
+            return api_response(
+                200,
+                f"Found {len(enhanced_products)} new arrival products",
+                enhanced_products,
+                feed_total
             )
 
-        # Apply numberRange filter
-        query = apply_number_range_filter(query, query_params_dict, Product)
-
-        # Apply sort filter
-        query = apply_sort_filter(query, query_params_dict, Product, "created_at", "desc")
-        
-        # Execute query
-        products = distinct_products(session.exec(
-            query
-            .offset(skip)
-            .limit(limit)
-        ).all())
-
-        # Get total count for pagination
-        count_query = (
-            select(func.count(Product.id))
-            .join(Shop, Product.shop_id == Shop.id)
-            .where(
-                and_(
-                    Product.is_active == is_active,
-                    Shop.is_active == True,
-                    Product.created_at >= threshold_date
-                )
-            )
+        # Page and total count from the same filtered set
+        products, total_count = (
+            ProductQuery(Product.created_at >= threshold_date)
+            .storefront(is_active, shop_id)
+            .list_params(query_params_dict)
+            .sort(query_params_dict.get('sort'), "created_at", "desc")
+            .page(session, skip, limit)
         )
 
-        # Apply shop filter to count query
-        if shop_id:
-            count_query = count_query.where(Product.shop_id == shop_id)
-
-        total_count = session.exec(count_query).first()
-
         # Get unique enhanced products
         enhanced_products = get_unique_enhanced_products(session, products, return_dict=True)
 
@@ -2224,6 +1618,8 @@ def get_new_arrivals(
             total_count
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching new arrivals: {str(e)}")
         return api_response(500, f"Error fetching new arrivals: {str(e)}")
@@ -2339,6 +1735,8 @@ def update_qty_price(
             session.commit()
             session.refresh(product)
             session.refresh(variation)
+            invalidate_product(product.id)
+            mark_feeds_stale(*STOCK_FEEDS, *PRICE_FEEDS)
 
             # Return enhanced product data
             enhanced_product = get_product_with_enhanced_data(session, product.id)
@@ -2405,6 +1803,8 @@ def update_qty_price(
             session.add(product)
             session.commit()
             session.refresh(product)
+            invalidate_product(product.id)
+            mark_feeds_stale(*STOCK_FEEDS, *PRICE_FEEDS)
 
             # Return enhanced product data
             enhanced_product = get_product_with_enhanced_data(session, product.id)
@@ -2497,6 +1897,8 @@ def remove_qty(
             session.commit()
             session.refresh(product)
             session.refresh(variation)
+            invalidate_product(product.id)
+            mark_feeds_stale(*STOCK_FEEDS)
 
             # Return enhanced product data
             enhanced_product = get_product_with_enhanced_data(session, product.id)
@@ -2533,6 +1935,8 @@ def remove_qty(
             session.add(product)
             session.commit()
             session.refresh(product)
+            invalidate_product(product.id)
+            mark_feeds_stale(*STOCK_FEEDS)
 
             # Return enhanced product data
             enhanced_product = get_product_with_enhanced_data(session, product.id)
@@ -2644,8 +2048,8 @@ def get_product_inventory(
             if not filter_shop_ids:
                 return api_response(200, "No shops found for user", [], 0)
 
-        # Build base query with joins for related data
-        query = (
+        # Columns of the page rows; the filters below are EXISTS semijoins
+        columns = (
             select(
                 Product.id,
                 Product.name,
@@ -2667,133 +2071,36 @@ def get_product_inventory(
             .outerjoin(Shop, Product.shop_id == Shop.id)
         )
 
-        # Apply shop filter only if filter_shop_ids is not None
-        if filter_shop_ids is not None:
-            query = query.where(Product.shop_id.in_(filter_shop_ids))
-
-        # Apply filters - category with subcategories (like /products/related/{category_id})
-        if category_id is not None:
-            # Get all descendant category IDs (children and grandchildren)
-            descendants = session.exec(
-                select(Category.id).where(
-                    or_(
-                        Category.parent_id == category_id,  # Direct children
-                        Category.parent_id.in_(
-                            select(Category.id).where(Category.parent_id == category_id)
-                        )  # Grandchildren
-                    )
-                )
-            ).all()
-            category_ids = [category_id] + [d for d in descendants]
-            query = query.where(Product.category_id.in_(category_ids))
+        # Apply shop filter only if filter_shop_ids is not None;
+        # category filter includes subcategories (like /products/related/{category_id})
+        product_query = (
+            ProductQuery()
+            .shops(filter_shop_ids)
+            .in_category_tree(category_id)
+            .product_type(product_type)
+            .quantity(min=min_quantity, max=max_quantity)
+            .active(is_active)
+            .list_params(query_params_dict)
+        )
 
         if manufacturer_id is not None:
-            query = query.where(Product.manufacturer_id == manufacturer_id)
-
-        if product_type is not None:
-            # Map string to ProductType enum
-            product_type_upper = product_type.upper()
-            if product_type_upper == "SIMPLE":
-                query = query.where(Product.product_type == ProductType.SIMPLE)
-            elif product_type_upper == "VARIABLE":
-                query = query.where(Product.product_type == ProductType.VARIABLE)
-            elif product_type_upper == "GROUPED":
-                query = query.where(Product.product_type == ProductType.GROUPED)
+            product_query.where(Product.manufacturer_id == manufacturer_id)
 
         if product_name is not None:
-            search = f"%{product_name}%"
-            query = query.where(Product.name.ilike(search))
+            product_query.where(Product.name.ilike(f"%{product_name}%"))
 
         if min_price is not None:
-            query = query.where(Product.price >= min_price)
+            product_query.where(Product.price >= min_price)
 
         if max_price is not None:
-            query = query.where(Product.price <= max_price)
-
-        if min_quantity is not None:
-            query = query.where(Product.quantity >= min_quantity)
-
-        if max_quantity is not None:
-            query = query.where(Product.quantity <= max_quantity)
-
-        if is_active is not None:
-            query = query.where(Product.is_active == is_active)
-
-        # Apply searchTerm from query_params (searches name, description, sku)
-        if query_params_dict.get('searchTerm'):
-            search = f"%{query_params_dict['searchTerm']}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search),
-                    Product.description.ilike(search),
-                    Product.sku.ilike(search)
-                )
-            )
-
-        # Apply columnFilters from query_params
-        if query_params_dict.get('columnFilters'):
-            import ast
-            column_filters = ast.literal_eval(query_params_dict['columnFilters'])
-            for col_filter in column_filters:
-                field_name, field_value = col_filter[0], col_filter[1]
-                if hasattr(Product, field_name):
-                    field = getattr(Product, field_name)
-                    if isinstance(field_value, list):
-                        query = query.where(field.in_(field_value))
-                    else:
-                        query = query.where(field == field_value)
-
-        # Apply numberRange filter
-        query = apply_number_range_filter(query, query_params_dict, Product)
+            product_query.where(Product.price <= max_price)
 
-        # Apply sort filter (default: sort by name ascending)
-        query = apply_sort_filter(query, query_params_dict, Product, "name", "asc")
-
-        # Get total count for pagination
-        count_query = select(func.count(Product.id))
-
-        # Apply shop filter to count query only if filter_shop_ids is not None
-        if filter_shop_ids is not None:
-            count_query = count_query.where(Product.shop_id.in_(filter_shop_ids))
-
-        # Apply same filters to count query
-        if category_id is not None:
-            count_query = count_query.where(Product.category_id == category_id)
-        if manufacturer_id is not None:
-            count_query = count_query.where(Product.manufacturer_id == manufacturer_id)
-        if product_type is not None:
-            product_type_upper = product_type.upper()
-            if product_type_upper == "SIMPLE":
-                count_query = count_query.where(Product.product_type == ProductType.SIMPLE)
-            elif product_type_upper == "VARIABLE":
-                count_query = count_query.where(Product.product_type == ProductType.VARIABLE)
-            elif product_type_upper == "GROUPED":
-                count_query = count_query.where(Product.product_type == ProductType.GROUPED)
-        if product_name is not None:
-            count_query = count_query.where(Product.name.ilike(f"%{product_name}%"))
-        if min_price is not None:
-            count_query = count_query.where(Product.price >= min_price)
-        if max_price is not None:
-            count_query = count_query.where(Product.price <= max_price)
-        if min_quantity is not None:
-            count_query = count_query.where(Product.quantity >= min_quantity)
-        if max_quantity is not None:
-            count_query = count_query.where(Product.quantity <= max_quantity)
-        if is_active is not None:
-            count_query = count_query.where(Product.is_active == is_active)
-
-        total_count = session.exec(count_query).first() or 0
-
-        # Execute main query with pagination
-        query = query.offset(skip).limit(limit)
-        raw_results = session.exec(query).all()
-        # Deduplicate by product id
-        seen_inv = set()
-        results = []
-        for row in raw_results:
-            if row.id not in seen_inv:
-                seen_inv.add(row.id)
-                results.append(row)
+        # Page and total count from the same filtered set (default: sort by name ascending)
+        results, total_count = (
+            product_query
+            .sort(query_params_dict.get('sort'), "name", "asc")
+            .page(session, skip, limit, columns=columns)
+        )
 
         # Build response data
         inventory_list = []
@@ -2823,6 +2130,8 @@ def get_product_inventory(
             total_count
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching product inventory: {str(e)}")
         import traceback
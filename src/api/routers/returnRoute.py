@@ -5,12 +5,11 @@ from datetime import timedelta
 from src.api.core.utility import now_pk
 from src.api.core.response import api_response, raiseExceptions
 from src.api.core.operation import listRecords, updateOp
-from src.api.core.transaction_logger import TransactionLogger
-from src.api.core.notification_helper import NotificationHelper
-from src.api.core.email_helper import send_email
+from src.api.core.outbox import enqueue, enqueue_transaction_log
+from src.api.core.product_cache import invalidate_products
+from src.api.core.storefront_feeds import STOCK_FEEDS, mark_feeds_stale
 from src.api.core.avatar_helper import get_user_avatar
 from src.api.models.usersModel import User
-from src.api.models.shop_model.shopsModel import Shop
 from src.api.core.dependencies import (
     GetSession,
     ListQueryParams,
@@ -205,80 +204,12 @@ def create_return_request(
             order_product.return_request_id = return_request.id
             session.add(order_product)
 
+    # Notifications and emails go out through the outbox
+    enqueue(session, "return.created", {"return_id": return_request.id})
+
     session.commit()
     session.refresh(return_request)
 
-    # Send notifications
-    from src.api.models.order_model.orderModel import OrderProduct as OP
-    order_products = session.execute(select(OP).where(OP.order_id == order.id)).scalars().all()
-    shop_ids = list(set([op.shop_id for op in order_products if op.shop_id]))
-
-    NotificationHelper.notify_return_request_created(
-        session=session,
-        return_id=return_request.id,
-        order_tracking_number=order.tracking_number,
-        customer_id=order.customer_id,
-        shop_ids=shop_ids
-    )
-
-    # Send emails for return request created
-    try:
-        # Email customer
-        customer = session.get(User, order.customer_id)
-        return_reason = return_request.reason or "Not specified"
-        formatted_refund = f"Rs.{float(return_request.refund_amount):,.2f}"
-        if customer:
-            send_email(
-                to_email=customer.email,
-                email_template_id=9,  # Return request created template
-                replacements={
-                    "customer_name": customer.name,
-                    "order_number": order.tracking_number,
-                    "return_id": return_request.id,
-                    "refund_amount": formatted_refund,
-                    "reason": return_reason,
-                },
-                session=session
-            )
-
-        # Email shop owners
-        for shop_id in shop_ids:
-            shop = session.get(Shop, shop_id)
-            if shop:
-                shop_owner = session.get(User, shop.owner_id)
-                if shop_owner:
-                    send_email(
-                        to_email=shop_owner.email,
-                        email_template_id=9,
-                        replacements={
-                            "customer_name": order.customer_name,
-                            "order_number": order.tracking_number,
-                            "return_id": return_request.id,
-                            "shop_name": shop.name,
-                            "refund_amount": formatted_refund,
-                            "reason": return_reason,
-                        },
-                        session=session
-                    )
-
-        # Email admins
-        admin_users = session.exec(select(User).where(User.is_root == True)).all()
-        for admin in admin_users:
-            send_email(
-                to_email=admin.email,
-                email_template_id=9,
-                replacements={
-                    "customer_name": order.customer_name,
-                    "order_number": order.tracking_number,
-                    "return_id": return_request.id,
-                    "refund_amount": formatted_refund,
-                    "reason": return_reason,
-                },
-                session=session
-            )
-    except Exception as e:
-        print(f"Failed to send return request emails: {e}")
-
     return api_response(201, "Return request created successfully", ReturnRequestRead.model_validate(return_request))
 
 
@@ -304,8 +235,6 @@ def approve_return_request(
     from src.api.models.product_model.productsModel import Product
     from src.api.models.product_model.variationOptionModel import VariationOption
 
-    logger = TransactionLogger(session)
-
     from src.api.models.order_model.orderModel import OrderProduct
 
     for return_item in return_request.return_items:
@@ -328,14 +257,12 @@ def approve_return_request(
                     variation.quantity += return_item.quantity
                     session.add(variation)
 
-                    # Update parent product quantity
+                    # Parent quantity follows through the variation aggregates
                     product = session.get(Product, return_item.product_id)
                     if product:
-                        product.quantity += return_item.quantity
-                        session.add(product)
-
                         # Log order return transaction
-                        logger.log_transaction(
+                        enqueue_transaction_log(
+                            session,
                             TransactionLogCreate(
                                 transaction_type=TransactionType.ORDER_RETURNED,
                                 product_id=return_item.product_id,
@@ -360,7 +287,8 @@ def approve_return_request(
                     session.add(product)
 
                     # Log order return transaction
-                    logger.log_transaction(
+                    enqueue_transaction_log(
+                        session,
                         TransactionLogCreate(
                             transaction_type=TransactionType.ORDER_RETURNED,
                             product_id=return_item.product_id,
@@ -377,86 +305,17 @@ def approve_return_request(
         except Exception as e:
             print(f"Error restocking product {return_item.product_id}: {str(e)}")
 
-    session.commit()
-
-    # Send approval notifications
-    from src.api.models.order_model.orderModel import Order, OrderProduct as OP
-    order = session.get(Order, return_request.order_id)
-    if order:
-        order_products = session.execute(select(OP).where(OP.order_id == order.id)).scalars().all()
-        shop_ids = list(set([op.shop_id for op in order_products if op.shop_id]))
-
-        NotificationHelper.notify_return_request_approved(
-            session=session,
-            return_id=return_request.id,
-            order_tracking_number=order.tracking_number,
-            customer_id=return_request.user_id,
-            shop_ids=shop_ids,
-            refund_amount=float(return_request.refund_amount)
-        )
+    # ✅ Restocked products drop out of the product cache and stock feeds
+    invalidate_products(
+        {return_item.product_id for return_item in return_request.return_items},
+        session=session,
+    )
 
-        # Notify admins (missing from notify_return_request_approved)
-        admin_users = session.exec(select(User).where(User.is_root == True)).all()
-        for admin in admin_users:
-            from src.api.core.notification_helper import NotificationHelper as NH
-            NH.create_notification(
-                session=session,
-                user_id=admin.id,
-                message=f"Return request <b>#{return_request.id}</b> for order <b>{order.tracking_number}</b> has been approved. Refund: <b>Rs.{return_request.refund_amount}</b>",
-                commit=False
-            )
-        session.commit()
+    # Notifications and emails go out through the outbox
+    enqueue(session, "return.approved", {"return_id": return_request.id})
 
-        # Send emails for return approved
-        try:
-            # Email customer
-            customer = session.get(User, return_request.user_id)
-            formatted_refund_approved = f"Rs.{float(return_request.refund_amount):,.2f}"
-            if customer:
-                send_email(
-                    to_email=customer.email,
-                    email_template_id=10,  # Return approved template
-                    replacements={
-                        "customer_name": customer.name,
-                        "order_number": order.tracking_number,
-                        "return_id": return_request.id,
-                        "refund_amount": formatted_refund_approved,
-                    },
-                    session=session
-                )
-
-            # Email shop owners
-            for shop_id in shop_ids:
-                shop = session.get(Shop, shop_id)
-                if shop:
-                    shop_owner = session.get(User, shop.owner_id)
-                    if shop_owner:
-                        send_email(
-                            to_email=shop_owner.email,
-                            email_template_id=10,
-                            replacements={
-                                "order_number": order.tracking_number,
-                                "return_id": return_request.id,
-                                "shop_name": shop.name,
-                                "refund_amount": formatted_refund_approved,
-                            },
-                            session=session
-                        )
-
-            # Email admins
-            for admin in admin_users:
-                send_email(
-                    to_email=admin.email,
-                    email_template_id=10,
-                    replacements={
-                        "order_number": order.tracking_number,
-                        "return_id": return_request.id,
-                        "refund_amount": formatted_refund_approved,
-                    },
-                    session=session
-                )
-        except Exception as e:
-            print(f"Failed to send return approved emails: {e}")
+    session.commit()
+    mark_feeds_stale(*STOCK_FEEDS)
 
     # Process refund in background
     if background_tasks:
@@ -483,7 +342,7 @@ def reject_return_request(
     return_request.rejected_reason = rejected_reason
 
     # ✅ Clear return_request_id from OrderProduct so user can create new return request
-    from src.api.models.order_model.orderModel import Order, OrderProduct
+    from src.api.models.order_model.orderModel import OrderProduct
     for return_item in return_request.return_items:
         order_product = session.execute(
             select(OrderProduct).where(OrderProduct.id == return_item.order_item_id)
@@ -493,35 +352,10 @@ def reject_return_request(
             session.add(order_product)
             print(f"✅ Cleared return_request_id from order_product #{order_product.id}")
 
-    session.commit()
+    # Notification and email go out through the outbox
+    enqueue(session, "return.rejected", {"return_id": return_request.id, "reason": rejected_reason})
 
-    # Send rejection notification + email
-    order = session.get(Order, return_request.order_id)
-    if order:
-        NotificationHelper.notify_return_request_rejected(
-            session=session,
-            return_id=return_request.id,
-            order_tracking_number=order.tracking_number,
-            customer_id=return_request.user_id,
-            reason=rejected_reason
-        )
-
-        try:
-            customer = session.get(User, return_request.user_id)
-            if customer:
-                send_email(
-                    to_email=customer.email,
-                    email_template_id=11,  # Return rejected template
-                    replacements={
-                        "customer_name": customer.name,
-                        "order_number": order.tracking_number,
-                        "return_id": return_request.id,
-                        "rejected_reason": rejected_reason,
-                    },
-                    session=session
-                )
-        except Exception as e:
-            print(f"Failed to send return rejection email: {e}")
+    session.commit()
 
     return api_response(200, "Return request rejected", ReturnRequestRead.model_validate(return_request))
 
@@ -0,0 +1,414 @@
+# src/api/services/order_events.py
+"""
+Outbox handlers for order and return events.
+
+The routes enqueue one domain event in the transaction that changes the
+order (see src/api/core/outbox.py). The handler here loads the order,
+resolves the recipients and fans out into leaf events, one per
+notification, email and transaction log. Each leaf event is retried on its
+own:
+
+    order.placed            order placed + stock deduction logs, notification, confirmation email
+    order.status_changed    status update email (out for delivery / delivered)
+    order.fulfillment_assigned  notification + email to the fulfillment user
+    order.cancelled         cancellation logs, notification, emails to customer / shops / admins
+    return.created / return.approved / return.rejected
+    shop_earning            create_shop_earning() for a completed order
+"""
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlmodel import Session
+
+from src.api.core.outbox import (
+    enqueue_email,
+    enqueue_notification,
+    enqueue_transaction_log,
+    outbox_handler,
+)
+from src.api.models.order_model.orderModel import (
+    Order,
+    OrderItemType,
+    OrderProduct,
+    OrderStatusEnum,
+)
+from src.api.models.returnModel import ReturnRequest
+from src.api.models.shop_model.shopsModel import Shop
+from src.api.models.transactionLogModel import TransactionLogCreate, TransactionType
+from src.api.models.usersModel import User
+from src.api.models.withdrawModel import ShopEarning
+
+# Email template IDs
+ORDER_CONFIRMATION_TEMPLATE = 5
+ORDER_STATUS_TEMPLATE = 6
+FULFILLMENT_ASSIGNED_TEMPLATE = 7
+ORDER_CANCELLED_TEMPLATE = 8
+RETURN_CREATED_TEMPLATE = 9
+RETURN_APPROVED_TEMPLATE = 10
+RETURN_REJECTED_TEMPLATE = 11
+
+
+# ─── Shared helpers ────────────────────────────────────────────────────────
+
+def _money(value) -> str:
+    return f"Rs.{float(value):,.2f}" if value else "N/A"
+
+
+def _value(status) -> Optional[str]:
+    return getattr(status, "value", status)
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value else None
+
+
+def _shop_ids(order: Order) -> List[int]:
+    return list({op.shop_id for op in order.order_products if op.shop_id})
+
+
+def _customer_email(db: Session, order: Order) -> Optional[str]:
+    """Account email of the customer, else the contact given at checkout."""
+    if order.customer_id:
+        customer = db.get(User, order.customer_id)
+        if customer and customer.email:
+            return customer.email
+    return order.customer_contact
+
+
+def _shop_owners(db: Session, shop_ids: List[int]) -> List[Tuple[Shop, User]]:
+    owners = []
+    for shop_id in shop_ids:
+        shop = db.get(Shop, shop_id)
+        owner = db.get(User, shop.owner_id) if shop and shop.owner_id else None
+        if owner:
+            owners.append((shop, owner))
+    return owners
+
+
+def _admins(db: Session) -> List[User]:
+    return db.execute(select(User).where(User.is_root == True)).scalars().all()
+
+
+def _email_parties(db: Session, template_id: int, customer_email, shop_ids, replacements: dict):
+    """Same template to the customer, every shop owner (with shop_name) and every admin."""
+    enqueue_email(db, customer_email, template_id, replacements)
+    for shop, owner in _shop_owners(db, shop_ids):
+        enqueue_email(db, owner.email, template_id, {**replacements, "shop_name": shop.name})
+    for admin in _admins(db):
+        enqueue_email(db, admin.email, template_id, replacements)
+
+
+# ─── Orders ────────────────────────────────────────────────────────────────
+
+@outbox_handler("order.placed")
+def order_placed(db: Session, payload: dict):
+    """payload: order_id, user_id, notes, notify (bool), email_to"""
+    order = db.get(Order, payload["order_id"])
+    if not order:
+        return
+    user_id = payload.get("user_id")
+
+    enqueue_transaction_log(db, TransactionLogCreate(
+        transaction_type=TransactionType.ORDER_PLACED,
+        order_id=order.id,
+        user_id=user_id,
+        subtotal=order.amount,
+        discount=order.discount,
+        tax=order.sales_tax,
+        total=order.total,
+        reference_number=order.tracking_number,
+        notes=payload.get("notes"),
+    ))
+    for op in order.order_products:
+        enqueue_transaction_log(db, TransactionLogCreate(
+            transaction_type=TransactionType.STOCK_DEDUCTION,
+            product_id=op.product_id,
+            variation_option_id=op.variation_option_id if op.item_type == OrderItemType.VARIABLE else None,
+            shop_id=op.shop_id,
+            user_id=user_id,
+            order_id=order.id,
+            order_product_id=op.id,
+            quantity_change=-int(float(op.order_quantity)),
+            unit_price=_optional_float(op.unit_price),
+            sale_price=_optional_float(op.sale_price),
+            subtotal=_optional_float(op.subtotal),
+            discount=_optional_float(op.item_discount),
+            tax=_optional_float(op.item_tax),
+            total=_optional_float(op.subtotal),
+            notes=f"Stock deducted for order {order.tracking_number}",
+        ))
+
+    if payload.get("notify"):
+        enqueue_notification(
+            db,
+            "notify_order_placed",
+            order_id=order.id,
+            tracking_number=order.tracking_number,
+            customer_id=user_id,
+            shop_ids=_shop_ids(order),
+            total_amount=float(order.total or 0),
+        )
+
+    enqueue_email(db, payload.get("email_to"), ORDER_CONFIRMATION_TEMPLATE, {
+        "customer_name": order.customer_name,
+        "order_number": order.tracking_number,
+        "order_date": str(order.created_at),
+        "order_id": order.id,
+        "amount": _money(order.amount),
+        "delivery_date": str(order.delivery_time),
+        "payment_gateway": order.payment_gateway,
+        "total_amount": _money(order.total),
+        "delivery_fee": _money(order.delivery_fee),
+    })
+
+
+@outbox_handler("order.status_changed")
+def order_status_changed(db: Session, payload: dict):
+    """payload: order_id, order_status (the status that was set)"""
+    order = db.get(Order, payload["order_id"])
+    if not order:
+        return
+    enqueue_email(db, _customer_email(db, order), ORDER_STATUS_TEMPLATE, {
+        "customer_name": order.customer_name,
+        "tracking_number": order.tracking_number,
+        "order_number": order.tracking_number,
+        "order_id": order.id,
+        "order_status": payload.get("order_status"),
+        "payment_status": _value(order.payment_status),
+    })
+
+
+@outbox_handler("order.fulfillment_assigned")
+def order_fulfillment_assigned(db: Session, payload: dict):
+    """payload: order_id, fulfillment_user_id"""
+    order = db.get(Order, payload["order_id"])
+    fulfillment_user = db.get(User, payload["fulfillment_user_id"])
+    if not order or not fulfillment_user:
+        return
+    enqueue_notification(
+        db,
+        "notify_order_assigned_to_fulfillment",
+        order_id=order.id,
+        tracking_number=order.tracking_number,
+        customer_id=order.customer_id,
+        fulfillment_user_id=fulfillment_user.id,
+    )
+    enqueue_email(db, fulfillment_user.email, FULFILLMENT_ASSIGNED_TEMPLATE, {
+        "fulfillment_name": fulfillment_user.name,
+        "order_number": order.tracking_number,
+        "order_id": order.id,
+        "customer_name": order.customer_name,
+        "order_total": _money(order.total),
+        "order_status": _value(order.order_status) or "N/A",
+    })
+
+
+@outbox_handler("order.cancelled")
+def order_cancelled(db: Session, payload: dict):
+    """
+    payload: order_id, cancelled_by ("customer" / "admin"), user_id, reason,
+    order_status, log_stock (log the restored stock per line)
+    """
+    order = db.get(Order, payload["order_id"])
+    if not order:
+        return
+    cancelled_by = payload.get("cancelled_by", "customer")
+    shop_ids = _shop_ids(order)
+
+    if payload.get("log_stock"):
+        for op in order.order_products:
+            enqueue_transaction_log(db, TransactionLogCreate(
+                transaction_type=TransactionType.ORDER_CANCELLED,
+                order_id=order.id,
+                product_id=op.product_id,
+                shop_id=op.shop_id,
+                user_id=payload.get("user_id"),
+                quantity_change=int(float(op.order_quantity)),
+                unit_price=_optional_float(op.unit_price),
+                sale_price=_optional_float(op.sale_price),
+                notes=f"Order {order.tracking_number} cancelled - stock restored",
+            ))
+
+    if order.customer_id:
+        enqueue_notification(
+            db,
+            "notify_order_cancelled",
+            order_id=order.id,
+            tracking_number=order.tracking_number,
+            customer_id=order.customer_id,
+            shop_ids=shop_ids,
+            cancelled_by=cancelled_by,
+        )
+
+    _email_parties(db, ORDER_CANCELLED_TEMPLATE, _customer_email(db, order), shop_ids, {
+        "customer_name": order.customer_name,
+        "order_number": order.tracking_number,
+        "order_id": order.id,
+        "order_status": payload.get("order_status") or _value(order.order_status),
+        "cancelled_by": cancelled_by,
+        "reason": payload.get("reason") or "Not specified",
+        "paid_total": _money(order.paid_total),
+    })
+
+
+def create_shop_earning(session, order: Order):
+    """Create shop earning records when order is completed - UPDATED for multi-shop orders"""
+    # Only create earnings for completed orders
+    if order.order_status != OrderStatusEnum.COMPLETED:
+        return
+
+    # Check if earnings already exist for this order (prevent duplicates)
+    existing_earnings = session.execute(
+        select(ShopEarning.id).where(ShopEarning.order_id == order.id)
+    ).first()
+
+    if existing_earnings:
+        print(f"⚠️ Shop earnings already exist for order {order.id}, skipping creation")
+        return
+
+    # Get all order products for this order
+    order_products = session.execute(
+        select(OrderProduct).where(OrderProduct.order_id == order.id)
+    ).scalars().all()
+
+    if not order_products:
+        print(f"⚠️ No order products found for order {order.id}")
+        return
+
+    for order_product in order_products:
+        if not order_product.shop_id:
+            continue
+
+        # Calculate shop earning for this specific product
+        # (subtotal - admin_commission - proportional delivery fee)
+        delivery_fee_per_product = Decimal("0.00")
+        if order.delivery_fee and len(order_products) > 0:
+            # Distribute delivery fee proportionally based on subtotal
+            total_subtotal = sum(op.subtotal for op in order_products)
+            if total_subtotal > 0:
+                delivery_fee_per_product = Decimal(str(order.delivery_fee)) * (
+                    Decimal(str(order_product.subtotal)) / Decimal(str(total_subtotal))
+                )
+        shop_earning = (
+            Decimal(str(order_product.subtotal))
+            - order_product.admin_commission
+            - delivery_fee_per_product
+        )
+        # Create shop earning record for this shop and product
+        earning = ShopEarning(
+            shop_id=order_product.shop_id,
+            order_id=order.id,
+            order_product_id=order_product.id,  # Link to specific order product
+            order_amount=Decimal(str(order_product.subtotal)),
+            admin_commission=order_product.admin_commission,
+            delivery_fee_per_product=delivery_fee_per_product,
+            shop_earning=shop_earning,
+        )
+        session.add(earning)
+
+
+@outbox_handler("shop_earning")
+def shop_earning(db: Session, payload: dict):
+    """payload: order_id. Skipped unless the order is (still) completed."""
+    order = db.get(Order, payload["order_id"])
+    if order:
+        create_shop_earning(db, order)
+
+
+# ─── Returns ───────────────────────────────────────────────────────────────
+
+def _return_with_order(db: Session, payload: dict):
+    return_request = db.get(ReturnRequest, payload["return_id"])
+    order = db.get(Order, return_request.order_id) if return_request else None
+    return return_request, order
+
+
+@outbox_handler("return.created")
+def return_created(db: Session, payload: dict):
+    """payload: return_id"""
+    return_request, order = _return_with_order(db, payload)
+    if not order:
+        return
+    shop_ids = _shop_ids(order)
+    enqueue_notification(
+        db,
+        "notify_return_request_created",
+        return_id=return_request.id,
+        order_tracking_number=order.tracking_number,
+        customer_id=order.customer_id,
+        shop_ids=shop_ids,
+    )
+
+    replacements = {
+        "customer_name": order.customer_name,
+        "order_number": order.tracking_number,
+        "return_id": return_request.id,
+        "refund_amount": f"Rs.{float(return_request.refund_amount):,.2f}",
+        "reason": return_request.reason or "Not specified",
+    }
+    customer = db.get(User, order.customer_id) if order.customer_id else None
+    if customer:
+        enqueue_email(db, customer.email, RETURN_CREATED_TEMPLATE, {**replacements, "customer_name": customer.name})
+    _email_parties(db, RETURN_CREATED_TEMPLATE, None, shop_ids, replacements)
+
+
+@outbox_handler("return.approved")
+def return_approved(db: Session, payload: dict):
+    """payload: return_id"""
+    return_request, order = _return_with_order(db, payload)
+    if not order:
+        return
+    shop_ids = _shop_ids(order)
+    enqueue_notification(
+        db,
+        "notify_return_request_approved",
+        return_id=return_request.id,
+        order_tracking_number=order.tracking_number,
+        customer_id=return_request.user_id,
+        shop_ids=shop_ids,
+        refund_amount=float(return_request.refund_amount),
+    )
+    # Admins (not covered by notify_return_request_approved)
+    admin_ids = [admin.id for admin in _admins(db)]
+    if admin_ids:
+        enqueue_notification(
+            db,
+            "notify_multiple_users",
+            user_ids=admin_ids,
+            message=f"Return request <b>#{return_request.id}</b> for order <b>{order.tracking_number}</b> has been approved. Refund: <b>Rs.{return_request.refund_amount}</b>",
+        )
+
+    replacements = {
+        "order_number": order.tracking_number,
+        "return_id": return_request.id,
+        "refund_amount": f"Rs.{float(return_request.refund_amount):,.2f}",
+    }
+    customer = db.get(User, return_request.user_id)
+    if customer:
+        enqueue_email(db, customer.email, RETURN_APPROVED_TEMPLATE, {**replacements, "customer_name": customer.name})
+    _email_parties(db, RETURN_APPROVED_TEMPLATE, None, shop_ids, replacements)
+
+
+@outbox_handler("return.rejected")
+def return_rejected(db: Session, payload: dict):
+    """payload: return_id, reason"""
+    return_request, order = _return_with_order(db, payload)
+    if not order:
+        return
+    enqueue_notification(
+        db,
+        "notify_return_request_rejected",
+        return_id=return_request.id,
+        order_tracking_number=order.tracking_number,
+        customer_id=return_request.user_id,
+        reason=payload.get("reason"),
+    )
+    customer = db.get(User, return_request.user_id)
+    if customer:
+        enqueue_email(db, customer.email, RETURN_REJECTED_TEMPLATE, {
+            "customer_name": customer.name,
+            "order_number": order.tracking_number,
+            "return_id": return_request.id,
+            "rejected_reason": payload.get("reason"),
+        })
@@ -0,0 +1,90 @@
+# src/api/services/outbox_dispatcher.py
+"""
+Background worker that drains the outbox_events table (see
+src/api/core/outbox.py).
+
+Every worker process runs one. FOR UPDATE SKIP LOCKED keeps them from
+claiming the same events. A commit that enqueued events wakes the local
+worker at once; events committed by other processes are picked up within
+OUTBOX_POLL_SECONDS.
+"""
+import os
+import threading
+import time
+
+from sqlmodel import Session
+
+from src.lib.db_con import engine
+from src.api.core.outbox import OUTBOX_BATCH_SIZE, dispatch_batch, purge_processed_events, wakeup
+from src.api.services import order_events  # noqa: F401  (registers the order handlers)
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+OUTBOX_PURGE_SECONDS = 3600
+
+
+class OutboxDispatcher:
+    """Runs outbox events in a daemon thread."""
+
+    def __init__(self):
+        self.is_running = False
+        self._next_purge = 0.0
+
+    def run_once(self) -> int:
+        """Drain every due event; returns how many were run."""
+        total = 0
+        while True:
+            claimed = dispatch_batch(OUTBOX_BATCH_SIZE)
+            total += claimed
+            if claimed < OUTBOX_BATCH_SIZE:
+                return total
+
+    def _purge(self):
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + OUTBOX_PURGE_SECONDS
+        with Session(engine) as db:
+            purged = purge_processed_events(db)
+            db.commit()
+        if purged:
+            print(f"[outbox] purged {purged} processed event(s)")
+
+    def _run(self):
+        while self.is_running:
+            # Cleared before the scan so a commit during it is not missed
+            wakeup.clear()
+            try:
+                self.run_once()
+                self._purge()
+            except Exception as e:
+                print(f"[outbox] ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+            wakeup.wait(OUTBOX_POLL_SECONDS)
+
+    def start(self):
+        """Start the dispatcher in a background daemon thread."""
+        if self.is_running:
+            print("[outbox] dispatcher already running")
+            return
+
+        self.is_running = True
+        thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        thread.start()
+        print(f"[outbox] dispatcher started (batch {OUTBOX_BATCH_SIZE}, poll {OUTBOX_POLL_SECONDS}s)")
+
+    def stop(self):
+        """Stop after the current batch."""
+        self.is_running = False
+        wakeup.set()
+        print("[outbox] dispatcher stopped")
+
+
+# Global instance used by cron_startup.py
+outbox_dispatcher = OutboxDispatcher()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Outbox Dispatcher — Manual Run")
+    print("=" * 60)
+    print(f"[outbox] ran {outbox_dispatcher.run_once()} event(s)")
@@ -1,3 +1,4 @@
+import os
 from contextlib import contextmanager
 from sqlmodel import (
     Session,
@@ -5,15 +6,20 @@ from sqlmodel import (
 )
 
 from src.config import DATABASE_URL
+from src.lib.db_instrumentation import instrument_engine
 
 
 engine = create_engine(
     DATABASE_URL,
-    echo=True,
+    # SQL logging is opt-in; per-request counts/timings come from db_instrumentation
+    echo=os.getenv("DB_ECHO", "false").lower() == "true",
     pool_pre_ping=True,  # checks if connection is alive
     pool_recycle=1800,  # refresh stale connections
 )
 
+# Time every statement into the current request's QueryStats
+instrument_engine(engine)
+
 
 def get_session():
     session = Session(engine)
@@ -0,0 +1,161 @@
+"""
+Per-request SQL instrumentation.
+
+Engine events time every statement and add it to the QueryStats of the
+current request (a ContextVar set by QueryStatsMiddleware). At the end of the
+request the middleware emits Server-Timing / X-DB-Queries headers (only with
+DB_TIMING_HEADERS=true), warns about statement shapes repeated more than
+DB_REPEAT_WARN_THRESHOLD times (N+1) and folds the numbers into per-route
+aggregates served by /metrics.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("db.instrumentation")
+
+DB_REPEAT_WARN_THRESHOLD = int(os.getenv("DB_REPEAT_WARN_THRESHOLD", 10))
+
+# "IN (%(id_1_1)s, %(id_1_2)s, ...)" and literals vary per call, not per shape
+_IN_LIST = re.compile(r"\(\s*(?:%\(\w+\)s|\?|\$\d+)(?:\s*,\s*(?:%\(\w+\)s|\?|\$\d+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _IN_LIST.sub("(?)", statement)
+    shape = _NUMBER.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_statement: Optional[str] = None
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_shapes(self, threshold: int = DB_REPEAT_WARN_THRESHOLD):
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+def start_request_stats() -> QueryStats:
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+# ─── Engine hooks ─────────────────────────────────────────────────────────────
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+
+def instrument_engine(engine):
+    """Attach the timing hooks once per engine."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ─── Aggregates for /metrics ──────────────────────────────────────────────────
+
+@dataclass
+class RouteMetrics:
+    requests: int = 0
+    queries: int = 0
+    db_ms: float = 0.0
+    max_queries: int = 0
+    slowest_ms: float = 0.0
+    slowest_statement: Optional[str] = None
+    repeat_warnings: int = 0
+
+
+_route_metrics: dict[str, RouteMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def finish_request_stats(route: str, stats: QueryStats):
+    """Warn about repeated statements and add the request to the route aggregates."""
+    repeated = stats.repeated_shapes()
+    for shape, n in repeated:
+        logger.warning(
+            "Possible N+1 in %s: statement repeated %d times: %s", route, n, shape[:300]
+        )
+
+    with _metrics_lock:
+        metrics = _route_metrics.setdefault(route, RouteMetrics())
+        metrics.requests += 1
+        metrics.queries += stats.count
+        metrics.db_ms += stats.total_ms
+        metrics.max_queries = max(metrics.max_queries, stats.count)
+        if repeated:
+            metrics.repeat_warnings += 1
+        if stats.slowest_ms > metrics.slowest_ms:
+            metrics.slowest_ms = stats.slowest_ms
+            metrics.slowest_statement = stats.slowest_statement
+
+
+def metrics_snapshot() -> list[dict]:
+    with _metrics_lock:
+        items = list(_route_metrics.items())
+    snapshot = []
+    for route, m in items:
+        snapshot.append(
+            {
+                "route": route,
+                "requests": m.requests,
+                "queries": m.queries,
+                "avg_queries": round(m.queries / m.requests, 2) if m.requests else 0,
+                "max_queries": m.max_queries,
+                "db_ms": round(m.db_ms, 2),
+                "avg_db_ms": round(m.db_ms / m.requests, 2) if m.requests else 0,
+                "slowest_ms": round(m.slowest_ms, 2),
+                "slowest_statement": m.slowest_statement,
+                "repeat_warnings": m.repeat_warnings,
+            }
+        )
+    # Chattiest routes first
+    snapshot.sort(key=lambda item: item["avg_queries"], reverse=True)
+    return snapshot
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _route_metrics.clear()
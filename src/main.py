@@ -1,3 +1,4 @@
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from sqlmodel import SQLModel
@@ -13,6 +14,7 @@ from src.api.routers.attribute import (
     attributeProductRoute,
 )
 from .lib.db_con import engine
+from .lib.db_instrumentation import finish_request_stats, start_request_stats
 from src.api.routers import (
     # user
     authRoute,
@@ -73,6 +75,8 @@ from src.api.routers import (
     paymentRoute,
     # reports / analytics
     reportRoute,
+    # sql metrics
+    metricsRoute,
 )
 
 
@@ -125,7 +129,34 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         return response
 
 
+# Per-request DB timings are internal; only expose them when asked to (development)
+DB_TIMING_HEADERS = os.getenv("DB_TIMING_HEADERS", "false").lower() == "true"
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Count and time the SQL each request issues (see src/lib/db_instrumentation).
+    The Server-Timing / X-DB-Queries headers are only sent with DB_TIMING_HEADERS=true.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        stats = start_request_stats()
+        response = await call_next(request)
+
+        route = request.scope.get("route")
+        route_name = f"{request.method} {route.path if route else request.url.path}"
+        finish_request_stats(route_name, stats)
+
+        if DB_TIMING_HEADERS:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"'
+            )
+            response.headers["X-DB-Queries"] = str(stats.count)
+        return response
+
+
 app.add_middleware(SecurityHeadersMiddleware)
+app.add_middleware(QueryStatsMiddleware)
 # Allow all origins
 app.add_middleware(
     CORSMiddleware,
@@ -219,3 +250,5 @@ app.include_router(notificationRoute.router)
 app.include_router(paymentRoute.router)
 # reports / analytics
 app.include_router(reportRoute.router)
+# sql metrics
+app.include_router(metricsRoute.router)
@@ -0,0 +1,63 @@
+"""
+Test objectArrayFilters / stringArrayFilters on JSON columns.
+Run: python -m pytest test_object_array_filters.py
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import JSON, Column, select
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Field, SQLModel
+
+from src.api.core.operation.list_operation_helper import applyFilters
+
+
+class FilterProbe(SQLModel, table=True):
+    __tablename__ = "filter_probe"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    attributes: Optional[List[Dict[str, Any]]] = Field(default=None, sa_column=Column(JSON))
+    tags: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_object_array_filter_by_name():
+    statement = applyFilters(
+        select(FilterProbe),
+        FilterProbe,
+        objectArrayFilters='[["attributes", ["name", "Color"]]]',
+    )
+    sql = compile_sql(statement)
+    assert "CAST(filter_probe.attributes AS JSONB) @>" in sql
+
+
+def test_object_array_filter_values_are_ored():
+    statement = applyFilters(
+        select(FilterProbe),
+        FilterProbe,
+        objectArrayFilters='[["attributes", ["values", ["value", "Red"], ["value", "Green"]]]]',
+    )
+    sql = compile_sql(statement)
+    assert sql.count("@>") == 2
+    assert " OR " in sql
+
+
+def test_object_array_filter_accepts_json_null():
+    statement = applyFilters(
+        select(FilterProbe),
+        FilterProbe,
+        objectArrayFilters='[["attributes", ["name", null]]]',
+    )
+    assert "@>" in compile_sql(statement)
+
+
+def test_string_array_filter():
+    statement = applyFilters(
+        select(FilterProbe),
+        FilterProbe,
+        stringArrayFilters='[["tags", ["sale", "new"]]]',
+    )
+    sql = compile_sql(statement)
+    assert "CAST(filter_probe.tags AS JSONB) @>" in sql